@@ -0,0 +1,95 @@
+"""
+Projection Benchmark
+Payload size and encode latency of a listing page: full documents vs the
+`fields=card` projection
+
+Usage:
+    python -m benchmarks.bench_projection --image-kb 150 --page-size 20
+    python -m benchmarks.bench_projection --mongo   # also time the query against MONGO_URL
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.catalog import generate_products
+from routes.products import FIELD_PRESETS
+
+def _project(product: dict, projection: dict) -> dict:
+    """Apply a find() projection in Python, as Mongo would"""
+    result = {"_id": product["_id"]}
+    for field, spec in projection.items():
+        if field in product:
+            value = product[field]
+            result[field] = value[:spec["$slice"]] if isinstance(spec, dict) else value
+    return result
+
+def _encode(page) -> bytes:
+    """What FastAPI does with a dict returned from a handler"""
+    return json.dumps(jsonable_encoder({"data": page}), ensure_ascii=False, separators=(",", ":")).encode()
+
+def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+async def _bench_mongo(products, page_size: int, repeat: int):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    collection = client["fashion_catalog_bench"]["products"]
+    await collection.drop()
+    await collection.insert_many(products)
+    await collection.create_index([("createdAt", -1)])
+
+    async def fetch(projection):
+        cursor = collection.find({}, projection).sort("createdAt", -1).limit(page_size)
+        return await cursor.to_list(page_size)
+
+    print("\nMongoDB round trip (find + decode)")
+    for label, projection in (("full", None), ("card", FIELD_PRESETS["card"])):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await fetch(projection)
+            samples.append((time.perf_counter() - start) * 1000)
+        print(f"  {label:<6}{statistics.median(samples):>10.2f} ms")
+
+    await collection.drop()
+    client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--image-kb", type=int, default=150, help="decoded size of each inline image (0 = URLs)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mongo", action="store_true", help="also benchmark against MONGO_URL")
+    args = parser.parse_args()
+
+    products = generate_products(args.products, image_bytes=args.image_kb * 1024)
+    page = [dict(p, _id=f"{i:024x}") for i, p in enumerate(products[:args.page_size])]
+    card_page = [_project(p, FIELD_PRESETS["card"]) for p in page]
+
+    print(f"Page of {args.page_size} products, {args.image_kb} KB per image")
+    print(f"{'':<6}{'bytes':>14}{'encode ms':>12}")
+    for label, data in (("full", page), ("card", card_page)):
+        size = len(_encode(data))
+        encode_ms = _median_ms(lambda: _encode(data), args.repeat)
+        print(f"{label:<6}{size:>14,}{encode_ms:>12.2f}")
+
+    if args.mongo:
+        asyncio.run(_bench_mongo(products, args.page_size, args.repeat))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Reservation Benchmark
+Hundreds of concurrent checkouts racing for one hot SKU: the conditional
+`$inc` used by POST /api/reservations vs a naive read-then-write
+
+Checks that no more units are sold than were in stock and that the final
+stock matches the successful reservations, and reports throughput.
+
+Usage:
+    python -m benchmarks.bench_reservations                       # in-memory stand-in (mongomock-motor)
+    python -m benchmarks.bench_reservations --mongo --buyers 1000 --stock 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.catalog import generate_products
+
+BENCH_DB_NAME = "fashion_catalog_bench"
+
+async def _naive_reserve(collection, product_id, quantity: int) -> bool:
+    """Read-modify-write: two buyers can both see the last unit"""
+    product = await collection.find_one({"_id": product_id}, {"stock": 1})
+    # Let other buyers run between the read and the write, as they do
+    # during a real round trip (the in-memory stand-in never yields)
+    await asyncio.sleep(0)
+    if product["stock"] < quantity:
+        return False
+    await collection.update_one({"_id": product_id}, {"$set": {"stock": product["stock"] - quantity}})
+    return True
+
+async def _race(label: str, reserve, collection, product_id, args) -> dict:
+    await collection.update_one({"_id": product_id}, {"$set": {"stock": args.stock}})
+    latencies = []
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def buyer():
+        async with gate:
+            start = time.perf_counter()
+            ok = await reserve(args.quantity)
+            latencies.append((time.perf_counter() - start) * 1000)
+            return ok
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(buyer() for _ in range(args.buyers)))
+    elapsed = time.perf_counter() - start
+
+    sold = sum(outcomes) * args.quantity
+    final = (await collection.find_one({"_id": product_id}, {"stock": 1}))["stock"]
+    correct = sold <= args.stock and final == args.stock - sold
+    print(
+        f"{label:<14}{sum(outcomes):>8}{sold:>8}{final:>8}{len(outcomes) / elapsed:>10.0f}"
+        f"{statistics.median(latencies):>9.2f}{max(latencies):>9.2f}  {'✅' if correct else '❌ oversold'}"
+    )
+    return {"correct": correct, "sold": sold, "final": final}
+
+async def main(args):
+    import httpx
+
+    import database
+    from database import PRODUCTS
+    from main import app, lifespan
+
+    if not args.mongo:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("The in-memory stand-in needs mongomock-motor (pip install mongomock-motor), or pass --mongo")
+        database.AsyncIOMotorClient = AsyncMongoMockClient
+
+    async with lifespan(app):
+        collection = database.get_collection(PRODUCTS)
+        await collection.delete_many({})
+        product = generate_products(1)[0]
+        product_id = (await collection.insert_one(product)).inserted_id
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def via_api(quantity):
+                response = await client.post("/api/reservations/", json={
+                    "items": [{"productId": str(product_id), "quantity": quantity}]
+                })
+                if response.status_code not in (201, 409):
+                    raise RuntimeError(f"{response.status_code}: {response.text}")
+                return response.status_code == 201
+
+            async def naive(quantity):
+                return await _naive_reserve(collection, product_id, quantity)
+
+            print(f"{args.buyers} buyers x {args.quantity} unit(s), stock {args.stock}, concurrency {args.concurrency}")
+            print(f"{'':<14}{'ok':>8}{'sold':>8}{'final':>8}{'req/s':>10}{'p50 ms':>9}{'max ms':>9}")
+            result = await _race("conditional", via_api, collection, product_id, args)
+            await _race("naive", naive, collection, product_id, args)
+
+    if not result["correct"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=20)
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--mongo", action="store_true", help=f"use MONGO_URL (database {BENCH_DB_NAME}, wiped)")
+    args = parser.parse_args()
+
+    # Read when the app modules are imported
+    os.environ["MONGO_DB_NAME"] = BENCH_DB_NAME
+    if not args.mongo:
+        os.environ.setdefault("MONGO_URL", "mongodb://in-memory")
+        os.environ["IMAGE_STORAGE"] = "local"
+    asyncio.run(main(args))
@@ -0,0 +1,116 @@
+"""
+Search Benchmark
+Compares the in-process search index with the legacy `$regex` search path
+
+Usage:
+    python -m benchmarks.bench_search --products 20000
+    python -m benchmarks.bench_search --products 20000 --mongo   # also time against MONGO_URL
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.catalog import generate_products
+from search import SearchIndex
+
+QUERIES = ["calça", "calca", "jeans", "vest", "camiseta basica", "tenis casual", "bolsa couro", "xyz"]
+
+def _timeit(fn, repeat: int) -> float:
+    """Median wall time of `fn()` in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def _regex_scan(products, text):
+    """What Mongo does for the legacy query: test every document"""
+    pattern = re.compile(text, re.IGNORECASE)
+    return [
+        p for p in products
+        if pattern.search(p["name"]) or pattern.search(p["description"])
+        or any(pattern.search(tag) for tag in p["tags"])
+    ]
+
+async def _bench_mongo(products, index, repeat):
+    from bson import ObjectId
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    collection = client["fashion_catalog_bench"]["products"]
+    await collection.drop()
+    await collection.insert_many(products)
+    for product in products:
+        index.add(product)
+
+    print("\nMongoDB (count + first page of 20)")
+    print(f"{'query':<18}{'regex ms':>10}{'index ms':>10}")
+    for text in QUERIES:
+        regex_query = {"$or": [
+            {"name": {"$regex": text, "$options": "i"}},
+            {"description": {"$regex": text, "$options": "i"}},
+            {"tags": {"$regex": text, "$options": "i"}},
+        ]}
+
+        async def regex_path():
+            await collection.count_documents(regex_query)
+            await collection.find(regex_query).sort("createdAt", -1).limit(20).to_list(20)
+
+        async def index_path():
+            ids = [ObjectId(i) for i, _ in index.search(text, limit=1000)]
+            query = {"_id": {"$in": ids}}
+            await collection.count_documents(query)
+            await collection.find(query).sort("createdAt", -1).limit(20).to_list(20)
+
+        timings = []
+        for path in (regex_path, index_path):
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                await path()
+                samples.append((time.perf_counter() - start) * 1000)
+            timings.append(statistics.median(samples))
+        print(f"{text:<18}{timings[0]:>10.2f}{timings[1]:>10.2f}")
+
+    await collection.drop()
+    client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongo", action="store_true", help="also benchmark against MONGO_URL")
+    args = parser.parse_args()
+
+    products = generate_products(args.products)
+    for i, product in enumerate(products):
+        product["_id"] = f"{i:024x}"
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    for product in products:
+        index.add(product)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"Indexed {len(products)} products in {build_ms:.0f} ms")
+
+    print(f"\n{'query':<18}{'regex ms':>10}{'hits':>8}{'index ms':>10}{'hits':>8}")
+    for text in QUERIES:
+        regex_ms = _timeit(lambda: _regex_scan(products, text), args.repeat)
+        index_ms = _timeit(lambda: index.search(text), args.repeat)
+        print(f"{text:<18}{regex_ms:>10.2f}{len(_regex_scan(products, text)):>8}"
+              f"{index_ms:>10.2f}{len(index.search(text)):>8}")
+
+    if args.mongo:
+        for product in products:
+            del product["_id"]
+        asyncio.run(_bench_mongo(products, SearchIndex(), args.repeat))
+
+if __name__ == "__main__":
+    main()
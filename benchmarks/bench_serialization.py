@@ -0,0 +1,102 @@
+"""
+Serialization Benchmark
+Requests/sec on one core for a listing page encoded the old way (`_id`
+rewriting loop + jsonable_encoder + JSONResponse) vs MongoJSONResponse
+
+Usage:
+    python -m benchmarks.bench_serialization --page-size 100 --image-kb 0
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI
+
+from benchmarks.catalog import generate_products
+from responses import MongoJSONResponse
+
+def _build_app(page: list) -> FastAPI:
+    """Two handlers returning the same page, as Mongo hands it back"""
+    app = FastAPI()
+
+    @app.get("/before", response_model=dict)
+    async def before():
+        products = [dict(p) for p in page]
+        for product in products:
+            product["_id"] = str(product["_id"])
+        return {"data": products, "total": len(products)}
+
+    @app.get("/after", response_class=MongoJSONResponse)
+    async def after():
+        return MongoJSONResponse({"data": page, "total": len(page)})
+
+    return app
+
+async def _requests_per_second(client: httpx.AsyncClient, path: str, seconds: float) -> tuple:
+    await client.get(path)  # warm-up
+    count = 0
+    size = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        response = await client.get(path)
+        size = len(response.content)
+        count += 1
+    return count / (time.perf_counter() - start), size
+
+async def _run(page: list, seconds: float):
+    app = _build_app(page)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'':<8}{'req/s':>10}{'bytes':>12}")
+        results = {}
+        for label in ("before", "after"):
+            rps, size = await _requests_per_second(client, f"/{label}", seconds)
+            results[label] = rps
+            print(f"{label:<8}{rps:>10.0f}{size:>12,}")
+        print(f"speed-up {results['after'] / results['before']:.2f}x")
+
+def _encode_only(page: list, repeat: int):
+    """Encoding cost alone, via jsonable_encoder as in handlers without a response_model"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    def before():
+        products = [dict(p) for p in page]
+        for product in products:
+            product["_id"] = str(product["_id"])
+        return JSONResponse(jsonable_encoder({"data": products})).body
+
+    def after():
+        return MongoJSONResponse({"data": page}).body
+
+    print(f"\n{'':<8}{'encodes/s':>10}")
+    for label, fn in (("before", before), ("after", after)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        print(f"{label:<8}{repeat / (time.perf_counter() - start):>10.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--image-kb", type=int, default=0, help="decoded size of each inline image (0 = URLs)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each HTTP run")
+    parser.add_argument("--repeat", type=int, default=200, help="iterations of the encode-only run")
+    args = parser.parse_args()
+
+    page = generate_products(args.page_size, image_bytes=args.image_kb * 1024)
+    for product in page:
+        product["_id"] = ObjectId()
+
+    print(f"Page of {args.page_size} products, {args.image_kb} KB per image, 1 core")
+    asyncio.run(_run(page, args.seconds))
+    _encode_only(page, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Synthetic Fashion Catalog
+Deterministic product/category generator shared by the benchmarks
+"""
+import base64
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+CATEGORIES = {
+    "Feminino": ["Blusas", "Calças", "Vestidos", "Saias", "Shorts"],
+    "Masculino": ["Camisetas", "Calças", "Bermudas", "Camisas", "Jaquetas"],
+    "Infantil": ["Conjuntos", "Camisetas", "Vestidos", "Pijamas"],
+    "Calçados": ["Tênis", "Sandálias", "Botas", "Chinelos"],
+    "Acessórios": ["Bolsas", "Cintos", "Bonés", "Óculos"],
+}
+
+BRANDS = [
+    "Malwee", "Hering", "Colcci", "Reserva", "Farm", "Osklen",
+    "Havaianas", "Olympikus", "Lupo", "Cia. Marítima", "Grande Família"
+]
+
+PIECES = {
+    "Blusas": ["Blusa", "Bata", "Regata"],
+    "Calças": ["Calça", "Legging", "Pantalona"],
+    "Vestidos": ["Vestido", "Chemise"],
+    "Saias": ["Saia"],
+    "Shorts": ["Short", "Shortinho"],
+    "Camisetas": ["Camiseta", "Polo", "Camisa Gola V"],
+    "Bermudas": ["Bermuda"],
+    "Camisas": ["Camisa", "Camisa Social"],
+    "Jaquetas": ["Jaqueta", "Moletom", "Corta-vento"],
+    "Conjuntos": ["Conjunto", "Macacão"],
+    "Pijamas": ["Pijama"],
+    "Tênis": ["Tênis"],
+    "Sandálias": ["Sandália", "Rasteira"],
+    "Botas": ["Bota", "Coturno"],
+    "Chinelos": ["Chinelo"],
+    "Bolsas": ["Bolsa", "Mochila", "Pochete"],
+    "Cintos": ["Cinto"],
+    "Bonés": ["Boné", "Chapéu"],
+    "Óculos": ["Óculos de Sol"],
+}
+
+STYLES = [
+    "Jeans", "Básica", "Estampada", "Floral", "Listrada", "Alfaiataria",
+    "Linho", "Algodão", "Malha", "Couro", "Canelada", "Plissada", "Oversized",
+    "Slim", "Skinny", "Midi", "Longa", "Cropped", "Esportiva", "Casual"
+]
+
+COLORS = [
+    {"name": "Preto", "hex": "#000000"},
+    {"name": "Branco", "hex": "#FFFFFF"},
+    {"name": "Azul Marinho", "hex": "#1F2A44"},
+    {"name": "Vermelho", "hex": "#C0392B"},
+    {"name": "Verde Militar", "hex": "#4B5320"},
+    {"name": "Bege", "hex": "#D9C3A0"},
+    {"name": "Rosa", "hex": "#F4A7B9"},
+    {"name": "Cinza Mescla", "hex": "#9E9E9E"},
+]
+
+SIZES = ["PP", "P", "M", "G", "GG", "XG"]
+
+DESCRIPTION_WORDS = (
+    "peça confortável ideal para o dia a dia tecido macio caimento perfeito "
+    "acabamento premium combina com tudo verão inverno coleção nova modelagem "
+    "ajustada lavagem delicada toque suave respirável resistente elegante"
+).split()
+
+def _image(rng: random.Random, size: int) -> str:
+    """Data URL the size of a real upload, like the ones stored today"""
+    if size <= 0:
+        return f"https://cdn.example.com/img/{rng.getrandbits(64):016x}.jpg"
+    return "data:image/jpeg;base64," + base64.b64encode(rng.randbytes(size)).decode()
+
+def generate_categories() -> List[dict]:
+    """Category documents matching the generated products"""
+    return [
+        {"name": name, "slug": name.lower().replace("ç", "c").replace("ó", "o"),
+         "subcategories": subcategories, "image": None}
+        for name, subcategories in CATEGORIES.items()
+    ]
+
+def generate_brands() -> List[dict]:
+    """Brand documents for the brands the products use"""
+    return [{"name": name, "description": None, "logo": None} for name in BRANDS]
+
+def generate_products(count: int, seed: int = 42, image_bytes: int = 0, images_per_product: int = 3) -> List[dict]:
+    """
+    Build `count` product documents shaped like ProductBase plus timestamps.
+    `image_bytes` > 0 embeds base64 data URLs of that decoded size.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    products = []
+    for _ in range(count):
+        category = rng.choice(list(CATEGORIES))
+        subcategory = rng.choice(CATEGORIES[category])
+        piece = rng.choice(PIECES[subcategory])
+        style = rng.choice(STYLES)
+        brand = rng.choice(BRANDS)
+        price = round(rng.uniform(19.9, 499.9), 2)
+        created = start + timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        products.append({
+            "name": f"{piece} {style} {brand}",
+            "description": " ".join(rng.choices(DESCRIPTION_WORDS, k=rng.randint(15, 40))),
+            "price": price,
+            "originalPrice": round(price * rng.uniform(1.1, 1.6), 2) if rng.random() < 0.3 else None,
+            "category": category,
+            "subcategory": subcategory,
+            "brand": brand,
+            "sizes": rng.sample(SIZES, k=rng.randint(2, len(SIZES))),
+            "colors": rng.sample(COLORS, k=rng.randint(1, 4)),
+            "images": [_image(rng, image_bytes) for _ in range(images_per_product)],
+            "stock": rng.randint(0, 200),
+            "featured": rng.random() < 0.1,
+            "tags": [style.lower(), piece.lower(), category.lower()],
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "reviewCount": rng.randint(0, 500),
+            "createdAt": created,
+            "updatedAt": created,
+        })
+    return products
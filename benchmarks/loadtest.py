@@ -0,0 +1,409 @@
+"""
+API Load Test
+Seeds a synthetic catalog, drives every route of the app in-process through
+its ASGI interface at several concurrency levels and reports p50/p95/p99
+latency, throughput and bytes per response as JSON
+
+Usage:
+    python -m benchmarks.loadtest                          # in-memory stand-in (mongomock-motor)
+    python -m benchmarks.loadtest --mongo                  # MONGO_URL, database fashion_catalog_bench
+    python -m benchmarks.loadtest --products 5000 --concurrency 1,16,64 --output after.json
+    python -m benchmarks.loadtest --compare before.json    # exit 1 on a regression
+
+Client and server share one event loop and one core, so numbers are for
+comparing runs on the same machine, not for capacity planning. The
+in-memory stand-in has no query planner or network: use --mongo for
+anything involving indexes or the connection pool.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.catalog import (
+    BRANDS, CATEGORIES, generate_brands, generate_categories, generate_products
+)
+
+BENCH_DB_NAME = "fashion_catalog_bench"
+# (method, path, body): a JSON body, a raw (content type, bytes) body or None
+Request = Tuple[str, str, Union[dict, Tuple[str, bytes], None]]
+
+# Share of storefront traffic per route in the "mixed" scenario; routes
+# missing from a run (no photo, no --writes) are left out of the draw
+MIX_WEIGHTS = {
+    "product_detail": 25,
+    "products_list": 15,
+    "products_category_price": 10,
+    "products_suggest": 12,
+    "image_card_webp": 10,
+    "products_search": 8,
+    "product_related": 8,
+    "products_batch": 5,
+    "categories_tree": 4,
+    "categories_list": 2,
+    "settings": 2,
+    "products_changes_since": 1,
+    "metrics": 1,
+    "reservation_create": 2,
+    "product_update": 1,
+}
+MULTIPART_BOUNDARY = "loadtest-boundary"
+
+class Seed:
+    """IDs and keys of the seeded data, for building request URLs"""
+
+    def __init__(self):
+        self.product_ids: List[str] = []
+        self.category_ids: List[str] = []
+        self.image_key: Optional[str] = None
+        self.upload_body: Optional[dict] = None
+        self.multipart_body: Optional[bytes] = None
+        self.changes_token: Optional[str] = None
+        self.import_body: bytes = b""
+
+def _photo(width: int, height: int) -> bytes:
+    """Noisy JPEG that compresses like a real product photo"""
+    from PIL import Image
+
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+def _scenarios(seed: Seed, in_memory: bool, writes: bool) -> Dict[str, Callable[[random.Random], Request]]:
+    """Named request generators, one per route (and listing variant)"""
+    categories = list(CATEGORIES)
+    # The stand-in lacks $indexOfArray (relevance sort) and $bucketAuto (price facet)
+    search_sort = "&sort=popular" if in_memory else ""
+    facets = "subcategory,brand" if in_memory else "subcategory,brand,price"
+
+    scenarios = {
+        "root": lambda rng: ("GET", "/", None),
+        "health": lambda rng: ("GET", "/health", None),
+        "cache_stats": lambda rng: ("GET", "/cache/stats", None),
+        "products_list": lambda rng: ("GET", f"/api/products/?page={rng.randint(1, 5)}", None),
+        "products_category_price": lambda rng: (
+            "GET", f"/api/products/?category={rng.choice(categories)}&sort=price_asc", None
+        ),
+        "products_brand_card": lambda rng: (
+            "GET", f"/api/products/?brand={rng.choice(BRANDS)}&fields=card", None
+        ),
+        "products_search": lambda rng: (
+            "GET", f"/api/products/?search={rng.choice(['calca', 'vest', 'camiseta', 'tenis'])}{search_sort}", None
+        ),
+        "products_facets": lambda rng: (
+            "GET", f"/api/products/?category={rng.choice(categories)}&facets={facets}", None
+        ),
+        "products_deep_page": lambda rng: ("GET", f"/api/products/?page={rng.randint(20, 40)}", None),
+        "products_scroll": lambda rng: (
+            "GET", f"/api/products/?category={rng.choice(categories)}&page={rng.randint(1, 10)}&total=none", None
+        ),
+        "product_detail": lambda rng: ("GET", f"/api/products/{rng.choice(seed.product_ids)}", None),
+        "products_batch": lambda rng: (
+            "GET", f"/api/products/batch?ids={','.join(rng.sample(seed.product_ids, 20))}&fields=card", None
+        ),
+        "products_suggest": lambda rng: (
+            "GET", f"/api/products/suggest?q={rng.choice(['c', 'ca', 'cal', 'v', 've', 'bl', 'te', 'sa'])}", None
+        ),
+        "products_changes_full": lambda rng: ("GET", "/api/products/changes?limit=200&fields=card", None),
+        "products_changes_since": lambda rng: ("GET", f"/api/products/changes?since={seed.changes_token}", None),
+        "products_export": lambda rng: (
+            "GET", f"/api/products/export?category={rng.choice(categories)}&fields=card", None
+        ),
+        "products_export_csv": lambda rng: (
+            "GET", f"/api/products/export?format=csv&brand={rng.choice(BRANDS)}", None
+        ),
+        "categories_list": lambda rng: ("GET", "/api/categories/", None),
+        "categories_tree": lambda rng: ("GET", "/api/categories/tree", None),
+        "category_detail": lambda rng: ("GET", f"/api/categories/{rng.choice(seed.category_ids)}", None),
+        "settings": lambda rng: ("GET", "/settings", None),
+        "upload_health": lambda rng: ("GET", "/upload/health", None),
+        "metrics": lambda rng: ("GET", "/metrics", None),
+    }
+    if not in_memory:
+        # The stand-in's $lookup takes no pipeline
+        scenarios["product_related"] = lambda rng: (
+            "GET", f"/api/products/{rng.choice(seed.product_ids)}/related?fields=card", None
+        )
+    if seed.image_key:
+        scenarios["image_original"] = lambda rng: ("GET", f"/images/{seed.image_key}", None)
+        scenarios["image_card_webp"] = lambda rng: ("GET", f"/images/{seed.image_key}?w=320", None)
+    if writes:
+        products = generate_products(200, seed=7)
+
+        def create(rng):
+            product = dict(rng.choice(products))
+            for field in ("createdAt", "updatedAt"):
+                product.pop(field, None)
+            return "POST", "/api/products/", product
+
+        scenarios["product_create"] = create
+        scenarios["product_update"] = lambda rng: (
+            "PUT", f"/api/products/{rng.choice(seed.product_ids)}",
+            {"price": round(rng.uniform(19.9, 499.9), 2)}
+        )
+        scenarios["settings_update"] = lambda rng: (
+            "PUT", "/settings", {"whatsappMessage": f"Olá! ({rng.randint(0, 999)})"}
+        )
+        scenarios["reservation_create"] = lambda rng: (
+            "POST", "/api/reservations/",
+            {"items": [{"productId": rng.choice(seed.product_ids), "quantity": 1}]}
+        )
+        # Upserts by name+brand, so repeated runs don't grow the catalog
+        scenarios["products_import"] = lambda rng: (
+            "POST", "/api/products/import?upsertKey=name_brand", ("application/x-ndjson", seed.import_body)
+        )
+        if seed.upload_body:
+            scenarios["upload_base64"] = lambda rng: ("POST", "/upload", seed.upload_body)
+        if seed.multipart_body:
+            scenarios["upload_multipart"] = lambda rng: (
+                "POST", "/upload/file",
+                (f"multipart/form-data; boundary={MULTIPART_BOUNDARY}", seed.multipart_body)
+            )
+
+    available = {name: weight for name, weight in MIX_WEIGHTS.items() if name in scenarios}
+    names, weights = list(available), list(available.values())
+    scenarios["mixed"] = lambda rng: scenarios[rng.choices(names, weights)[0]](rng)
+    return scenarios
+
+def _multipart(filename: str, content_type: str, data: bytes) -> bytes:
+    """multipart/form-data body with one file part"""
+    head = (
+        f"--{MULTIPART_BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    )
+    return head.encode() + data + f"\r\n--{MULTIPART_BOUNDARY}--\r\n".encode()
+
+async def _seed(products: int, image_kb: int, photo: bool) -> Seed:
+    """Fill the (already connected) database and the blob store"""
+    import database
+    from database import BRANDS as BRANDS_COLLECTION, CATEGORIES as CATEGORIES_COLLECTION, PRODUCTS
+    from bson import ObjectId
+    from category_stats import reconcile_category_stats
+    from derivatives import ensure_derivatives
+    from related import rebuild_related
+    from responses import dumps
+    from routes.products import _encode_change_token
+    from search import load_search_index
+    from storage import content_key, get_blob_store
+    from suggest import load_suggest_index
+
+    seed = Seed()
+    for name in (PRODUCTS, CATEGORIES_COLLECTION, BRANDS_COLLECTION):
+        await database.get_collection(name).delete_many({})
+
+    documents = generate_products(products, image_bytes=image_kb * 1024)
+    for start in range(0, len(documents), 1000):
+        await database.get_collection(PRODUCTS).insert_many(documents[start:start + 1000])
+    result = await database.get_collection(CATEGORIES_COLLECTION).insert_many(generate_categories())
+    await database.get_collection(BRANDS_COLLECTION).insert_many(generate_brands())
+
+    seed.product_ids = [str(d["_id"]) for d in documents]
+    seed.category_ids = [str(i) for i in result.inserted_ids]
+    await load_search_index()
+    await load_suggest_index()
+    await rebuild_related()
+    await reconcile_category_stats()
+
+    # Incremental sync from the newest tenth of the catalog on
+    stamps = sorted(d["updatedAt"] for d in documents)
+    since = stamps[len(stamps) * 9 // 10] if stamps else datetime.utcnow()
+    seed.changes_token = _encode_change_token(since, ObjectId("0" * 24), datetime.utcnow())
+
+    rows = []
+    for product in documents[:50]:
+        row = {k: v for k, v in product.items() if k not in ("_id", "createdAt", "updatedAt")}
+        rows.append(dumps(row) + b"\n")
+    seed.import_body = b"".join(rows)
+
+    if photo:
+        data = _photo(1200, 1600)
+        seed.image_key = content_key(data)
+        await get_blob_store().put(seed.image_key, data, "image/jpeg")
+        await ensure_derivatives(seed.image_key)
+        small = _photo(400, 400)
+        seed.upload_body = {
+            "filename": "produto.jpg",
+            "content_type": "image/jpeg",
+            "data": "data:image/jpeg;base64," + base64.b64encode(small).decode()
+        }
+        seed.multipart_body = _multipart("produto.jpg", "image/jpeg", small)
+    return seed
+
+def _percentile(samples: List[float], pct: int) -> float:
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1]
+
+async def _run_level(client, make_request, concurrency: int, total: int, rng: random.Random) -> dict:
+    """Send `total` requests from `concurrency` workers; return the stats"""
+    latencies: List[float] = []
+    sizes: List[int] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, url, body = make_request(rng)
+            if isinstance(body, tuple):
+                content_type, content = body
+                request = client.request(method, url, content=content, headers={"content-type": content_type})
+            else:
+                request = client.request(method, url, json=body)
+            start = time.perf_counter()
+            response = await request
+            latencies.append((time.perf_counter() - start) * 1000)
+            sizes.append(len(response.content))
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughputRps": round(len(latencies) / elapsed, 1),
+        "p50Ms": round(_percentile(latencies, 50), 3),
+        "p95Ms": round(_percentile(latencies, 95), 3),
+        "p99Ms": round(_percentile(latencies, 99), 3),
+        "meanBytes": round(statistics.fmean(sizes)),
+    }
+
+async def _run(args) -> dict:
+    import httpx
+
+    import database
+    from main import app, lifespan
+
+    if not args.mongo:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("The in-memory stand-in needs mongomock-motor (pip install mongomock-motor), or pass --mongo")
+        database.AsyncIOMotorClient = AsyncMongoMockClient
+
+    results = []
+    async with lifespan(app):
+        print(f"Seeding {args.products} products...")
+        seed = await _seed(args.products, args.image_kb, not args.no_images)
+        scenarios = _scenarios(seed, not args.mongo, args.writes)
+        if args.routes:
+            scenarios = {name: scenarios[name] for name in args.routes.split(",")}
+
+        rng = random.Random(args.seed)
+        # Server errors are counted, not raised
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            print(f"{'route':<26}{'conc':>5}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'bytes':>11}{'err':>5}")
+            for name, make_request in scenarios.items():
+                for concurrency in args.concurrency:
+                    stats = await _run_level(client, make_request, concurrency, args.requests, rng)
+                    results.append({"route": name, "concurrency": concurrency, **stats})
+                    print(
+                        f"{name:<26}{concurrency:>5}{stats['throughputRps']:>9.0f}"
+                        f"{stats['p50Ms']:>9.2f}{stats['p95Ms']:>9.2f}{stats['p99Ms']:>9.2f}"
+                        f"{stats['meanBytes']:>11,}{stats['errors']:>5}"
+                    )
+    return {"meta": _meta(args), "results": results}
+
+def _meta(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "backend": "mongo" if args.mongo else "in-memory",
+        "products": args.products,
+        "imageKb": args.image_kb,
+        "requestsPerLevel": args.requests,
+        "concurrency": args.concurrency,
+        "cache": not args.no_cache,
+        "singleFlight": not args.no_single_flight,
+        "seed": args.seed,
+    }
+
+def _compare(report: dict, baseline_path: str, tolerance: float) -> bool:
+    """Print per-route changes against a previous run; False on a regression"""
+    with open(baseline_path) as f:
+        baseline = {(r["route"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    ok = True
+    print(f"\nAgainst {baseline_path} (tolerance {tolerance:.0%})")
+    print(f"{'route':<26}{'conc':>5}{'p95 Δ':>9}{'req/s Δ':>9}")
+    for result in report["results"]:
+        before = baseline.get((result["route"], result["concurrency"]))
+        if not before:
+            continue
+        p95_change = result["p95Ms"] / before["p95Ms"] - 1 if before["p95Ms"] else 0.0
+        rps_change = result["throughputRps"] / before["throughputRps"] - 1 if before["throughputRps"] else 0.0
+        regressed = p95_change > tolerance or rps_change < -tolerance or result["errors"] > before["errors"]
+        ok = ok and not regressed
+        print(
+            f"{result['route']:<26}{result['concurrency']:>5}{p95_change:>+9.0%}{rps_change:>+9.0%}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--image-kb", type=int, default=0, help="decoded size of inline product images (0 = URLs)")
+    parser.add_argument("--no-images", action="store_true", help="skip the stored photo and the image routes")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per route and concurrency level")
+    parser.add_argument("--routes", help="comma-separated scenario names (default: all)")
+    parser.add_argument("--writes", action="store_true", help="also run the write routes")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--no-single-flight", action="store_true", help="don't share concurrent identical loads")
+    parser.add_argument("--mongo", action="store_true", help=f"use MONGO_URL (database {BENCH_DB_NAME}, wiped)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="loadtest.json")
+    parser.add_argument("--compare", help="previous --output file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95/throughput change")
+    args = parser.parse_args()
+
+    # Settings are read when the app modules are imported
+    os.environ["MONGO_DB_NAME"] = BENCH_DB_NAME
+    if args.no_cache:
+        os.environ["CACHE_MAX_ENTRIES"] = "0"
+    if args.no_single_flight:
+        os.environ["CACHE_SINGLE_FLIGHT"] = "false"
+    if not args.mongo:
+        os.environ.setdefault("MONGO_URL", "mongodb://in-memory")
+        os.environ["IMAGE_STORAGE"] = "local"
+        os.environ["IMAGE_STORAGE_DIR"] = tempfile.mkdtemp(prefix="loadtest-images-")
+
+    report = asyncio.run(_run(args))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+
+    if args.compare and not _compare(report, args.compare, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Response Cache
+Bounded LRU + TTL cache for catalog reads with per-collection versioning,
+loading each missing entry once however many requests want it
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple
+
+from singleflight import SingleFlight
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+# Bounds staleness for writes made by other processes or directly in Mongo
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+# Concurrent misses for the same key share one load
+CACHE_SINGLE_FLIGHT = os.getenv("CACHE_SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+def _freeze(value: Any) -> Hashable:
+    """
+    Turn a query parameter value into a hashable, order-independent form.
+    Strings are kept verbatim: handlers query with the raw value, so
+    " Feminino" and "Feminino" are different results.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items() if v is not None))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+class ResponseCache:
+    """
+    Caches handler results keyed by name + normalized params + the version
+    of every collection the result depends on. Writes bump the version, so
+    stale entries are never served and age out of the LRU on their own.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        ttl: float = CACHE_TTL_SECONDS,
+        single_flight: bool = CACHE_SINGLE_FLIGHT
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flights = SingleFlight() if single_flight else None
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def version(self, collection: str) -> int:
+        """Current version counter of a collection"""
+        return self._versions.get(collection, 0)
+
+    def invalidate(self, *collections: str):
+        """Mark every cached result depending on `collections` as stale"""
+        for collection in collections:
+            self._versions[collection] = self.version(collection) + 1
+            self.invalidations += 1
+
+    def key(self, name: str, depends_on: Iterable[str], params: dict) -> Hashable:
+        """Build a cache key from the handler name, versions and params"""
+        versions = tuple((c, self.version(c)) for c in depends_on)
+        return (name, versions, _freeze(params))
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value), refreshing the entry's LRU position"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries if full"""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(
+        self,
+        name: str,
+        depends_on: Iterable[str],
+        params: dict,
+        loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Return the cached result for these params or load and cache it.
+        Concurrent misses share one load; the key includes the collection
+        versions, so a request arriving after a write never joins a load
+        that started before it.
+        """
+        depends_on = tuple(depends_on)
+        key = self.key(name, depends_on, params)
+        found, value = self.get(key)
+        if found:
+            return value
+
+        async def load_and_store():
+            value = await loader()
+            # Don't store a result that a concurrent write already made stale
+            if self.key(name, depends_on, params) == key:
+                self.set(key, value)
+            return value
+
+        if self.flights is None:
+            return await load_and_store()
+        return await self.flights.do(key, load_and_store, name)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "versions": dict(self._versions),
+            "singleFlight": self.flights.stats() if self.flights is not None else None
+        }
+
+# Shared cache for the running process
+response_cache = ResponseCache()
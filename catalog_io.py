@@ -0,0 +1,142 @@
+"""
+Catalog Import/Export Formats
+NDJSON and CSV row handling shared by the bulk import and export endpoints
+"""
+import codecs
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+# CSV column order; list fields use "|" between items and colors are "Name:#hex"
+CSV_COLUMNS = [
+    "sku", "name", "description", "price", "originalPrice", "category",
+    "subcategory", "brand", "sizes", "colors", "images", "stock", "featured",
+    "tags", "rating", "reviewCount"
+]
+LIST_SEPARATOR = "|"
+LIST_FIELDS = {"sizes", "images", "tags"}
+
+# A single row can't be larger than a Mongo document
+MAX_ROW_BYTES = 16 * 1024 * 1024
+
+class RowTooLarge(Exception):
+    pass
+
+def _split_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+
+def csv_row_to_product(row: dict) -> dict:
+    """Convert a CSV row into the raw dict ProductCreate validates"""
+    product = {}
+    for column, value in row.items():
+        if column is None or value is None:
+            continue
+        value = value.strip()
+        if value == "":
+            continue
+        if column in LIST_FIELDS:
+            product[column] = _split_list(value)
+        elif column == "colors":
+            colors = []
+            for item in _split_list(value):
+                name, _, hex_value = item.rpartition(":")
+                colors.append({"name": name or hex_value, "hex": hex_value})
+            product[column] = colors
+        elif column == "featured":
+            product[column] = value.lower() in ("1", "true", "sim", "yes", "s", "y")
+        else:
+            product[column] = value
+    # Blank and absent columns are left out, so an upsert keeps what the
+    # stored product already has for them
+    return product
+
+def product_to_csv_row(product: dict) -> dict:
+    """Flatten a product document into CSV columns (inverse of csv_row_to_product)"""
+    row = {}
+    for column, value in product.items():
+        if value is None:
+            continue
+        if column in LIST_FIELDS:
+            value = LIST_SEPARATOR.join(str(item) for item in value)
+        elif column == "colors":
+            value = LIST_SEPARATOR.join(f"{c.get('name', '')}:{c.get('hex', '')}" for c in value)
+        elif column == "featured":
+            value = "true" if value else "false"
+        elif hasattr(value, "isoformat"):
+            value = value.isoformat()
+        row[column] = value
+    return row
+
+def csv_header(columns: Iterable[str]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue()
+
+def csv_line(row: dict, columns: Iterable[str]) -> str:
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames=list(columns), extrasaction="ignore").writerow(row)
+    return buffer.getvalue()
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without holding more than one line"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        if len(buffer) > MAX_ROW_BYTES:
+            raise RowTooLarge()
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_ndjson_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (row number, raw product, parse error) for each NDJSON line"""
+    row_number = 0
+    async for line in iter_lines(stream):
+        row_number += 1
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(value, dict):
+            yield row_number, None, "Row must be a JSON object"
+            continue
+        yield row_number, value, None
+
+async def iter_csv_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Yield (row number, raw product, parse error) for each CSV record.
+    The first record is the header. Quoted fields may span lines.
+    """
+    header = None
+    record = ""
+    row_number = 0
+    async for line in iter_lines(stream):
+        record = f"{record}\n{line}" if record else line
+        # An odd number of quotes means a quoted field continues on the next line
+        if record.count('"') % 2:
+            if len(record) > MAX_ROW_BYTES:
+                raise RowTooLarge()
+            continue
+        values = next(csv.reader([record]), [])
+        record = ""
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        row_number += 1
+        if not any(v.strip() for v in values):
+            continue
+        if len(values) > len(header):
+            yield row_number, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row_number, csv_row_to_product(dict(zip(header, values))), None
+    if record:
+        yield row_number + 1, None, "Unterminated quoted field"
@@ -0,0 +1,196 @@
+"""
+Category Stats
+Materialized product counts and price ranges per category, subcategory and
+brand, kept current by the product write routes and checked periodically
+against a full aggregation
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+from cache import response_cache
+from database import CATEGORY_STATS, PRODUCTS, get_collection
+
+CATEGORY_STATS_RECONCILE_SECONDS = float(os.getenv("CATEGORY_STATS_RECONCILE_SECONDS", "3600"))
+
+# Node kinds below a category
+SUBCATEGORY = "subcategory"
+BRAND = "brand"
+CATEGORY = "category"
+
+# Product fields the stats depend on
+STATS_PROJECTION = {"category": 1, "subcategory": 1, "brand": 1, "price": 1}
+
+def _collections():
+    return get_collection(PRODUCTS), get_collection(CATEGORY_STATS)
+
+def _node(category: str, kind: str, name: str) -> dict:
+    # Key order matters for equality on an embedded _id; always build it here
+    return {"category": category, "kind": kind, "name": name}
+
+def product_nodes(product: Optional[dict]) -> List[dict]:
+    """The tree nodes a product counts towards"""
+    if not product or not product.get("category"):
+        return []
+    category = product["category"]
+    nodes = [_node(category, CATEGORY, category)]
+    if product.get("subcategory"):
+        nodes.append(_node(category, SUBCATEGORY, product["subcategory"]))
+    if product.get("brand"):
+        nodes.append(_node(category, BRAND, product["brand"]))
+    return nodes
+
+def _node_filter(node: dict) -> dict:
+    """Products under a node (served by the category/brand listing indexes)"""
+    query = {"category": node["category"]}
+    if node["kind"] != CATEGORY:
+        query[node["kind"]] = node["name"]
+    return query
+
+def _price(product: Optional[dict]) -> Optional[float]:
+    price = (product or {}).get("price")
+    return price if isinstance(price, (int, float)) else None
+
+async def _refresh_ranges(products_collection, stats_collection, nodes: List[dict], removed_price: float):
+    """Recompute the range of nodes whose bound was the removed price"""
+    cursor = stats_collection.find({
+        "_id": {"$in": nodes},
+        "$or": [{"minPrice": removed_price}, {"maxPrice": removed_price}]
+    })
+    async for stored in cursor:
+        query = {**_node_filter(stored["_id"]), "price": {"$type": "number"}}
+        cheapest = await products_collection.find_one(query, {"price": 1}, sort=[("price", 1)])
+        dearest = await products_collection.find_one(query, {"price": 1}, sort=[("price", -1)])
+        await stats_collection.update_one({"_id": stored["_id"]}, {"$set": {
+            "minPrice": cheapest["price"] if cheapest else None,
+            "maxPrice": dearest["price"] if dearest else None
+        }})
+
+async def apply_product_change(before: Optional[dict], after: Optional[dict]):
+    """
+    Move a product's contribution from its old nodes to its new ones:
+    `before` None for a create, `after` None for a delete. Counts use $inc,
+    so concurrent writes never lose updates; ranges widen with $min/$max
+    and are re-read from the indexes when a bound product leaves.
+    """
+    old_nodes, new_nodes = product_nodes(before), product_nodes(after)
+    old_price, new_price = _price(before), _price(after)
+    if old_nodes == new_nodes and old_price == new_price:
+        return
+
+    products_collection, stats_collection = _collections()
+    now = datetime.utcnow()
+    operations = [UpdateOne({"_id": node}, {"$inc": {"count": -1}}) for node in old_nodes]
+    for node in new_nodes:
+        update = {"$inc": {"count": 1}, "$set": {"updatedAt": now}}
+        if new_price is not None:
+            update["$min"] = {"minPrice": new_price}
+            update["$max"] = {"maxPrice": new_price}
+        operations.append(UpdateOne({"_id": node}, update, upsert=True))
+    if not operations:
+        return
+    # Ordered: a node the product stays in is decremented, then incremented
+    await stats_collection.bulk_write(operations, ordered=True)
+
+    if old_nodes:
+        await stats_collection.delete_many({"_id": {"$in": old_nodes}, "count": {"$lte": 0}})
+        if old_price is not None:
+            await _refresh_ranges(products_collection, stats_collection, old_nodes, old_price)
+    response_cache.invalidate(CATEGORY_STATS)
+
+def _stat_fields(group: dict) -> dict:
+    return {"count": group["count"], "minPrice": group["minPrice"], "maxPrice": group["maxPrice"]}
+
+async def compute_category_stats() -> Dict[Tuple[str, str, str], dict]:
+    """Every node's stats from one aggregation over the products"""
+    products_collection, _ = _collections()
+    accumulators = {"count": {"$sum": 1}, "minPrice": {"$min": "$price"}, "maxPrice": {"$max": "$price"}}
+    pipeline = [
+        {"$match": {"category": {"$nin": [None, ""]}}},
+        {"$project": STATS_PROJECTION},
+        {"$facet": {
+            CATEGORY: [{"$group": {"_id": {"category": "$category", "name": "$category"}, **accumulators}}],
+            SUBCATEGORY: [
+                {"$match": {"subcategory": {"$nin": [None, ""]}}},
+                {"$group": {"_id": {"category": "$category", "name": "$subcategory"}, **accumulators}}
+            ],
+            BRAND: [
+                {"$match": {"brand": {"$nin": [None, ""]}}},
+                {"$group": {"_id": {"category": "$category", "name": "$brand"}, **accumulators}}
+            ]
+        }}
+    ]
+    result = (await products_collection.aggregate(pipeline).to_list(length=1))[0]
+    return {
+        (group["_id"]["category"], kind, group["_id"]["name"]): _stat_fields(group)
+        for kind, groups in result.items()
+        for group in groups
+    }
+
+async def reconcile_category_stats() -> int:
+    """Rewrite nodes that drifted from a full aggregation; returns how many"""
+    _, stats_collection = _collections()
+    expected = await compute_category_stats()
+    now = datetime.utcnow()
+    operations = []
+    async for stored in stats_collection.find({}):
+        node = stored["_id"]
+        key = (node.get("category"), node.get("kind"), node.get("name"))
+        fields = expected.pop(key, None)
+        if fields is None:
+            operations.append(DeleteOne({"_id": node}))
+        elif any(stored.get(field) != value for field, value in fields.items()):
+            operations.append(ReplaceOne({"_id": node}, {**fields, "updatedAt": now}))
+    for (category, kind, name), fields in expected.items():
+        operations.append(ReplaceOne({"_id": _node(category, kind, name)}, {**fields, "updatedAt": now}, upsert=True))
+    if operations:
+        await stats_collection.bulk_write(operations, ordered=False)
+        response_cache.invalidate(CATEGORY_STATS)
+    return len(operations)
+
+async def run_stats_reconciler():
+    """Reconcile at startup, then every CATEGORY_STATS_RECONCILE_SECONDS (app lifetime task)"""
+    while True:
+        try:
+            drifted = await reconcile_category_stats()
+            if drifted:
+                print(f"🔁 Category stats: {drifted} node(s) reconciled")
+        except Exception as e:
+            print(f"⚠️ Category stats reconcile failed: {e}")
+        await asyncio.sleep(CATEGORY_STATS_RECONCILE_SECONDS)
+
+async def load_category_tree(categories_collection, stats_collection) -> List[dict]:
+    """Category documents with their subcategory and brand stats nested in"""
+    categories = await categories_collection.find({}).to_list(length=None)
+    nodes: Dict[str, Dict[str, Dict[str, dict]]] = {}
+    async for stored in stats_collection.find({}):
+        node = stored["_id"]
+        nodes.setdefault(node["category"], {}).setdefault(node["kind"], {})[node["name"]] = {
+            "name": node["name"], **_stat_fields(stored)
+        }
+
+    empty = {"count": 0, "minPrice": None, "maxPrice": None}
+    tree = []
+    # Product categories without a category document still get a menu entry
+    known = {category["name"] for category in categories}
+    categories += [{"_id": None, "name": name, "slug": None, "subcategories": []} for name in nodes if name not in known]
+    for category in categories:
+        stats = nodes.get(category["name"], {})
+        own = stats.get(CATEGORY, {}).get(category["name"], empty)
+        subcategories = dict(stats.get(SUBCATEGORY, {}))
+        # The category's own subcategory order first, then any others by count
+        listed = [subcategories.pop(name, {"name": name, **empty}) for name in category.get("subcategories") or []]
+        listed += sorted(subcategories.values(), key=lambda node: -node["count"])
+        tree.append({
+            "_id": category["_id"],
+            "name": category["name"],
+            "slug": category.get("slug"),
+            "image": category.get("image"),
+            **{field: own[field] for field in empty},
+            "subcategories": listed,
+            "brands": sorted(stats.get(BRAND, {}).values(), key=lambda node: (-node["count"], node["name"]))
+        })
+    return tree
@@ -0,0 +1,96 @@
+"""
+Conditional GET
+ETag / Last-Modified validators for catalog reads, computed when a result
+is loaded so that revalidation never re-serializes the body
+"""
+import itertools
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Optional
+
+from fastapi import Request, Response
+
+from responses import MongoJSONResponse
+
+# Clients may keep a copy but must revalidate it before use
+CACHE_CONTROL = "no-cache"
+
+# Distinguishes this process's load counter from other workers' and restarts
+PROCESS_EPOCH = f"{int(time.time()):x}{os.getpid():x}"
+_loads = itertools.count(1)
+
+class Snapshot:
+    """A loaded result together with its validators"""
+    __slots__ = ("content", "etag", "last_modified")
+
+    def __init__(self, content: Any, etag: Optional[str] = None, last_modified: Optional[datetime] = None):
+        self.content = content
+        # Without a natural version, every (re)load counts as a new one
+        self.etag = etag or f'W/"{PROCESS_EPOCH}-{next(_loads):x}"'
+        # Only sent for data that carries its own modification time
+        self.last_modified = last_modified.replace(microsecond=0) if last_modified else None
+
+async def load_snapshot(result: Awaitable[Any]) -> Snapshot:
+    """
+    Await a loader's result and stamp it as a new version. No Last-Modified:
+    the load time says nothing about the data, and at one-second precision
+    a write reloaded within the second a client last fetched would get it a
+    false 304. The ETag alone validates these.
+    """
+    return Snapshot(await result)
+
+def document_snapshot(document: dict) -> Snapshot:
+    """Snapshot of a single document, versioned by its `updatedAt`"""
+    updated_at = document.get("updatedAt")
+    if not isinstance(updated_at, datetime):
+        return Snapshot(document)
+    stamp = int(updated_at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return Snapshot(document, etag=f'"{document["_id"]}-{stamp:x}"', last_modified=updated_at)
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires"""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(tzinfo=timezone.utc) <= since
+
+def conditional_response(request: Request, snapshot: Snapshot) -> Response:
+    """
+    304 if the client's copy is current, else the JSON body.
+    If-None-Match takes precedence over If-Modified-Since.
+    """
+    headers = {"ETag": snapshot.etag, "Cache-Control": CACHE_CONTROL}
+    last_modified = snapshot.last_modified
+    # Within the current second another write could follow with the same
+    # HTTP date; hold the date back until that second is over
+    if last_modified is not None and last_modified >= datetime.utcnow().replace(microsecond=0):
+        last_modified = None
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, snapshot.etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        fresh = (
+            last_modified is not None and bool(if_modified_since)
+            and _not_modified_since(if_modified_since, last_modified)
+        )
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    return MongoJSONResponse(snapshot.content, headers=headers)
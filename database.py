@@ -1,51 +1,211 @@
 """
 MongoDB Database Configuration
+One tuned client per process, opened and closed by the app lifespan and
+handed to routes through FastAPI dependencies
 """
-from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
+from fastapi import Depends
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
+from typing import Annotated, Optional
 import os
 from dotenv import load_dotenv
+from metrics import mongo_listeners
 
 load_dotenv()
 
-# CRITICAL: Read from environment variable to prevent KeyError
 MONGO_URL = os.getenv("MONGO_URL")
-if not MONGO_URL:
-    raise ValueError("MONGO_URL environment variable is required but not set")
-
 DB_NAME = os.getenv("MONGO_DB_NAME", "fashion_catalog")
 
-# Async MongoDB client for FastAPI
-client = AsyncIOMotorClient(MONGO_URL)
-database = client[DB_NAME]
+# Tombstones of deleted products are kept this long for the change feed
+CHANGES_RETENTION_DAYS = int(os.getenv("CHANGES_RETENTION_DAYS", "30"))
 
-# Collections
-products_collection = database.get_collection("products")
-categories_collection = database.get_collection("categories")
+# Connection pool tuning
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "1"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+# Unset by default: long exports must not be cut off mid-stream
+MONGO_SOCKET_TIMEOUT_MS = os.getenv("MONGO_SOCKET_TIMEOUT_MS")
+# Wire compression, in order of preference; the server picks the first it supports
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,zlib")
 
-async def get_database():
-    """Get database instance"""
+# Collection names
+PRODUCTS = "products"
+CATEGORIES = "categories"
+SETTINGS = "settings"
+BRANDS = "brands"
+RESERVATIONS = "reservations"
+RELATED_PRODUCTS = "related_products"
+DELETED_PRODUCTS = "deleted_products"
+CATEGORY_STATS = "category_stats"
+
+client: Optional[AsyncIOMotorClient] = None
+database: Optional[AsyncIOMotorDatabase] = None
+
+def client_options() -> dict:
+    """Keyword arguments for the shared AsyncIOMotorClient"""
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "appname": "fashion-catalog-api",
+        # Command timings and pool waits for GET /metrics
+        "event_listeners": mongo_listeners()
+    }
+    if MONGO_SOCKET_TIMEOUT_MS:
+        options["socketTimeoutMS"] = int(MONGO_SOCKET_TIMEOUT_MS)
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+async def connect(create_indexes: bool = True):
+    """Open the shared client, check the server answers and ensure indexes"""
+    global client, database
+    # CRITICAL: Read from environment variable to prevent KeyError
+    if not MONGO_URL:
+        raise ValueError("MONGO_URL environment variable is required but not set")
+
+    client = AsyncIOMotorClient(MONGO_URL, **client_options())
+    database = client[DB_NAME]
+
+    # Warm-up: fail fast on a bad URL and open the first pooled connection
+    await client.admin.command("ping")
+    if create_indexes:
+        await init_indexes()
+
+def close():
+    """Close the shared client and its pool"""
+    global client, database
+    if client is not None:
+        client.close()
+    client = None
+    database = None
+
+def current_database() -> AsyncIOMotorDatabase:
+    """Database on the shared client (for code outside request handlers)"""
+    if database is None:
+        raise RuntimeError("Database is not connected; call database.connect() first")
     return database
 
+def get_collection(name: str) -> AsyncIOMotorCollection:
+    """Collection on the shared client (for code outside request handlers)"""
+    return current_database()[name]
+
+async def get_database() -> AsyncIOMotorDatabase:
+    """Get database instance"""
+    return current_database()
+
+def get_products_collection() -> AsyncIOMotorCollection:
+    return get_collection(PRODUCTS)
+
+def get_categories_collection() -> AsyncIOMotorCollection:
+    return get_collection(CATEGORIES)
+
+def get_settings_collection() -> AsyncIOMotorCollection:
+    return get_collection(SETTINGS)
+
+def get_brands_collection() -> AsyncIOMotorCollection:
+    return get_collection(BRANDS)
+
+def get_reservations_collection() -> AsyncIOMotorCollection:
+    return get_collection(RESERVATIONS)
+
+def get_related_collection() -> AsyncIOMotorCollection:
+    return get_collection(RELATED_PRODUCTS)
+
+def get_deleted_products_collection() -> AsyncIOMotorCollection:
+    return get_collection(DELETED_PRODUCTS)
+
+def get_category_stats_collection() -> AsyncIOMotorCollection:
+    return get_collection(CATEGORY_STATS)
+
+# Route parameter types that inject a collection
+ProductsCollection = Annotated[AsyncIOMotorCollection, Depends(get_products_collection)]
+CategoriesCollection = Annotated[AsyncIOMotorCollection, Depends(get_categories_collection)]
+SettingsCollection = Annotated[AsyncIOMotorCollection, Depends(get_settings_collection)]
+BrandsCollection = Annotated[AsyncIOMotorCollection, Depends(get_brands_collection)]
+ReservationsCollection = Annotated[AsyncIOMotorCollection, Depends(get_reservations_collection)]
+RelatedCollection = Annotated[AsyncIOMotorCollection, Depends(get_related_collection)]
+DeletedProductsCollection = Annotated[AsyncIOMotorCollection, Depends(get_deleted_products_collection)]
+CategoryStatsCollection = Annotated[AsyncIOMotorCollection, Depends(get_category_stats_collection)]
+
+# Listing indexes in ESR order: equality filters, then the sort key with the
+# `_id` tiebreaker, so pages come off the index without an in-memory SORT.
+# Each also serves the reverse sort and, via its prefix, the bare filter.
+# Checked against the listing query shapes by scripts/index_advisor.py.
+PRODUCT_LISTING_INDEXES = [
+    [("createdAt", -1), ("_id", -1)],
+    [("price", 1), ("_id", 1)],
+    [("reviewCount", -1), ("_id", -1)],
+    [("category", 1), ("createdAt", -1), ("_id", -1)],
+    [("category", 1), ("price", 1), ("_id", 1)],
+    [("category", 1), ("reviewCount", -1), ("_id", -1)],
+    [("category", 1), ("subcategory", 1), ("createdAt", -1), ("_id", -1)],
+    [("category", 1), ("subcategory", 1), ("price", 1), ("_id", 1)],
+    [("brand", 1), ("createdAt", -1), ("_id", -1)],
+    [("brand", 1), ("price", 1), ("_id", 1)],
+    [("featured", 1), ("createdAt", -1), ("_id", -1)]
+]
+
+# Server error code for an index that exists with different options
+INDEX_OPTIONS_CONFLICT = 85
+
+async def _ensure_ttl_index(collection: AsyncIOMotorCollection, field: str, seconds: int):
+    """Create a TTL index, or change the expiry of the existing one in place"""
+    try:
+        await collection.create_index(field, expireAfterSeconds=seconds)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        await collection.database.command(
+            "collMod", collection.name,
+            index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds}
+        )
+        print(f"🔁 TTL of {collection.name}.{field} changed to {seconds}s")
+
 async def init_indexes():
     """Initialize database indexes for performance"""
-    # Products indexes
-    await products_collection.create_index("category")
-    await products_collection.create_index("brand")
-    await products_collection.create_index("price")
-    await products_collection.create_index("featured")
-    await products_collection.create_index([("createdAt", -1)])
-    
+    products_collection = get_collection(PRODUCTS)
+    categories_collection = get_collection(CATEGORIES)
+
+    # Products indexes (replace the former single-field category, brand,
+    # price, featured and createdAt indexes, which they cover)
+    for keys in PRODUCT_LISTING_INDEXES:
+        await products_collection.create_index(keys)
+
+    # Change feed keyset: (updatedAt, _id)
+    await products_collection.create_index([("updatedAt", 1), ("_id", 1)])
+
+    # Natural keys used by bulk import upserts
+    await products_collection.create_index("sku", sparse=True)
+    await products_collection.create_index([("name", 1), ("brand", 1)])
+
     # Text search index
     await products_collection.create_index([
         ("name", "text"),
         ("description", "text"),
         ("tags", "text")
     ])
-    
+
     # Categories indexes
     await categories_collection.create_index("slug", unique=True)
-    
-    print("✅ Database indexes initialized successfully")
 
-# Initialize indexes on startup (call this in main.py if needed)
+    # Settings are looked up by type
+    await get_collection(SETTINGS).create_index("type")
+
+    # The expiry sweeper looks for active reservations past their deadline
+    await get_collection(RESERVATIONS).create_index([("status", 1), ("expiresAt", 1)])
+
+    # Finds the neighbour lists a changed product appears in
+    await get_collection(RELATED_PRODUCTS).create_index("related.productId")
+
+    # Change feed tombstones, paged by deletedAt and expired after the
+    # retention (which operators may change between deploys)
+    await _ensure_ttl_index(get_collection(DELETED_PRODUCTS), "deletedAt", CHANGES_RETENTION_DAYS * 86400)
+
+    print("✅ Database indexes initialized successfully")
@@ -0,0 +1,152 @@
+"""
+Image Derivatives
+Resized WebP/JPEG variants of stored images, encoded on a process pool
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from storage import get_blob_store
+
+# Preset widths served by GET /images/{hash}?w=
+SIZES = {"thumb": 160, "card": 320, "zoom": 1200}
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+QUALITY = 80
+# Written after all other variants, so its presence means the set is complete
+_LAST_VARIANT = (max(SIZES.values()), list(FORMATS)[-1])
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Fresh pools tried after a worker died mid-job (e.g. killed for memory)
+POOL_RETRIES = 1
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Originals whose derivatives are known to be stored / cannot be created
+_ready = set()
+_failed = set()
+# Originals currently being processed, so concurrent requests share the work
+_pending: Dict[str, asyncio.Future] = {}
+
+class UndecodableImage(Exception):
+    """The original is not an image Pillow can (safely) open"""
+
+def derivative_key(key: str, width: int, fmt: str) -> str:
+    return f"{key}-{width}.{fmt}"
+
+def pick_width(requested: int) -> int:
+    """Smallest preset at least as wide as requested (or the largest one)"""
+    widths = sorted(SIZES.values())
+    for width in widths:
+        if width >= requested:
+            return width
+    return widths[-1]
+
+def _render(data: bytes) -> Dict[Tuple[int, str], bytes]:
+    """Encode every preset size/format of an image (runs in a worker process)"""
+    # Imported here so only the worker processes pay for Pillow
+    from PIL import Image, ImageOps
+
+    try:
+        source = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+        source.load()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        # Unidentified, truncated or oversized: retrying won't help
+        raise UndecodableImage(f"{type(e).__name__}: {e}") from None
+    has_alpha = source.mode in ("RGBA", "LA") or "transparency" in source.info
+    results = {}
+    for width in SIZES.values():
+        image = source.copy()
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        for fmt in FORMATS:
+            out = io.BytesIO()
+            if fmt == "jpeg":
+                image.convert("RGB").save(out, "JPEG", quality=QUALITY, optimize=True, progressive=True)
+            else:
+                image.convert("RGBA" if has_alpha else "RGB").save(out, "WEBP", quality=QUALITY, method=4)
+            results[(width, fmt)] = out.getvalue()
+    return results
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that already runs driver threads is unsafe
+        _pool = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+def _discard_pool(broken: ProcessPoolExecutor):
+    """Drop a pool whose worker died; the next job starts a fresh one"""
+    global _pool
+    if _pool is broken:
+        _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_pool():
+    """Stop the worker processes (called on app shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def _generate(key: str) -> bool:
+    store = get_blob_store()
+    if await store.exists(derivative_key(key, *_LAST_VARIANT)):
+        return True
+
+    blob = await store.open(key)
+    if blob is None:
+        raise FileNotFoundError(key)
+    data = b"".join([chunk async for chunk in blob.iter_range(0, blob.length)])
+
+    loop = asyncio.get_running_loop()
+    for attempt in range(POOL_RETRIES + 1):
+        pool = _get_pool()
+        try:
+            results = await loop.run_in_executor(pool, _render, data)
+            break
+        except UndecodableImage as e:
+            print(f"⚠️ Could not create derivatives for {key}: {e}")
+            return False
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if attempt == POOL_RETRIES:
+                raise
+
+    for (width, fmt), encoded in results.items():
+        if (width, fmt) != _LAST_VARIANT:
+            await store.put(derivative_key(key, width, fmt), encoded, FORMATS[fmt])
+    width, fmt = _LAST_VARIANT
+    await store.put(derivative_key(key, width, fmt), results[_LAST_VARIANT], FORMATS[fmt])
+    return True
+
+async def ensure_derivatives(key: str) -> bool:
+    """
+    Create the derivatives of a stored image unless they already exist.
+    Memoized by content hash; concurrent calls for one image share one job.
+    Returns False if the original cannot be decoded as an image, or if the
+    job failed for another reason (only the former is remembered, so a
+    crashed worker or a storage error is retried on the next call).
+    """
+    if key in _ready:
+        return True
+    if key in _failed:
+        return False
+    future = _pending.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_generate(key))
+        _pending[key] = future
+        future.add_done_callback(lambda _: _pending.pop(key, None))
+    try:
+        ok = await asyncio.shield(future)
+    except Exception as e:
+        print(f"⚠️ Derivatives for {key} failed, will retry: {type(e).__name__}: {e}")
+        return False
+    (_ready if ok else _failed).add(key)
+    return ok
@@ -2,18 +2,57 @@
 FastAPI Backend - Fashion Catalog API
 Entry point for the backend server
 """
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from routes import products, categories, settings, upload
+from routes import products, categories, settings, upload, images, reservations
+from search import load_search_index
+from suggest import load_suggest_index
+from related import load_related_index
+from category_stats import run_stats_reconciler
+from cache import response_cache
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, render as render_metrics
+from derivatives import shutdown_pool
+import database
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared MongoDB pool before serving and close it on shutdown"""
+    await database.connect()
+    try:
+        await load_search_index()
+    except Exception as e:
+        # Searches fall back to regex scans until the index is available
+        print(f"⚠️ Search index not built: {e}")
+    try:
+        await load_suggest_index()
+    except Exception as e:
+        # /api/products/suggest returns no suggestions until it is available
+        print(f"⚠️ Suggest index not built: {e}")
+    try:
+        await load_related_index()
+    except Exception as e:
+        # Stored related lists are still served; changes aren't propagated
+        print(f"⚠️ Related products index not loaded: {e}")
+    sweeper = asyncio.create_task(reservations.run_expiry_sweeper())
+    reconciler = asyncio.create_task(run_stats_reconciler())
+    yield
+    sweeper.cancel()
+    reconciler.cancel()
+    # Stop the image derivative worker processes
+    shutdown_pool()
+    database.close()
+
 app = FastAPI(
     title="Fashion Catalog API",
     description="Backend API for Fashion E-commerce Catalog - Loja A Grande Família",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration - Robust handling for string or list
@@ -36,12 +75,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(products.router)
 app.include_router(categories.router)
 app.include_router(settings.router)
 app.include_router(upload.router)
+app.include_router(images.router)
+app.include_router(reservations.router)
 
 @app.get("/")
 async def root():
@@ -57,6 +99,16 @@ async def health_check():
     """Health check endpoint for deployment platforms"""
     return {"status": "healthy", "service": "fastapi-backend"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Response cache counters, for sizing CACHE_MAX_ENTRIES / CACHE_TTL_SECONDS"""
+    return response_cache.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Per-route HTTP and per-collection MongoDB metrics in Prometheus text format"""
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
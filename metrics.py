@@ -0,0 +1,247 @@
+"""
+Metrics
+Prometheus text-format counters and histograms for HTTP routes and MongoDB
+commands, kept in process and cheap enough to leave on in production
+"""
+import bisect
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from pymongo import monitoring
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket upper bounds, in seconds / bytes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Label for requests that matched no API route (404s, docs), so that
+# arbitrary URLs can't create new series
+UNMATCHED_ROUTE = "<unmatched>"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        # Updated from driver threads as well as the event loop
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        lines = []
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+REGISTRY: List[_Metric] = []
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# HTTP
+http_requests = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_duration = Histogram("http_request_duration_seconds", "HTTP request latency, until the body is sent", ("method", "route"))
+http_response_size = Histogram("http_response_size_bytes", "HTTP response body size", ("method", "route"), SIZE_BUCKETS)
+http_in_progress = Gauge("http_requests_in_progress", "HTTP requests being handled")
+
+# MongoDB
+mongo_duration = Histogram("mongodb_command_duration_seconds", "MongoDB command latency", ("collection", "command"), MONGO_BUCKETS)
+mongo_failures = Counter("mongodb_command_failures_total", "Failed MongoDB commands", ("collection", "command"))
+pool_wait = Histogram("mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", buckets=MONGO_BUCKETS)
+pool_checkout_failures = Counter("mongodb_pool_checkout_failures_total", "Failed pool checkouts by reason", ("reason",))
+pool_connections = Gauge("mongodb_pool_connections", "Open pooled connections")
+pool_checked_out = Gauge("mongodb_pool_connections_checked_out", "Pooled connections in use")
+
+# Response cache loads (single-flight)
+singleflight_calls = Counter(
+    "cache_loads_total", "Cache misses by whether they ran the load or joined one in flight", ("name", "role")
+)
+singleflight_failures = Counter("cache_load_failures_total", "Shared loads that raised or were cancelled", ("name", "reason"))
+singleflight_in_flight = Gauge("cache_loads_in_flight", "Loads currently running")
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no per-request Request/Response objects). Labels
+    requests with the route template, e.g. /api/products/{product_id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_progress.dec()
+            # FastAPI stores the matched APIRoute in the scope while routing
+            route = scope.get("route")
+            path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+            http_requests.inc(method, path, str(status))
+            http_duration.observe(time.perf_counter() - start, method, path)
+            http_response_size.observe(size, method, path)
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every command per collection (called on driver threads)"""
+
+    def __init__(self):
+        # (connection, request id) -> collection, between started and finished
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        collection = target if isinstance(target, str) else ""
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _collection(self, event) -> str:
+        return self._collections.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event):
+        mongo_duration.observe(event.duration_micros / 1e6, self._collection(event), event.command_name)
+
+    def failed(self, event):
+        collection = self._collection(event)
+        mongo_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        mongo_failures.inc(collection, event.command_name)
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool occupancy and checkout waits"""
+
+    def connection_checked_out(self, event):
+        pool_checked_out.inc()
+        if event.duration is not None:
+            pool_wait.observe(event.duration)
+
+    def connection_checked_in(self, event):
+        pool_checked_out.dec()
+
+    def connection_check_out_failed(self, event):
+        pool_checkout_failures.inc(str(event.reason))
+        if event.duration is not None:
+            pool_wait.observe(event.duration)
+
+    def connection_created(self, event):
+        pool_connections.inc()
+
+    def connection_closed(self, event):
+        pool_connections.dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+def mongo_listeners() -> list:
+    """Event listeners to register on the MongoClient"""
+    return [CommandMetrics(), PoolMetrics()]
@@ -1,11 +1,12 @@
 """
 Pydantic Models for Request/Response Validation
 """
-from pydantic import BaseModel, Field, ConfigDict, GetCoreSchemaHandler
+from pydantic import BaseModel, Field, ConfigDict, GetCoreSchemaHandler, field_validator
 from pydantic_core import core_schema
 from typing import Optional, List, Any
 from datetime import datetime
 from bson import ObjectId
+from storage import stored_image_url
 
 class PyObjectId(ObjectId):
     """Custom ObjectId type for Pydantic v2"""
@@ -56,6 +57,12 @@ class ProductBase(BaseModel):
     tags: Optional[List[str]] = []
     rating: Optional[float] = None
     reviewCount: Optional[int] = 0
+    sku: Optional[str] = None
+
+    @field_validator("images")
+    @classmethod
+    def store_image_paths(cls, images: List[str]) -> List[str]:
+        return [stored_image_url(url) for url in images]
 
 class ProductCreate(ProductBase):
     """Model for creating a new product"""
@@ -78,6 +85,43 @@ class ProductUpdate(BaseModel):
     tags: Optional[List[str]] = None
     rating: Optional[float] = None
     reviewCount: Optional[int] = None
+    sku: Optional[str] = None
+
+    @field_validator("images")
+    @classmethod
+    def store_image_paths(cls, images: Optional[List[str]]) -> Optional[List[str]]:
+        return None if images is None else [stored_image_url(url) for url in images]
+
+class ProductBatchRequest(BaseModel):
+    """Model for looking up many products at once"""
+    ids: List[str]
+    fields: Optional[str] = None
+
+class PriceStockUpdate(BaseModel):
+    """Price and stock fields a bulk update can set"""
+    price: Optional[float] = Field(None, ge=0)
+    originalPrice: Optional[float] = Field(None, ge=0)
+    stock: Optional[int] = Field(None, ge=0)
+
+class ProductPatch(PriceStockUpdate):
+    """One product's change in a bulk update"""
+    id: str
+
+class ProductFilter(BaseModel):
+    """Listing filters selecting the products a bulk update applies to"""
+    category: Optional[str] = None
+    subcategory: Optional[str] = None
+    brand: Optional[str] = None
+    minPrice: Optional[float] = None
+    maxPrice: Optional[float] = None
+    featured: Optional[bool] = None
+
+class ProductBulkUpdate(BaseModel):
+    """Model for bulk price/stock updates: per-ID changes and/or one filter-wide change"""
+    updates: List[ProductPatch] = []
+    filter: Optional[ProductFilter] = None
+    set: Optional[PriceStockUpdate] = None
+    percentOff: Optional[float] = Field(None, gt=0, lt=100)
 
 class Product(ProductBase):
     """Complete product model with ID and timestamps"""
@@ -109,3 +153,18 @@ class CategoryCreate(BaseModel):
     slug: str
     subcategories: Optional[List[str]] = []
     image: Optional[str] = None
+
+    @field_validator("image")
+    @classmethod
+    def store_image_path(cls, image: Optional[str]) -> Optional[str]:
+        return None if image is None else stored_image_url(image)
+
+class ReservationItem(BaseModel):
+    """One line item of a stock reservation"""
+    productId: str
+    quantity: int = Field(..., ge=1)
+
+class ReservationCreate(BaseModel):
+    """Model for reserving stock of one or more products"""
+    items: List[ReservationItem] = Field(..., min_length=1)
+    ttlSeconds: Optional[int] = Field(None, ge=30, le=86400)
@@ -0,0 +1,306 @@
+"""
+Related Products
+"You may also like" neighbours precomputed from product feature vectors
+(category, subcategory, brand, tags, colors, price band) and stored in the
+related_products collection
+"""
+import asyncio
+import math
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from search import fold
+
+# Neighbours kept per product
+RELATED_LIMIT = int(os.getenv("RELATED_LIMIT", "12"))
+
+# How much each attribute counts towards similarity
+FEATURE_WEIGHTS = {
+    "category": 2.0,
+    "subcategory": 3.0,
+    "brand": 1.5,
+    "tags": 1.0,
+    "colors": 0.5,
+    "price": 1.5
+}
+# Price bands grow geometrically: 20-30, 30-45, 45-67...
+PRICE_BAND_RATIO = 1.5
+# Rows scored per matrix product (bounds the batch x catalog score matrix)
+BATCH_ROWS = 1024
+
+FEATURE_PROJECTION = {field: 1 for field in ("category", "subcategory", "brand", "tags", "colors", "price")}
+
+Neighbours = List[Tuple[str, float]]
+
+def product_features(product: dict) -> Dict[str, float]:
+    """Weighted sparse features of a product"""
+    features: Dict[str, float] = {}
+
+    def add(name: str, weight: float):
+        features[name] = features.get(name, 0.0) + weight
+
+    category = fold(str(product.get("category") or "")).strip()
+    if category:
+        add(f"category:{category}", FEATURE_WEIGHTS["category"])
+    subcategory = fold(str(product.get("subcategory") or "")).strip()
+    if subcategory:
+        # "Infantil/Calças" and "Feminino/Calças" are different things
+        add(f"subcategory:{category}/{subcategory}", FEATURE_WEIGHTS["subcategory"])
+    brand = fold(str(product.get("brand") or "")).strip()
+    if brand:
+        add(f"brand:{brand}", FEATURE_WEIGHTS["brand"])
+    for field in ("tags", "colors"):
+        # Colors are {"name", "hex"} objects
+        values = {
+            fold(str(value.get("name") if isinstance(value, dict) else value)).strip()
+            for value in product.get(field) or []
+        } - {""}
+        # Spread the field's weight so long tag lists don't dominate
+        for value in values:
+            add(f"{field}:{value}", FEATURE_WEIGHTS[field] / math.sqrt(len(values)))
+    price = product.get("price")
+    if isinstance(price, (int, float)) and price > 0:
+        band = math.floor(math.log(price, PRICE_BAND_RATIO))
+        add(f"price:{band}", FEATURE_WEIGHTS["price"])
+        # Neighbouring bands count half, so 44.90 and 45.10 still match
+        add(f"price:{band - 1}", FEATURE_WEIGHTS["price"] / 2)
+        add(f"price:{band + 1}", FEATURE_WEIGHTS["price"] / 2)
+    return features
+
+class RelatedIndex:
+    """
+    Dense matrix of L2-normalized product vectors (one row per product,
+    one column per feature seen) scored with batched matrix products.
+    Also remembers each product's stored k-th neighbour score, so a change
+    only recomputes the lists it can actually enter or leave.
+    """
+
+    def __init__(self):
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._columns: Dict[str, int] = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        # Lowest stored score per row; inf when nothing is stored yet
+        self._floors = np.zeros(0, dtype=np.float32)
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._rows
+
+    def replace_with(self, other: "RelatedIndex"):
+        """Take over another index's contents in one step"""
+        self._ids = other._ids
+        self._rows = other._rows
+        self._columns = other._columns
+        self._matrix = other._matrix
+        self._floors = other._floors
+        self.ready = True
+
+    def _grow(self, rows: int, columns: int):
+        """Make room for at least `rows` x `columns`, doubling as needed"""
+        current_rows, current_columns = self._matrix.shape
+        if rows <= current_rows and columns <= current_columns:
+            return
+        new_rows = max(rows, current_rows * 2, 64) if rows > current_rows else current_rows
+        new_columns = max(columns, current_columns * 2, 64) if columns > current_columns else current_columns
+        matrix = np.zeros((new_rows, new_columns), dtype=np.float32)
+        matrix[:current_rows, :current_columns] = self._matrix
+        floors = np.full(new_rows, np.inf, dtype=np.float32)
+        floors[:current_rows] = self._floors
+        self._matrix, self._floors = matrix, floors
+
+    def add(self, product: dict):
+        """Set a product's vector, replacing any previous one"""
+        product_id = str(product["_id"])
+        features = product_features(product)
+        for name in features:
+            if name not in self._columns:
+                self._columns[name] = len(self._columns)
+        row = self._rows.get(product_id)
+        if row is None:
+            row = len(self._ids)
+            self._grow(row + 1, len(self._columns))
+            self._ids.append(product_id)
+            self._rows[product_id] = row
+        else:
+            self._grow(len(self._ids), len(self._columns))
+        vector = self._matrix[row]
+        vector[:] = 0
+        for name, weight in features.items():
+            vector[self._columns[name]] = weight
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+
+    def remove(self, product_id: str):
+        """Drop a product (the last row moves into its place)"""
+        row = self._rows.pop(product_id, None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        if row != last:
+            moved = self._ids[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+            self._matrix[row] = self._matrix[last]
+            self._floors[row] = self._floors[last]
+        self._ids.pop()
+        self._matrix[last] = 0
+        self._floors[last] = np.inf
+
+    def product_id(self, row: int) -> str:
+        return self._ids[row]
+
+    def floor(self, row: int) -> float:
+        return float(self._floors[row])
+
+    def rows(self, product_ids: Iterable[str]) -> List[int]:
+        return [self._rows[product_id] for product_id in product_ids if product_id in self._rows]
+
+    def all_rows(self) -> List[int]:
+        return list(range(len(self._ids)))
+
+    def set_floor(self, row: int, neighbours: Neighbours, limit: int):
+        # A short list takes any positive score
+        self._floors[row] = neighbours[-1][1] if len(neighbours) >= limit else 0.0
+
+    def load_floor(self, product_id: str, score: float):
+        row = self._rows.get(product_id)
+        if row is not None:
+            self._floors[row] = score
+
+    def neighbours(self, rows: List[int], limit: int = RELATED_LIMIT) -> List[Neighbours]:
+        """Top `limit` (product_id, cosine) for each row, best first"""
+        count = len(self._ids)
+        active = self._matrix[:count]
+        k = min(limit, count - 1)
+        results: List[Neighbours] = []
+        for start in range(0, len(rows), BATCH_ROWS):
+            batch = np.asarray(rows[start:start + BATCH_ROWS], dtype=np.intp)
+            if k <= 0:
+                results.extend([] for _ in batch)
+                continue
+            scores = self._matrix[batch] @ active.T
+            # A product is not related to itself
+            scores[np.arange(len(batch)), batch] = -1.0
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for columns, values in zip(top.tolist(), top_scores.tolist()):
+                results.append([(self._ids[j], score) for j, score in zip(columns, values) if score > 0])
+        return results
+
+    def affected_by(self, product_id: str) -> List[int]:
+        """Rows whose stored list the product would now enter"""
+        row = self._rows.get(product_id)
+        if row is None:
+            return []
+        count = len(self._ids)
+        scores = self._matrix[:count] @ self._matrix[row]
+        entering = scores > self._floors[:count]
+        entering[row] = False
+        return np.flatnonzero(entering).tolist()
+
+# Shared index for the running process
+related_index = RelatedIndex()
+# Serializes index changes with the neighbour computations that read it
+_lock = asyncio.Lock()
+
+def _related_collection():
+    from database import RELATED_PRODUCTS, get_collection
+
+    return get_collection(RELATED_PRODUCTS)
+
+async def _build_index(with_floors: bool) -> RelatedIndex:
+    from database import PRODUCTS, get_collection
+
+    fresh = RelatedIndex()
+    async for product in get_collection(PRODUCTS).find({}, FEATURE_PROJECTION):
+        fresh.add(product)
+    if with_floors:
+        async for stored in _related_collection().find({}, {"minScore": 1}):
+            fresh.load_floor(str(stored["_id"]), stored.get("minScore", 0.0))
+    return fresh
+
+async def _store(rows: List[int], limit: int = RELATED_LIMIT, now: Optional[datetime] = None):
+    """Compute and upsert the neighbour lists of `rows`"""
+    now = now or datetime.utcnow()
+    collection = _related_collection()
+    for start in range(0, len(rows), BATCH_ROWS):
+        batch = rows[start:start + BATCH_ROWS]
+        # The matrix products release the GIL; keep the event loop free
+        lists = await asyncio.to_thread(related_index.neighbours, batch, limit)
+        operations = []
+        for row, neighbours in zip(batch, lists):
+            related_index.set_floor(row, neighbours, limit)
+            operations.append(ReplaceOne(
+                {"_id": ObjectId(related_index.product_id(row))},
+                {
+                    "related": [{"productId": ObjectId(product_id), "score": round(score, 4)} for product_id, score in neighbours],
+                    "minScore": related_index.floor(row),
+                    "updatedAt": now
+                },
+                upsert=True
+            ))
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+
+async def load_related_index():
+    """Load product vectors and stored scores (no neighbours are recomputed)"""
+    fresh = await _build_index(with_floors=True)
+    async with _lock:
+        related_index.replace_with(fresh)
+    print(f"✅ Related products index loaded ({len(related_index)} products)")
+
+async def rebuild_related() -> int:
+    """Recompute every product's neighbours and drop lists of deleted products"""
+    started = datetime.utcnow()
+    fresh = await _build_index(with_floors=False)
+    async with _lock:
+        related_index.replace_with(fresh)
+        await _store(related_index.all_rows(), now=started)
+    await _related_collection().delete_many({"updatedAt": {"$lt": started}})
+    return len(related_index)
+
+async def refresh_related(product_id: str):
+    """
+    Bring the stored lists up to date after a product was created, changed
+    or deleted: its own list, the lists it now enters and the lists it was in
+    """
+    from database import PRODUCTS, get_collection
+
+    if not related_index.ready:
+        return
+    product = await get_collection(PRODUCTS).find_one({"_id": ObjectId(product_id)}, FEATURE_PROJECTION)
+    containing = [
+        str(stored["_id"])
+        async for stored in _related_collection().find({"related.productId": ObjectId(product_id)}, {"_id": 1})
+    ]
+    async with _lock:
+        if product is None:
+            related_index.remove(product_id)
+            await _related_collection().delete_one({"_id": ObjectId(product_id)})
+            rows = set(related_index.rows(containing))
+        else:
+            related_index.add(product)
+            rows = set(related_index.rows([product_id] + containing))
+            rows.update(related_index.affected_by(product_id))
+        await _store(sorted(rows))
+
+async def ensure_related(product_id: str) -> bool:
+    """Compute a missing list on demand; False if the product isn't indexed"""
+    async with _lock:
+        if product_id not in related_index:
+            return False
+        await _store(related_index.rows([product_id]))
+    return True
@@ -0,0 +1,33 @@
+"""
+Fast JSON Responses
+orjson-encoded responses that understand BSON types, for hot read endpoints
+"""
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+
+from storage import public_image_urls
+
+def _default(value):
+    # datetime is handled natively by orjson (same ISO format as isoformat())
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    """Encode documents straight from Mongo, ObjectIds and datetimes included"""
+    return orjson.dumps(content, default=_default)
+
+class MongoJSONResponse(Response):
+    """
+    JSON response for raw Mongo documents.
+    Returning one from a handler skips FastAPI's jsonable_encoder pass, so
+    documents need no `_id` rewriting first. Stored image paths in `images`
+    and `image` fields go out as absolute URLs on IMAGE_BASE_URL.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(public_image_urls(content))
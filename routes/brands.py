@@ -4,17 +4,11 @@ from pydantic import BaseModel
 from typing import Optional
 from bson import ObjectId
 from datetime import datetime
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import BrandsCollection
+from responses import MongoJSONResponse
 
 router = APIRouter()
 
-# MongoDB connection
-MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGODB_URL)
-db = client.fashion_catalog
-brands_collection = db.brands
-
 class BrandCreate(BaseModel):
     name: str
     description: Optional[str] = None
@@ -25,32 +19,28 @@ class BrandUpdate(BaseModel):
     description: Optional[str] = None
     logo: Optional[str] = None
 
-@router.get("/brands")
-async def get_brands():
+@router.get("/brands", response_class=MongoJSONResponse)
+async def get_brands(brands_collection: BrandsCollection):
     """Get all brands"""
     try:
-        brands = []
-        async for brand in brands_collection.find():
-            brand["_id"] = str(brand["_id"])
-            brands.append(brand)
-        return JSONResponse(content=brands)
+        brands = await brands_collection.find().to_list(length=None)
+        return MongoJSONResponse(brands)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/brands/{brand_id}")
-async def get_brand(brand_id: str):
+@router.get("/brands/{brand_id}", response_class=MongoJSONResponse)
+async def get_brand(brand_id: str, brands_collection: BrandsCollection):
     """Get a single brand by ID"""
     try:
         brand = await brands_collection.find_one({"_id": ObjectId(brand_id)})
         if not brand:
             raise HTTPException(status_code=404, detail="Marca não encontrada")
-        brand["_id"] = str(brand["_id"])
-        return JSONResponse(content=brand)
+        return MongoJSONResponse(brand)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/brands")
-async def create_brand(brand: BrandCreate):
+async def create_brand(brand: BrandCreate, brands_collection: BrandsCollection):
     """Create a new brand"""
     try:
         brand_dict = brand.dict()
@@ -65,7 +55,7 @@ async def create_brand(brand: BrandCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/brands/{brand_id}")
-async def update_brand(brand_id: str, brand: BrandUpdate):
+async def update_brand(brand_id: str, brand: BrandUpdate, brands_collection: BrandsCollection):
     """Update a brand"""
     try:
         update_data = {k: v for k, v in brand.dict().items() if v is not None}
@@ -90,7 +80,7 @@ async def update_brand(brand_id: str, brand: BrandUpdate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/brands/{brand_id}")
-async def delete_brand(brand_id: str):
+async def delete_brand(brand_id: str, brands_collection: BrandsCollection):
     """Delete a brand"""
     try:
         result = await brands_collection.delete_one({"_id": ObjectId(brand_id)})
@@ -2,28 +2,54 @@
 Category API Routes
 Handles category operations
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from typing import List
 from models import Category, CategoryCreate
-from database import categories_collection
+from database import CATEGORIES, CATEGORY_STATS, CategoriesCollection, CategoryStatsCollection
 from bson import ObjectId
+from cache import response_cache
+from responses import MongoJSONResponse
+from conditional import conditional_response, load_snapshot
+from suggest import suggest_index
+from category_stats import load_category_tree
 
 router = APIRouter(prefix="/api/categories", tags=["categories"])
 
-@router.get("/", response_model=List[dict])
-async def get_categories():
-    """Get all categories"""
+@router.get("/", response_class=MongoJSONResponse)
+async def get_categories(request: Request, categories_collection: CategoriesCollection):
+    """Get all categories (conditional GET via ETag)"""
+    snapshot = await response_cache.get_or_load(
+        "categories:list", [CATEGORIES], {},
+        lambda: load_snapshot(_load_categories(categories_collection))
+    )
+    return conditional_response(request, snapshot)
+
+async def _load_categories(categories_collection: CategoriesCollection) -> List[dict]:
+    """Uncached body of get_categories"""
     cursor = categories_collection.find({})
-    categories = await cursor.to_list(length=100)
-    
-    # Convert ObjectId to string
-    for category in categories:
-        category["_id"] = str(category["_id"])
+    return await cursor.to_list(length=100)
+
+@router.get("/tree", response_class=MongoJSONResponse)
+async def get_category_tree(
+    request: Request,
+    categories_collection: CategoriesCollection,
+    stats_collection: CategoryStatsCollection
+):
+    """
+    Menu tree: each category with its product count and price range, and
+    the same per subcategory and per brand
     
-    return categories
+    Read from the materialized category_stats collection, which product
+    writes keep current; no products are counted per request.
+    """
+    snapshot = await response_cache.get_or_load(
+        "categories:tree", [CATEGORIES, CATEGORY_STATS], {},
+        lambda: load_snapshot(load_category_tree(categories_collection, stats_collection))
+    )
+    return conditional_response(request, snapshot)
 
-@router.get("/{category_id}")
-async def get_category(category_id: str):
+@router.get("/{category_id}", response_class=MongoJSONResponse)
+async def get_category(category_id: str, categories_collection: CategoriesCollection):
     """Get a single category by ID"""
     if not ObjectId.is_valid(category_id):
         raise HTTPException(status_code=400, detail="Invalid category ID")
@@ -32,11 +58,10 @@ async def get_category(category_id: str):
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    category["_id"] = str(category["_id"])
-    return category
+    return MongoJSONResponse(category)
 
 @router.post("/", status_code=201)
-async def create_category(category: CategoryCreate):
+async def create_category(category: CategoryCreate, categories_collection: CategoriesCollection):
     """Create a new category"""
     # Check if slug already exists
     existing = await categories_collection.find_one({"slug": category.slug})
@@ -47,11 +72,13 @@ async def create_category(category: CategoryCreate):
     result = await categories_collection.insert_one(category_dict)
     created_category = await categories_collection.find_one({"_id": result.inserted_id})
     created_category["_id"] = str(created_category["_id"])
+    suggest_index.add_category(created_category)
+    response_cache.invalidate(CATEGORIES)
     
-    return created_category
+    return MongoJSONResponse(created_category, status_code=201)
 
 @router.delete("/{category_id}", status_code=204)
-async def delete_category(category_id: str):
+async def delete_category(category_id: str, categories_collection: CategoriesCollection):
     """Delete a category"""
     if not ObjectId.is_valid(category_id):
         raise HTTPException(status_code=400, detail="Invalid category ID")
@@ -61,4 +88,6 @@ async def delete_category(category_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
     
+    suggest_index.remove_category(category_id)
+    response_cache.invalidate(CATEGORIES)
     return None
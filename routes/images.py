@@ -0,0 +1,111 @@
+"""
+Image API Routes
+Streams stored images with long-lived caching and Range support
+"""
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, Tuple
+from derivatives import derivative_key, ensure_derivatives, pick_width
+from storage import get_blob_store, is_valid_key
+
+router = APIRouter(tags=["images"])
+
+# Content-addressed blobs never change, so clients may cache them forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+# The original served in place of a variant that couldn't be made (yet);
+# revalidated so the variant replaces it once it exists
+FALLBACK_CACHE_CONTROL = "no-cache"
+
+def _parse_range(header: str, length: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into [start, end).
+    Returns None for a malformed or multi-range header (served whole) and
+    raises 416 for a range outside the blob.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else length
+        else:
+            # Suffix range: the last N bytes
+            start = max(length - int(last), 0)
+            end = length
+    except ValueError:
+        return None
+    end = min(end, length)
+    if start >= length or start >= end:
+        raise HTTPException(
+            status_code=416,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, end
+
+@router.get("/images/{key}")
+async def get_image(
+    key: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4096)
+):
+    """
+    Stream an image by content hash.
+    With `w`, serves the smallest resized variant at least that wide, as
+    WebP when the client accepts it and JPEG otherwise.
+    """
+    if not is_valid_key(key):
+        raise HTTPException(status_code=400, detail="Invalid image key")
+
+    blob_key = key
+    headers = {
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes"
+    }
+    if w is not None:
+        fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+        blob_key = derivative_key(key, pick_width(w), fmt)
+        headers["Vary"] = "Accept"
+
+    etag = f'"{blob_key}"'
+    headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    store = get_blob_store()
+    blob = await store.open(blob_key)
+    if blob is None and blob_key != key:
+        # Not generated yet: create the variants now, or serve the original
+        # if it cannot be decoded
+        if not await store.exists(key):
+            raise HTTPException(status_code=404, detail="Image not found")
+        if await ensure_derivatives(key):
+            blob = await store.open(blob_key)
+        else:
+            blob = await store.open(key)
+            headers["ETag"] = etag = f'"{key}"'
+            headers["Cache-Control"] = FALLBACK_CACHE_CONTROL
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    start, end = 0, blob.length
+    status_code = 200
+    range_header = request.headers.get("range")
+    # If-Range: only honour the range if the client's copy is current
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(range_header, blob.length)
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{blob.length}"
+
+    headers["Content-Length"] = str(end - start)
+    return StreamingResponse(
+        blob.iter_range(start, end),
+        status_code=status_code,
+        media_type=blob.content_type,
+        headers=headers
+    )
@@ -2,17 +2,159 @@
 Product API Routes
 Handles all CRUD operations for products
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List, Optional
-from models import Product, ProductCreate, ProductUpdate
-from database import products_collection
+from models import (
+    Product, ProductBase, ProductBatchRequest, ProductBulkUpdate, ProductCreate, ProductUpdate
+)
+from database import (
+    CHANGES_RETENTION_DAYS, PRODUCTS, DeletedProductsCollection, ProductsCollection, RelatedCollection
+)
+from search import load_search_index, search_index, tokenize
+from suggest import load_suggest_index, suggest_index
+from related import RELATED_LIMIT, ensure_related, rebuild_related, refresh_related
+from category_stats import STATS_PROJECTION, apply_product_change, reconcile_category_stats
+from cache import response_cache
+from responses import MongoJSONResponse, dumps
+from conditional import Snapshot, conditional_response, document_snapshot, load_snapshot
+from storage import public_image_urls
+from catalog_io import (
+    CSV_COLUMNS, RowTooLarge, csv_header, csv_line, iter_csv_rows,
+    iter_ndjson_rows, product_to_csv_row
+)
 from bson import ObjectId
-from datetime import datetime
+from bson.errors import InvalidId
+from pydantic import ValidationError
+from pymongo import InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from datetime import datetime, timedelta
+import asyncio
+import base64
+import binascii
+import json
+import os
+import re
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
-@router.get("/", response_model=dict)
+# Sort key -> (field, direction). `_id` is appended as a tiebreaker so the
+# order is total and keyset cursors never skip or repeat documents.
+SORT_OPTIONS = {
+    "price_asc": ("price", 1),
+    "price_desc": ("price", -1),
+    "newest": ("createdAt", -1),
+    "popular": ("reviewCount", -1)
+}
+DEFAULT_SORT = "newest"
+RELEVANCE_SORT = "relevance"
+
+# Facets the listing can return alongside the page (facets=category,brand,price)
+FACET_FIELDS = ("category", "subcategory", "brand")
+PRICE_FACET = "price"
+PRICE_BUCKETS = 5
+
+# Server error code for a result document over 16MB
+BSON_OBJECT_TOO_LARGE = 10334
+
+# Listing totals: counted (cached), approximate, or skipped
+TOTAL_EXACT = "exact"
+TOTAL_APPROX = "approx"
+TOTAL_NONE = "none"
+TOTAL_MODES = (TOTAL_EXACT, TOTAL_APPROX, TOTAL_NONE)
+
+# Fields that can be requested with `fields=` (`_id` is always returned)
+PROJECTABLE_FIELDS = set(ProductBase.model_fields) | {"createdAt", "updatedAt"}
+# Named projections; values are Mongo projections for each field
+FIELD_PRESETS = {
+    "card": {
+        "name": 1,
+        "price": 1,
+        "originalPrice": 1,
+        "brand": 1,
+        "category": 1,
+        "featured": 1,
+        "rating": 1,
+        "reviewCount": 1,
+        "images": {"$slice": 1}
+    }
+}
+
+def _parse_fields(fields: Optional[str]) -> Optional[dict]:
+    """Turn `fields=card,stock` into a find() projection (None = whole document)"""
+    if not fields:
+        return None
+    projection = {}
+    for name in fields.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name in FIELD_PRESETS:
+            for field, spec in FIELD_PRESETS[name].items():
+                # An explicit field wins over a preset's $slice
+                projection.setdefault(field, spec)
+        elif name in PROJECTABLE_FIELDS:
+            projection[name] = 1
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+    return projection or None
+
+def _aggregation_projection(projection: dict) -> dict:
+    """Translate a find() projection into a $project stage body"""
+    return {
+        field: {"$slice": [f"${field}", spec["$slice"]]} if isinstance(spec, dict) else spec
+        for field, spec in projection.items()
+    }
+
+def _encode_cursor(sort: str, product: dict) -> str:
+    """Build an opaque cursor pointing just after `product` in `sort` order"""
+    sort_field, _ = SORT_OPTIONS[sort]
+    value = product.get(sort_field)
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    payload = {"s": sort, "v": value, "i": str(product["_id"])}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, sort: str) -> dict:
+    """Turn a cursor back into the Mongo condition selecting the next page"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = payload["v"]
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["$date"])
+        last_id = ObjectId(payload["i"])
+        cursor_sort = payload["s"]
+    except (binascii.Error, ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail="Cursor does not match sort order")
+
+    sort_field, sort_order = SORT_OPTIONS[sort]
+    op = "$gt" if sort_order == 1 else "$lt"
+
+    # Mongo sorts null/missing values below everything else, so they come
+    # last in descending order and first in ascending order.
+    if value is None:
+        conditions = [{sort_field: None, "_id": {op: last_id}}]
+        if sort_order == 1:
+            conditions.append({sort_field: {"$ne": None}})
+    else:
+        conditions = [
+            {sort_field: {op: value}},
+            {sort_field: value, "_id": {op: last_id}}
+        ]
+        if sort_order == -1:
+            conditions.append({sort_field: None})
+
+    return {"$or": conditions}
+
+@router.get("/", response_class=MongoJSONResponse)
 async def get_products(
+    request: Request,
+    products_collection: ProductsCollection,
     page: int = Query(1, ge=1),
     pageSize: int = Query(20, ge=1, le=100),
     category: Optional[str] = None,
@@ -22,7 +164,11 @@ async def get_products(
     maxPrice: Optional[float] = None,
     search: Optional[str] = None,
     featured: Optional[bool] = None,
-    sort: Optional[str] = "newest"
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    facets: Optional[str] = None,
+    fields: Optional[str] = None,
+    total: str = Query(TOTAL_EXACT, pattern=f"^({'|'.join(TOTAL_MODES)})$")
 ):
     """
     Get products with filtering, pagination, and sorting
@@ -35,11 +181,179 @@ async def get_products(
     - brand: Filter by brand
     - minPrice: Minimum price filter
     - maxPrice: Maximum price filter
-    - search: Text search in name, description, tags
+    - search: Accent-insensitive word/prefix search in name, description, tags
     - featured: Filter featured products
-    - sort: Sort order (newest, price_asc, price_desc, popular)
+    - sort: Sort order (newest, price_asc, price_desc, popular, relevance);
+      defaults to relevance when searching and newest otherwise
+    - cursor: Opaque `nextCursor` from a previous response; switches to
+      keyset pagination so deep pages cost the same as the first one
+    - facets: Comma-separated facet counts to include (category, subcategory,
+      brand, price) computed over the filtered products
+    - fields: Comma-separated fields to return, or `card` for the lightweight
+      grid projection (name, price, brand, first image, ...)
+    - total: exact (default; counts cached per filter until the next write),
+      approx (estimated for the whole catalog, else a count up to the cache
+      TTL old) or none (no counting; use `hasMore`, e.g. infinite scroll)
+    
+    Sends an ETag; If-None-Match gets a 304 while the cached result is
+    unchanged.
     """
+    params = {
+        "page": page,
+        "pageSize": pageSize,
+        "category": category,
+        "subcategory": subcategory,
+        "brand": brand,
+        "minPrice": minPrice,
+        "maxPrice": maxPrice,
+        "search": search,
+        "featured": featured,
+        "sort": sort,
+        "cursor": cursor,
+        "facets": facets,
+        "fields": fields,
+        "total": total
+    }
+    snapshot = await response_cache.get_or_load(
+        "products:list", [PRODUCTS], params,
+        lambda: load_snapshot(_list_products(products_collection, **params))
+    )
+    return conditional_response(request, snapshot)
+
+async def _list_products(
+    products_collection: ProductsCollection,
+    page: int,
+    pageSize: int,
+    category: Optional[str],
+    subcategory: Optional[str],
+    brand: Optional[str],
+    minPrice: Optional[float],
+    maxPrice: Optional[float],
+    search: Optional[str],
+    featured: Optional[bool],
+    sort: Optional[str],
+    cursor: Optional[str],
+    facets: Optional[str],
+    fields: Optional[str],
+    total: str
+) -> dict:
+    """Uncached body of get_products"""
+    projection = _parse_fields(fields)
+    
     # Build filter query
+    query = _build_query(category, subcategory, brand, minPrice, maxPrice, featured)
+    
+    ranked_ids = None
+    if search:
+        # A query of stopwords only (e.g. "de") has no indexed terms to look
+        # up; the regex scan still matches it as text
+        if search_index.ready and tokenize(search):
+            ranked_ids = [ObjectId(product_id) for product_id, _ in search_index.search(search)]
+            if query:
+                # Every hit goes through the filters before any paging, so a
+                # narrow filter over a common term still finds all its matches
+                ranked_ids = await _filter_ranked(products_collection, query, ranked_ids)
+            query["_id"] = {"$in": ranked_ids}
+        else:
+            # Index not built yet (or nothing to look up): scan with regexes
+            pattern = re.escape(search)
+            query["$or"] = [
+                {"name": {"$regex": pattern, "$options": "i"}},
+                {"description": {"$regex": pattern, "$options": "i"}},
+                {"tags": {"$regex": pattern, "$options": "i"}}
+            ]
+    
+    # Sorting. $match + $sort lead the pipeline so Mongo can still use an
+    # index for them; $facet sub-pipelines cannot.
+    pipeline = [{"$match": query}]
+    data_stages = []
+    if not sort and ranked_ids is not None:
+        sort = RELEVANCE_SORT
+    if sort == RELEVANCE_SORT and ranked_ids is not None:
+        if cursor:
+            raise HTTPException(
+                status_code=400,
+                detail="Cursor pagination is not available for relevance sort"
+            )
+        # The hits are already filtered and in rank order: the page is a
+        # slice of them (plus one to know whether another page exists)
+        sort_field = None
+        window = ranked_ids[(page - 1) * pageSize:page * pageSize + 1]
+        data_stages.append({"$match": {"_id": {"$in": window}}})
+    else:
+        if sort not in SORT_OPTIONS:
+            sort = DEFAULT_SORT
+        sort_field, sort_order = SORT_OPTIONS[sort]
+        pipeline.append({"$sort": {sort_field: sort_order, "_id": sort_order}})
+        # Pagination: keyset when a cursor is given, offset otherwise.
+        # One extra product is fetched to know whether another page exists.
+        if cursor:
+            data_stages.append({"$match": _decode_cursor(cursor, sort)})
+        else:
+            data_stages.append({"$skip": (page - 1) * pageSize})
+    data_stages.append({"$limit": pageSize + 1})
+    if projection:
+        # Less to ship back and decode; the sort key is kept for the cursor
+        stage = _aggregation_projection(projection)
+        if sort_field:
+            stage.setdefault(sort_field, 1)
+        data_stages.append({"$project": stage})
+    
+    facet_stages = _facet_stages(facets)
+    result = await _run_listing(products_collection, pipeline, data_stages, facet_stages)
+    products = result["data"]
+    if sort == RELEVANCE_SORT and ranked_ids is not None:
+        # Put the page back in the order the search index ranked it
+        rank = {product_id: position for position, product_id in enumerate(window)}
+        products.sort(key=lambda product: rank[product["_id"]])
+    has_more = len(products) > pageSize
+    
+    if total == TOTAL_NONE:
+        count = None
+    elif ranked_ids is not None:
+        # Search hits are already filtered: their number is the total
+        count = len(ranked_ids)
+    elif not cursor and not has_more and (products or page == 1):
+        # The last page tells the exact total without counting
+        count = (page - 1) * pageSize + len(products)
+    else:
+        count_params = {
+            "category": category, "subcategory": subcategory, "brand": brand,
+            "minPrice": minPrice, "maxPrice": maxPrice, "featured": featured, "search": search
+        }
+        count = await _count_products(products_collection, query, count_params, total)
+    
+    next_cursor = None
+    if has_more:
+        products = products[:pageSize]
+        if sort != RELEVANCE_SORT:
+            next_cursor = _encode_cursor(sort, products[-1])
+    if projection and sort_field and sort_field not in projection:
+        for product in products:
+            product.pop(sort_field, None)
+    
+    response = {
+        "data": products,
+        "total": count,
+        "page": None if cursor else page,
+        "pageSize": pageSize,
+        "totalPages": None if count is None else (count + pageSize - 1) // pageSize,
+        "hasMore": has_more,
+        "nextCursor": next_cursor
+    }
+    if facet_stages:
+        response["facets"] = _format_facets(result, facet_stages)
+    return response
+
+def _build_query(
+    category: Optional[str],
+    subcategory: Optional[str],
+    brand: Optional[str],
+    minPrice: Optional[float],
+    maxPrice: Optional[float],
+    featured: Optional[bool]
+) -> dict:
+    """Build the Mongo filter shared by the listing endpoints"""
     query = {}
     
     if category:
@@ -56,59 +370,446 @@ async def get_products(
             query["price"]["$gte"] = minPrice
         if maxPrice:
             query["price"]["$lte"] = maxPrice
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-            {"tags": {"$regex": search, "$options": "i"}}
-        ]
+    return query
+
+async def _filter_ranked(
+    products_collection: ProductsCollection,
+    query: dict,
+    ranked_ids: List[ObjectId]
+) -> List[ObjectId]:
+    """Search hits that pass the listing filters, still in rank order"""
+    # Mongo applies the filters; the index decides the order
+    matching = set()
+    async for doc in products_collection.find({**query, "_id": {"$in": ranked_ids}}, {"_id": 1}):
+        matching.add(doc["_id"])
+    return [product_id for product_id in ranked_ids if product_id in matching]
+
+def _facet_stages(facets: Optional[str]) -> dict:
+    """Parse the `facets` parameter into $facet sub-pipelines"""
+    stages = {}
+    for name in (facets or "").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name in FACET_FIELDS:
+            stages[name] = [
+                {"$match": {name: {"$ne": None}}},
+                {"$group": {"_id": f"${name}", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}}
+            ]
+        elif name == PRICE_FACET:
+            stages[name] = [
+                {"$match": {"price": {"$type": "number"}}},
+                {"$bucketAuto": {"groupBy": "$price", "buckets": PRICE_BUCKETS}}
+            ]
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown facet: {name}")
+    return stages
+
+def _format_facets(result: dict, facet_stages: dict) -> dict:
+    """Reshape $facet buckets into the response format"""
+    facets = {}
+    for name in facet_stages:
+        if name == PRICE_FACET:
+            facets[name] = [
+                {"min": bucket["_id"]["min"], "max": bucket["_id"]["max"], "count": bucket["count"]}
+                for bucket in result[name]
+            ]
+        else:
+            facets[name] = [
+                {"value": bucket["_id"], "count": bucket["count"]}
+                for bucket in result[name]
+            ]
+    return facets
+
+async def _count_products(
+    products_collection: ProductsCollection,
+    query: dict,
+    count_params: dict,
+    mode: str
+) -> Optional[int]:
+    """
+    Total for a listing filter. Counts are cached per filter (not per page,
+    sort or projection): exact ones until the next product write, approx
+    ones for the cache TTL regardless of writes.
+    """
+    if mode == TOTAL_NONE:
+        return None
+    if mode == TOTAL_APPROX and not query:
+        # Collection metadata, no scan
+        return await products_collection.estimated_document_count()
+    depends_on = [PRODUCTS] if mode == TOTAL_EXACT else []
+    return await response_cache.get_or_load(
+        f"products:count:{mode}", depends_on, count_params,
+        lambda: products_collection.count_documents(query)
+    )
+
+async def _run_listing(
+    products_collection: ProductsCollection,
+    pipeline: List[dict],
+    data_stages: List[dict],
+    facet_stages: dict
+) -> dict:
+    """
+    Fetch the page and any facets in a single aggregation (a plain one when
+    there are no facets). Falls back to a second query when the page alone
+    would push the $facet result past Mongo's 16MB document limit (e.g.
+    inline base64 images).
+    """
+    if not facet_stages:
+        # No $facet: the $limit reaches the $sort, and nothing else is scanned
+        return {"data": await products_collection.aggregate(pipeline + data_stages).to_list(length=None)}
+    branches = facet_stages
+    try:
+        cursor = products_collection.aggregate(
+            pipeline + [{"$facet": {"data": data_stages, **branches}}]
+        )
+        return (await cursor.to_list(length=1))[0]
+    except OperationFailure as e:
+        if e.code != BSON_OBJECT_TOO_LARGE:
+            raise
     
-    # Sorting
-    sort_options = {
-        "price_asc": ("price", 1),
-        "price_desc": ("price", -1),
-        "newest": ("createdAt", -1),
-        "popular": ("reviewCount", -1)
-    }
-    sort_field, sort_order = sort_options.get(sort, ("createdAt", -1))
+    result = (await products_collection.aggregate(pipeline + [{"$facet": branches}]).to_list(length=1))[0]
+    result["data"] = await products_collection.aggregate(pipeline + data_stages).to_list(length=None)
+    return result
+
+# Export: bytes buffered before each write to the client
+EXPORT_FLUSH_BYTES = 64 * 1024
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+async def _export_rows(
+    products_collection: ProductsCollection,
+    query: dict,
+    projection: Optional[dict],
+    format: str,
+    batch_size: int
+):
+    """Encode matching products one by one, yielding ~64KB pieces"""
+    columns = ["_id"] + CSV_COLUMNS + ["createdAt", "updatedAt"]
+    if projection:
+        columns = ["_id"] + [c for c in columns[1:] if c in projection]
     
-    # Count total
-    total = await products_collection.count_documents(query)
+    buffer = []
+    buffered = 0
+    if format == "csv":
+        buffer.append(csv_header(columns))
     
-    # Pagination
-    skip = (page - 1) * pageSize
+    # _id order walks the default index once, no sort in memory
+    cursor = products_collection.find(query, projection).sort("_id", 1).batch_size(batch_size)
+    async for product in cursor:
+        # Feed consumers can't resolve bare paths; a re-import stores them
+        # as paths again
+        product = public_image_urls(product)
+        if format == "csv":
+            product["_id"] = str(product["_id"])
+            line = csv_line(product_to_csv_row(product), columns)
+        else:
+            line = dumps(product).decode() + "\n"
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= EXPORT_FLUSH_BYTES:
+            yield "".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield "".join(buffer)
+
+@router.get("/export")
+async def export_products(
+    products_collection: ProductsCollection,
+    format: str = "ndjson",
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+    brand: Optional[str] = None,
+    minPrice: Optional[float] = None,
+    maxPrice: Optional[float] = None,
+    featured: Optional[bool] = None,
+    fields: Optional[str] = None,
+    batchSize: int = Query(500, ge=1, le=5000)
+):
+    """
+    Stream the whole (optionally filtered) catalog as NDJSON or CSV
     
-    # Fetch products
-    cursor = products_collection.find(query).sort(sort_field, sort_order).skip(skip).limit(pageSize)
-    products = await cursor.to_list(length=pageSize)
+    Reads a single cursor in one pass, so memory stays constant however
+    large the catalog is. Accepts the listing filters and `fields`.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}")
     
-    # Convert ObjectId to string
-    for product in products:
-        product["_id"] = str(product["_id"])
+    query = _build_query(category, subcategory, brand, minPrice, maxPrice, featured)
+    projection = _parse_fields(fields)
+    return StreamingResponse(
+        _export_rows(products_collection, query, projection, format, batchSize),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+    )
+
+# Batch lookups: carts, wishlists and "recently viewed" in one round trip
+MAX_BATCH_IDS = 300
+
+async def _batch_lookup(
+    products_collection: ProductsCollection,
+    ids: List[str],
+    fields: Optional[str]
+) -> MongoJSONResponse:
+    """Fetch products with one $in query and return them in request order"""
+    ids = [product_id.strip() for product_id in ids if product_id.strip()]
+    if not ids:
+        raise HTTPException(status_code=400, detail="No product IDs given")
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} product IDs per request")
+    invalid = [product_id for product_id in ids if not ObjectId.is_valid(product_id)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid product IDs: {', '.join(invalid[:20])}")
     
-    return {
-        "data": products,
-        "total": total,
-        "page": page,
-        "pageSize": pageSize,
-        "totalPages": (total + pageSize - 1) // pageSize
-    }
+    projection = _parse_fields(fields)
+    object_ids = [ObjectId(product_id) for product_id in ids]
+    unique_ids = list(dict.fromkeys(object_ids))
+    cursor = products_collection.find({"_id": {"$in": unique_ids}}, projection)
+    found = {product["_id"]: product async for product in cursor}
+    
+    return MongoJSONResponse({
+        "data": [found.get(oid) or {"_id": oid, "notFound": True} for oid in object_ids],
+        "notFound": [oid for oid in unique_ids if oid not in found]
+    })
+
+@router.get("/batch", response_class=MongoJSONResponse)
+async def get_products_batch(
+    products_collection: ProductsCollection,
+    ids: str = Query(..., description="Comma-separated product IDs"),
+    fields: Optional[str] = None
+):
+    """
+    Get several products by ID in request order (`fields` as in the listing)
+    
+    IDs that don't exist come back as `{"_id": ..., "notFound": true}` in
+    their position and are also listed under `notFound`.
+    """
+    return await _batch_lookup(products_collection, ids.split(","), fields)
+
+@router.post("/batch", response_class=MongoJSONResponse)
+async def post_products_batch(batch: ProductBatchRequest, products_collection: ProductsCollection):
+    """Same as GET /batch, for ID lists too long for a URL"""
+    return await _batch_lookup(products_collection, batch.ids, batch.fields)
+
+@router.get("/suggest", response_class=MongoJSONResponse)
+async def suggest_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20)
+):
+    """
+    Typeahead suggestions for a prefix, answered from memory
+    
+    Matches product names, brands, categories, subcategories and tags that
+    have a word starting with `q` (accents ignored), most popular first.
+    Product suggestions carry the product `id`.
+    """
+    return MongoJSONResponse({"q": q, "suggestions": suggest_index.suggest(q, limit)})
+
+# Change feed for client-side sync
+MAX_CHANGES = 1000
+# Changes younger than this aren't served yet: a write stamped earlier may
+# still be committing, and a token past it would skip that write for good
+CHANGES_SETTLE_SECONDS = float(os.getenv("CHANGES_SETTLE_SECONDS", "5"))
+_EPOCH = datetime(1970, 1, 1)
+
+def _millis(value: datetime) -> int:
+    return (value - _EPOCH) // timedelta(milliseconds=1)
+
+def _encode_change_token(stamp: Optional[datetime], product_id: ObjectId, issued: datetime) -> str:
+    """Opaque token for the (updatedAt, _id) position just served and when"""
+    payload = {"t": None if stamp is None else _millis(stamp), "i": str(product_id), "h": _millis(issued)}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_change_token(token: str) -> tuple:
+    """(position, issued) of a change token"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        millis = payload["t"]
+        stamp = None if millis is None else _EPOCH + timedelta(milliseconds=int(millis))
+        return (stamp, ObjectId(payload["i"])), _EPOCH + timedelta(milliseconds=int(payload["h"]))
+    except (binascii.Error, ValueError, KeyError, TypeError, OverflowError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid change token")
+
+def _changes_query(field: str, position: Optional[tuple], horizon: datetime) -> dict:
+    """Keyset condition: after `position` in (field, _id) order, up to the horizon"""
+    settled = {field: {"$lte": horizon}}
+    if position is None:
+        # A full sync also picks up products never stamped with updatedAt
+        return {"$or": [{field: None}, settled]}
+    stamp, last_id = position
+    if stamp is None:
+        return {"$or": [{field: None, "_id": {"$gt": last_id}}, settled]}
+    return {"$or": [
+        {field: {"$gt": stamp, "$lte": horizon}},
+        {field: stamp, "_id": {"$gt": last_id}}
+    ]}
+
+def _change_key(stamp: Optional[datetime], product_id: ObjectId) -> tuple:
+    # Unstamped products sort first, as null does in Mongo
+    return (stamp is not None, stamp or _EPOCH, product_id)
+
+@router.get("/changes", response_class=MongoJSONResponse)
+async def get_product_changes(
+    products_collection: ProductsCollection,
+    deleted_collection: DeletedProductsCollection,
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_CHANGES),
+    fields: Optional[str] = None
+):
+    """
+    Products created or updated, and IDs deleted, since a change token
+    
+    Omit `since` for a full sync. Keep calling with `nextToken` while
+    `hasMore` is true, then store it for the next sync. Upsert `changes`
+    (`fields` as in the listing) and remove the `deleted` IDs. A token
+    older than the tombstone retention (CHANGES_RETENTION_DAYS) gets 410:
+    start over with a full sync.
+    """
+    position, issued = _decode_change_token(since) if since else (None, None)
+    now = datetime.utcnow()
+    # Deletions since the client last synced may no longer have tombstones
+    if issued and issued < now - timedelta(days=CHANGES_RETENTION_DAYS):
+        raise HTTPException(status_code=410, detail="Change token expired; run a full sync")
+    horizon = now - timedelta(seconds=CHANGES_SETTLE_SECONDS)
+    
+    projection = _parse_fields(fields)
+    if projection:
+        projection["updatedAt"] = 1
+    order = [("updatedAt", 1), ("_id", 1)]
+    updated = await products_collection.find(
+        _changes_query("updatedAt", position, horizon), projection
+    ).sort(order).limit(limit + 1).to_list(length=limit + 1)
+    # Tombstones only matter from a previous sync on
+    deleted = []
+    if position is not None:
+        deleted = await deleted_collection.find(
+            _changes_query("deletedAt", position, horizon)
+        ).sort([("deletedAt", 1), ("_id", 1)]).limit(limit + 1).to_list(length=limit + 1)
+    
+    # Merge both streams in (time, _id) order and keep the first `limit`
+    entries = sorted(
+        [(_change_key(product.get("updatedAt"), product["_id"]), product, False) for product in updated]
+        + [(_change_key(tombstone["deletedAt"], tombstone["_id"]), tombstone, True) for tombstone in deleted],
+        key=lambda entry: entry[0]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    
+    if entries:
+        last_key = entries[-1][0]
+        next_token = _encode_change_token(last_key[1] if last_key[0] else None, last_key[2], horizon)
+    elif position is not None:
+        next_token = _encode_change_token(*position, horizon)
+    else:
+        # Empty catalog: later syncs start from the horizon
+        next_token = _encode_change_token(horizon, ObjectId("0" * 24), horizon)
+    
+    return MongoJSONResponse({
+        "changes": [document for _, document, is_tombstone in entries if not is_tombstone],
+        "deleted": [document["_id"] for _, document, is_tombstone in entries if is_tombstone],
+        "nextToken": next_token,
+        "hasMore": has_more
+    })
 
-@router.get("/{product_id}")
-async def get_product(product_id: str):
-    """Get a single product by ID"""
+@router.get("/{product_id}", response_class=MongoJSONResponse)
+async def get_product(
+    product_id: str,
+    request: Request,
+    products_collection: ProductsCollection,
+    fields: Optional[str] = None
+):
+    """
+    Get a single product by ID (`fields` as in the listing)
+    
+    The ETag and Last-Modified come from the product's `updatedAt`.
+    """
     if not ObjectId.is_valid(product_id):
         raise HTTPException(status_code=400, detail="Invalid product ID")
     
-    product = await products_collection.find_one({"_id": ObjectId(product_id)})
+    snapshot = await response_cache.get_or_load(
+        "products:item", [PRODUCTS], {"id": product_id, "fields": fields},
+        lambda: _load_product(products_collection, product_id, fields)
+    )
+    return conditional_response(request, snapshot)
+
+async def _load_product(
+    products_collection: ProductsCollection,
+    product_id: str,
+    fields: Optional[str] = None
+) -> Snapshot:
+    """Uncached body of get_product"""
+    projection = _parse_fields(fields)
+    # updatedAt versions the response even when it isn't asked for
+    drop_updated_at = bool(projection) and "updatedAt" not in projection
+    if drop_updated_at:
+        projection["updatedAt"] = 1
+    product = await products_collection.find_one({"_id": ObjectId(product_id)}, projection)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    product["_id"] = str(product["_id"])
-    return product
+    snapshot = document_snapshot(product)
+    if drop_updated_at:
+        product.pop("updatedAt", None)
+    return snapshot
+
+def _related_pipeline(product_id: ObjectId, limit: int, projection: Optional[dict]) -> list:
+    """The stored neighbour list joined with the products it names"""
+    lookup = {"from": PRODUCTS, "localField": "related.productId", "foreignField": "_id", "as": "products"}
+    if projection:
+        lookup["pipeline"] = [{"$project": _aggregation_projection(projection)}]
+    return [
+        {"$match": {"_id": product_id}},
+        {"$project": {"related": {"$slice": ["$related", limit]}, "updatedAt": 1}},
+        {"$lookup": lookup}
+    ]
+
+@router.get("/{product_id}/related", response_class=MongoJSONResponse)
+async def get_related_products(
+    product_id: str,
+    related_collection: RelatedCollection,
+    products_collection: ProductsCollection,
+    limit: int = Query(RELATED_LIMIT, ge=1, le=RELATED_LIMIT),
+    fields: Optional[str] = None
+):
+    """
+    "You may also like": products most similar by category, subcategory,
+    brand, tags, colors and price band (`fields` as in the listing)
+    
+    Served from the precomputed related_products list in one aggregation;
+    each product carries its similarity `score`, best first.
+    """
+    if not ObjectId.is_valid(product_id):
+        raise HTTPException(status_code=400, detail="Invalid product ID")
+    
+    pipeline = _related_pipeline(ObjectId(product_id), limit, _parse_fields(fields))
+    result = await related_collection.aggregate(pipeline).to_list(length=1)
+    if not result:
+        # Not computed yet (e.g. created before the first rebuild)
+        if await ensure_related(product_id):
+            result = await related_collection.aggregate(pipeline).to_list(length=1)
+        elif not await products_collection.find_one({"_id": ObjectId(product_id)}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Product not found")
+    if not result:
+        return MongoJSONResponse({"data": [], "updatedAt": None})
+    
+    stored = result[0]
+    products = {product["_id"]: product for product in stored["products"]}
+    data = []
+    for item in stored["related"]:
+        product = products.get(item["productId"])
+        if product is not None:
+            product["score"] = item["score"]
+            data.append(product)
+    return MongoJSONResponse({"data": data, "updatedAt": stored["updatedAt"]})
 
 @router.post("/", status_code=201)
-async def create_product(product: ProductCreate):
+async def create_product(
+    product: ProductCreate,
+    background_tasks: BackgroundTasks,
+    products_collection: ProductsCollection
+):
     """Create a new product"""
     product_dict = product.dict()
     product_dict["createdAt"] = datetime.utcnow()
@@ -116,12 +817,318 @@ async def create_product(product: ProductCreate):
     
     result = await products_collection.insert_one(product_dict)
     created_product = await products_collection.find_one({"_id": result.inserted_id})
+    await apply_product_change(None, created_product)
     created_product["_id"] = str(created_product["_id"])
+    search_index.add(created_product)
+    suggest_index.add_product(created_product)
+    response_cache.invalidate(PRODUCTS)
+    background_tasks.add_task(refresh_related, created_product["_id"])
+    
+    return MongoJSONResponse(created_product, status_code=201)
+
+# Bulk import: natural keys usable for upserts
+UPSERT_KEYS = {"sku": ("sku",), "name_brand": ("name", "brand")}
+# Required lists a row may leave out (e.g. blank spreadsheet columns)
+IMPORT_LIST_DEFAULTS = ("sizes", "colors", "images")
+IMPORT_FORMATS = ("ndjson", "csv")
+# The error report is capped so a bad file can't grow the response unbounded
+MAX_REPORTED_ERRORS = 1000
+
+class _ImportReport:
+    """Running totals and per-row errors of a bulk import"""
+
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, row: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": error})
+
+    def summary(self) -> dict:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errorsTruncated": self.failed > len(self.errors)
+        }
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+        for err in error.errors()
+    )
+
+async def _import_batch(
+    products_collection: ProductsCollection,
+    batch: List[tuple],
+    upsert_key: Optional[str],
+    report: _ImportReport
+):
+    """Validate a batch of rows and write the valid ones in one unordered bulk_write"""
+    now = datetime.utcnow()
+    operations = []
+    operation_rows = []
+    for row_number, raw in batch:
+        try:
+            product = ProductCreate(**{**{field: [] for field in IMPORT_LIST_DEFAULTS}, **raw})
+        except ValidationError as e:
+            report.fail(row_number, _validation_message(e))
+            continue
+        
+        product_dict = product.model_dump()
+        product_dict["updatedAt"] = now
+        if upsert_key:
+            key_fields = UPSERT_KEYS[upsert_key]
+            if any(product_dict.get(field) in (None, "") for field in key_fields):
+                report.fail(row_number, f"Missing upsert key: {', '.join(key_fields)}")
+                continue
+            # Only the fields the row supplied overwrite a matched product;
+            # defaults apply to new products alone
+            supplied = {field: value for field, value in product_dict.items() if field in raw}
+            supplied["updatedAt"] = now
+            defaults = {field: value for field, value in product_dict.items() if field not in supplied}
+            defaults["createdAt"] = now
+            operations.append(UpdateOne(
+                {field: product_dict[field] for field in key_fields},
+                {"$set": supplied, "$setOnInsert": defaults},
+                upsert=True
+            ))
+        else:
+            product_dict["createdAt"] = now
+            operations.append(InsertOne(product_dict))
+        operation_rows.append(row_number)
+    
+    if not operations:
+        return
+    try:
+        result = await products_collection.bulk_write(operations, ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        for error in details["writeErrors"]:
+            report.fail(operation_rows[error["index"]], error["errmsg"])
+    report.inserted += details["nInserted"] + details["nUpserted"]
+    report.updated += details["nMatched"]
+
+# Rebuilds started outside a response, kept referenced until they finish
+_reindex_tasks = set()
+
+async def _reindex_catalog():
+    """Rebuild the in-process indexes and stats after a bulk import"""
+    # One rebuild instead of re-indexing row by row
+    await load_search_index()
+    await load_suggest_index()
+    await rebuild_related()
+    await reconcile_category_stats()
+
+@router.post("/import")
+async def import_products(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    products_collection: ProductsCollection,
+    format: Optional[str] = None,
+    chunkSize: int = Query(500, ge=1, le=5000),
+    upsertKey: Optional[str] = None
+):
+    """
+    Bulk import products from a streamed NDJSON or CSV request body
+    
+    Query Parameters:
+    - format: ndjson or csv (default: csv for a text/csv body, else ndjson)
+    - chunkSize: Rows validated and written per bulk_write (default: 500)
+    - upsertKey: Update products matched by `sku` or `name_brand` instead
+      of always inserting
     
-    return created_product
+    Rows failing validation or the write are reported by row number and
+    skipped; the rest of the file is still loaded. Only one chunk is held
+    in memory at a time.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}")
+    if upsertKey is not None and upsertKey not in UPSERT_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unknown upsert key: {upsertKey}")
+    
+    parse_rows = iter_csv_rows if format == "csv" else iter_ndjson_rows
+    report = _ImportReport()
+    batch = []
+    try:
+        async for row_number, raw, error in parse_rows(request.stream()):
+            report.processed += 1
+            if error:
+                report.fail(row_number, error)
+                continue
+            batch.append((row_number, raw))
+            if len(batch) >= chunkSize:
+                await _import_batch(products_collection, batch, upsertKey, report)
+                batch = []
+        if batch:
+            await _import_batch(products_collection, batch, upsertKey, report)
+    except RowTooLarge:
+        # Load every row before it and report them with the 413 (an
+        # HTTPException would also drop the background rebuilds)
+        if batch:
+            await _import_batch(products_collection, batch, upsertKey, report)
+        if report.inserted or report.updated:
+            response_cache.invalidate(PRODUCTS)
+            background_tasks.add_task(_reindex_catalog)
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Row {report.processed + 1} is too large", **report.summary()},
+            background=background_tasks
+        )
+    except Exception:
+        # No response will run background tasks (e.g. the client went away)
+        if report.inserted or report.updated:
+            response_cache.invalidate(PRODUCTS)
+            task = asyncio.create_task(_reindex_catalog())
+            _reindex_tasks.add(task)
+            task.add_done_callback(_reindex_tasks.discard)
+        raise
+    
+    if report.inserted or report.updated:
+        response_cache.invalidate(PRODUCTS)
+        background_tasks.add_task(_reindex_catalog)
+    return report.summary()
+
+# Bulk price/stock updates
+MAX_BULK_UPDATES = 1000
+# Repriced products whose related lists are refreshed one by one; beyond
+# that (or for a filter-wide change) every list is recomputed at once
+RELATED_REFRESH_MAX = 50
+
+def _promotion_pipeline(percent_off: float, now: datetime) -> list:
+    """
+    Pipeline update pricing products at `percent_off` below their original
+    price. Repeating or changing a promotion never compounds discounts.
+    """
+    original = {"$ifNull": ["$originalPrice", "$price"]}
+    return [{"$set": {
+        "originalPrice": original,
+        "price": {"$round": [{"$multiply": [original, 1 - percent_off / 100]}, 2]},
+        "updatedAt": now
+    }}]
+
+@router.patch("/bulk")
+async def bulk_update_products(
+    bulk: ProductBulkUpdate,
+    background_tasks: BackgroundTasks,
+    products_collection: ProductsCollection
+):
+    """
+    Update price, originalPrice and stock of many products at once
+    
+    Body:
+    - updates: Per-product changes, e.g. `[{"id": "...", "stock": 3}]`
+    - filter + set: Set the same values on every product matching the
+      listing filters
+    - filter + percentOff: Promotion, e.g. 10% off a category; the price
+      is computed from `originalPrice` (which keeps the full price)
+    
+    Everything runs as one unordered bulk_write; the response summarizes
+    matched/modified counts, unknown IDs and per-operation errors.
+    """
+    if len(bulk.updates) > MAX_BULK_UPDATES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_UPDATES} updates per request")
+    if bulk.filter is None and (bulk.set or bulk.percentOff):
+        raise HTTPException(status_code=400, detail="set/percentOff need a filter")
+    if bulk.filter is not None and not (bulk.set or bulk.percentOff):
+        raise HTTPException(status_code=400, detail="A filter needs set or percentOff")
+    if bulk.set and bulk.percentOff:
+        raise HTTPException(status_code=400, detail="Use either set or percentOff, not both")
+    
+    invalid = [patch.id for patch in bulk.updates if not ObjectId.is_valid(patch.id)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid product IDs: {', '.join(invalid[:20])}")
+    
+    now = datetime.utcnow()
+    operations = []
+    # What each operation targets, for the error report
+    targets = []
+    
+    object_ids = list(dict.fromkeys(ObjectId(patch.id) for patch in bulk.updates))
+    existing = set()
+    if object_ids:
+        # _id-only lookup answered from the index
+        cursor = products_collection.find({"_id": {"$in": object_ids}}, {"_id": 1})
+        existing = {product["_id"] async for product in cursor}
+    for patch in bulk.updates:
+        changes = {k: v for k, v in patch.dict(exclude={"id"}).items() if v is not None}
+        if not changes or ObjectId(patch.id) not in existing:
+            continue
+        changes["updatedAt"] = now
+        operations.append(UpdateOne({"_id": ObjectId(patch.id)}, {"$set": changes}))
+        targets.append(patch.id)
+    
+    if bulk.filter is not None:
+        query = _build_query(**bulk.filter.dict())
+        if not query:
+            raise HTTPException(status_code=400, detail="Filter must not be empty")
+        if bulk.percentOff:
+            update = _promotion_pipeline(bulk.percentOff, now)
+        else:
+            changes = {k: v for k, v in bulk.set.dict().items() if v is not None}
+            if not changes:
+                raise HTTPException(status_code=400, detail="No fields to update")
+            update = {"$set": {**changes, "updatedAt": now}}
+        operations.append(UpdateMany(query, update))
+        targets.append("filter")
+    
+    summary = {
+        "matched": 0,
+        "modified": 0,
+        "notFound": [str(oid) for oid in object_ids if oid not in existing],
+        "errors": []
+    }
+    if not operations:
+        return summary
+    try:
+        result = await products_collection.bulk_write(operations, ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        summary["errors"] = [
+            {"target": targets[error["index"]], "error": error["errmsg"]}
+            for error in details["writeErrors"]
+        ]
+    summary["matched"] = details["nMatched"]
+    summary["modified"] = details["nModified"]
+    if summary["modified"]:
+        # Prices and stock aren't in the search index, only cached reads
+        response_cache.invalidate(PRODUCTS)
+        price_changed = bulk.percentOff or (bulk.set and bulk.set.price is not None) or any(
+            patch.price is not None for patch in bulk.updates
+        )
+        if price_changed:
+            # Old prices aren't known here; recheck the category price ranges
+            background_tasks.add_task(reconcile_category_stats)
+            # Price bands are part of the related-products vectors
+            repriced = [
+                patch.id for patch in bulk.updates
+                if patch.price is not None and ObjectId(patch.id) in existing
+            ]
+            if bulk.filter is not None or len(repriced) > RELATED_REFRESH_MAX:
+                background_tasks.add_task(rebuild_related)
+            else:
+                for product_id in dict.fromkeys(repriced):
+                    background_tasks.add_task(refresh_related, product_id)
+    return summary
 
 @router.put("/{product_id}")
-async def update_product(product_id: str, product: ProductUpdate):
+async def update_product(
+    product_id: str,
+    product: ProductUpdate,
+    background_tasks: BackgroundTasks,
+    products_collection: ProductsCollection
+):
     """Update an existing product"""
     if not ObjectId.is_valid(product_id):
         raise HTTPException(status_code=400, detail="Invalid product ID")
@@ -132,28 +1139,52 @@ async def update_product(product_id: str, product: ProductUpdate):
     
     update_data["updatedAt"] = datetime.utcnow()
     
-    result = await products_collection.update_one(
+    # Update and read back in one round trip; the old version tells the
+    # category stats what the product is moving out of
+    previous_product = await products_collection.find_one_and_update(
         {"_id": ObjectId(product_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if previous_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    updated_product = await products_collection.find_one({"_id": ObjectId(product_id)})
+    updated_product = {**previous_product, **update_data}
+    await apply_product_change(previous_product, updated_product)
     updated_product["_id"] = str(updated_product["_id"])
+    search_index.add(updated_product)
+    suggest_index.add_product(updated_product)
+    response_cache.invalidate(PRODUCTS)
+    background_tasks.add_task(refresh_related, product_id)
     
-    return updated_product
+    return MongoJSONResponse(updated_product)
 
 @router.delete("/{product_id}", status_code=204)
-async def delete_product(product_id: str):
+async def delete_product(
+    product_id: str,
+    background_tasks: BackgroundTasks,
+    products_collection: ProductsCollection,
+    deleted_collection: DeletedProductsCollection
+):
     """Delete a product"""
     if not ObjectId.is_valid(product_id):
         raise HTTPException(status_code=400, detail="Invalid product ID")
     
-    result = await products_collection.delete_one({"_id": ObjectId(product_id)})
+    deleted_product = await products_collection.find_one_and_delete(
+        {"_id": ObjectId(product_id)}, projection=STATS_PROJECTION
+    )
     
-    if result.deleted_count == 0:
+    if deleted_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    await apply_product_change(deleted_product, None)
+    # Tombstone for the change feed
+    await deleted_collection.update_one(
+        {"_id": ObjectId(product_id)}, {"$set": {"deletedAt": datetime.utcnow()}}, upsert=True
+    )
+    search_index.remove(product_id)
+    suggest_index.remove_product(product_id)
+    response_cache.invalidate(PRODUCTS)
+    background_tasks.add_task(refresh_related, product_id)
     return None
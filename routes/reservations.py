@@ -0,0 +1,238 @@
+"""
+Reservation API Routes
+Holds product stock for a checkout with conditional atomic decrements
+"""
+from fastapi import APIRouter, HTTPException
+from typing import Dict, List, Optional, Tuple
+from models import ReservationCreate
+from database import PRODUCTS, RESERVATIONS, ProductsCollection, ReservationsCollection, get_collection
+from cache import response_cache
+from bson import ObjectId
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
+import asyncio
+import os
+
+router = APIRouter(prefix="/api/reservations", tags=["reservations"])
+
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+RESERVATION_SWEEP_SECONDS = float(os.getenv("RESERVATION_SWEEP_SECONDS", "30"))
+
+# Recorded before any stock is taken; becomes active once every item is
+PENDING = "pending"
+ACTIVE = "active"
+CONFIRMED = "confirmed"
+RELEASED = "released"
+EXPIRED = "expired"
+
+def _reservation_out(reservation: dict) -> dict:
+    reservation["_id"] = str(reservation["_id"])
+    for item in reservation["items"]:
+        item["productId"] = str(item["productId"])
+    return reservation
+
+async def _take_stock(products_collection, product_id: ObjectId, quantity: int, now: datetime) -> bool:
+    """Decrement stock only if enough is left; the check and the write are one operation"""
+    result = await products_collection.update_one(
+        {"_id": product_id, "stock": {"$gte": quantity}},
+        {"$inc": {"stock": -quantity}, "$set": {"updatedAt": now}}
+    )
+    return result.modified_count == 1
+
+async def _return_stock(products_collection, items: List[dict], now: datetime):
+    for item in items:
+        await products_collection.update_one(
+            {"_id": item["productId"]},
+            {"$inc": {"stock": item["quantity"]}, "$set": {"updatedAt": now}}
+        )
+
+async def _take_items(
+    products_collection,
+    reservations_collection,
+    reservation_id: ObjectId,
+    quantities: Dict[ObjectId, int],
+    now: datetime
+) -> Optional[Tuple[ObjectId, int]]:
+    """
+    Take each item's stock and record it on the pending reservation right
+    after; returns the first item that is short, if any
+    """
+    for product_id, quantity in quantities.items():
+        if not await _take_stock(products_collection, product_id, quantity, now):
+            return product_id, quantity
+        await reservations_collection.update_one(
+            {"_id": reservation_id},
+            {"$push": {"items": {"productId": product_id, "quantity": quantity}}}
+        )
+    return None
+
+@router.post("/", status_code=201)
+async def create_reservation(
+    reservation: ReservationCreate,
+    products_collection: ProductsCollection,
+    reservations_collection: ReservationsCollection
+):
+    """
+    Reserve stock for one or more products
+
+    Every line item is decremented with a conditional `$inc` (`stock >=
+    quantity`), so concurrent buyers can never take the same last unit.
+    If any item is short, the items already taken are put back and the
+    response is 409 listing what is unavailable. Reservations expire after
+    `ttlSeconds` (default RESERVATION_TTL_SECONDS) unless confirmed.
+
+    The reservation is stored as pending before any stock is taken and
+    records each item as it is taken, so if the request dies halfway the
+    expiry sweeper still finds the stock to put back.
+    """
+    invalid = [item.productId for item in reservation.items if not ObjectId.is_valid(item.productId)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid product IDs: {', '.join(invalid)}")
+
+    # Merge repeated products into one line item
+    quantities: Dict[ObjectId, int] = {}
+    for item in reservation.items:
+        product_id = ObjectId(item.productId)
+        quantities[product_id] = quantities.get(product_id, 0) + item.quantity
+
+    now = datetime.utcnow()
+    ttl = reservation.ttlSeconds or RESERVATION_TTL_SECONDS
+    document = {
+        "items": [],
+        "status": PENDING,
+        "createdAt": now,
+        "expiresAt": now + timedelta(seconds=ttl)
+    }
+    await reservations_collection.insert_one(document)
+    reservation_id = document["_id"]
+
+    try:
+        # Shielded: a cancelled request can't stop between taking an item
+        # and recording it
+        shortage = await asyncio.shield(asyncio.ensure_future(
+            _take_items(products_collection, reservations_collection, reservation_id, quantities, now)
+        ))
+    finally:
+        response_cache.invalidate(PRODUCTS)
+
+    if shortage:
+        # Compensate: give back what this request took, unless the sweeper
+        # already claimed the reservation
+        released = await reservations_collection.find_one_and_update(
+            {"_id": reservation_id, "status": PENDING},
+            {"$set": {"status": RELEASED, "updatedAt": datetime.utcnow()}}
+        )
+        if released and released["items"]:
+            await _return_stock(products_collection, released["items"], now)
+            response_cache.invalidate(PRODUCTS)
+        product_id, quantity = shortage
+        product = await products_collection.find_one({"_id": product_id}, {"stock": 1})
+        if product is None:
+            raise HTTPException(status_code=404, detail=f"Product not found: {product_id}")
+        raise HTTPException(status_code=409, detail={
+            "message": "Insufficient stock",
+            "unavailable": [{
+                "productId": str(product_id),
+                "requested": quantity,
+                "available": product.get("stock", 0)
+            }]
+        })
+
+    activated = await reservations_collection.find_one_and_update(
+        {"_id": reservation_id, "status": PENDING},
+        {"$set": {"status": ACTIVE}},
+        return_document=ReturnDocument.AFTER
+    )
+    if activated is None:
+        # Expired (and restocked by the sweeper) before it could be activated
+        raise HTTPException(status_code=409, detail=f"Reservation is {EXPIRED}")
+    return _reservation_out(activated)
+
+@router.get("/{reservation_id}")
+async def get_reservation(reservation_id: str, reservations_collection: ReservationsCollection):
+    """Get a reservation by ID"""
+    if not ObjectId.is_valid(reservation_id):
+        raise HTTPException(status_code=400, detail="Invalid reservation ID")
+
+    reservation = await reservations_collection.find_one({"_id": ObjectId(reservation_id)})
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+
+    return _reservation_out(reservation)
+
+async def _finish(reservations_collection, reservation_id: str, status: str, extra_filter: dict) -> dict:
+    """Move an active reservation to `status`; only one caller can win"""
+    if not ObjectId.is_valid(reservation_id):
+        raise HTTPException(status_code=400, detail="Invalid reservation ID")
+
+    reservation = await reservations_collection.find_one_and_update(
+        {"_id": ObjectId(reservation_id), "status": ACTIVE, **extra_filter},
+        {"$set": {"status": status, "updatedAt": datetime.utcnow()}}
+    )
+    if reservation is None:
+        current = await reservations_collection.find_one({"_id": ObjectId(reservation_id)}, {"status": 1})
+        if current is None:
+            raise HTTPException(status_code=404, detail="Reservation not found")
+        # Still active means the extra filter failed, i.e. it has expired
+        status_now = EXPIRED if current["status"] == ACTIVE else current["status"]
+        raise HTTPException(status_code=409, detail=f"Reservation is {status_now}")
+    return reservation
+
+@router.post("/{reservation_id}/release")
+async def release_reservation(
+    reservation_id: str,
+    products_collection: ProductsCollection,
+    reservations_collection: ReservationsCollection
+):
+    """Cancel an active reservation and put its stock back"""
+    reservation = await _finish(reservations_collection, reservation_id, RELEASED, {})
+    await _return_stock(products_collection, reservation["items"], datetime.utcnow())
+    response_cache.invalidate(PRODUCTS)
+
+    reservation["status"] = RELEASED
+    return _reservation_out(reservation)
+
+@router.post("/{reservation_id}/confirm")
+async def confirm_reservation(reservation_id: str, reservations_collection: ReservationsCollection):
+    """Turn an active, unexpired reservation into a sale (stock stays taken)"""
+    reservation = await _finish(
+        reservations_collection, reservation_id, CONFIRMED,
+        {"expiresAt": {"$gt": datetime.utcnow()}}
+    )
+    reservation["status"] = CONFIRMED
+    return _reservation_out(reservation)
+
+async def release_expired() -> int:
+    """
+    Expire overdue reservations and restock them; returns how many. Pending
+    ones past their deadline were left behind by a request that died
+    halfway, and give back the items they recorded.
+    """
+    products_collection = get_collection(PRODUCTS)
+    reservations_collection = get_collection(RESERVATIONS)
+    released = 0
+    while True:
+        now = datetime.utcnow()
+        # Claim one at a time so a concurrent release/confirm can't double-restock
+        reservation = await reservations_collection.find_one_and_update(
+            {"status": {"$in": [ACTIVE, PENDING]}, "expiresAt": {"$lte": now}},
+            {"$set": {"status": EXPIRED, "updatedAt": now}}
+        )
+        if reservation is None:
+            break
+        await _return_stock(products_collection, reservation["items"], now)
+        released += 1
+    if released:
+        response_cache.invalidate(PRODUCTS)
+    return released
+
+async def run_expiry_sweeper():
+    """Release expired reservations every RESERVATION_SWEEP_SECONDS (app lifetime task)"""
+    while True:
+        await asyncio.sleep(RESERVATION_SWEEP_SECONDS)
+        try:
+            released = await release_expired()
+            if released:
+                print(f"⏱️ Released {released} expired reservation(s)")
+        except Exception as e:
+            print(f"⚠️ Reservation sweep failed: {e}")
@@ -2,22 +2,18 @@
 Store Settings API Routes
 Handles store configuration
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional
 from bson import ObjectId
 from datetime import datetime
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from cache import response_cache
+from database import SETTINGS, SettingsCollection
+from responses import MongoJSONResponse
+from conditional import conditional_response, load_snapshot
 
 router = APIRouter()
 
-# MongoDB connection
-MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGODB_URL)
-db = client.fashion_catalog
-settings_collection = db.settings
-
 class StoreSettingsUpdate(BaseModel):
     storeName: Optional[str] = None
     whatsappNumber: Optional[str] = None
@@ -27,9 +23,17 @@ class StoreSettingsUpdate(BaseModel):
     email: Optional[str] = None
     address: Optional[str] = None
 
-@router.get("/settings")
-async def get_settings():
-    """Get store settings"""
+@router.get("/settings", response_class=MongoJSONResponse)
+async def get_settings(request: Request, settings_collection: SettingsCollection):
+    """Get store settings (conditional GET via ETag)"""
+    snapshot = await response_cache.get_or_load(
+        "settings:store", [SETTINGS], {},
+        lambda: load_snapshot(_load_settings(settings_collection))
+    )
+    return conditional_response(request, snapshot)
+
+async def _load_settings(settings_collection: SettingsCollection) -> dict:
+    """Uncached body of get_settings"""
     try:
         settings = await settings_collection.find_one({"type": "store"})
         if not settings:
@@ -49,14 +53,12 @@ async def get_settings():
             await settings_collection.insert_one(default_settings)
             settings = default_settings
         
-        if "_id" in settings:
-            settings["_id"] = str(settings["_id"])
         return settings
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/settings")
-async def update_settings(settings: StoreSettingsUpdate):
+async def update_settings(settings: StoreSettingsUpdate, settings_collection: SettingsCollection):
     """Update store settings"""
     try:
         update_data = {k: v for k, v in settings.dict().items() if v is not None}
@@ -72,6 +74,8 @@ async def update_settings(settings: StoreSettingsUpdate):
             upsert=True
         )
         
+        response_cache.invalidate(SETTINGS)
+        
         updated_settings = await settings_collection.find_one({"type": "store"})
         if "_id" in updated_settings:
             updated_settings["_id"] = str(updated_settings["_id"])
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
 from pydantic import BaseModel
+from python_multipart.multipart import MultipartParser, parse_options_header
 from datetime import datetime
-import secrets
+from tempfile import SpooledTemporaryFile
+from typing import Optional
 import base64
 import hashlib
+from derivatives import SIZES, ensure_derivatives
+from responses import MongoJSONResponse
+from storage import IMAGE_STORAGE, content_key, get_blob_store, image_url, public_image_url, sniff_content_type
 
 router = APIRouter()
 
@@ -12,16 +16,26 @@ router = APIRouter()
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
+# Streaming uploads keep at most this much of a file in memory before
+# spilling it to a temporary file
+SPOOL_MAX_MEMORY = 256 * 1024
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 16 * 1024
+# Bytes needed to identify the image format
+SNIFF_LENGTH = 16
+# Header bytes accepted per part (names and values together)
+MAX_PART_HEADER_BYTES = 8 * 1024
+
 class ImageUpload(BaseModel):
     filename: str
     content_type: str
     data: str  # Base64 encoded data URL (data:image/jpeg;base64,...)
 
 @router.post("/upload")
-async def upload_image(upload: ImageUpload):
+async def upload_image(upload: ImageUpload, background_tasks: BackgroundTasks):
     """
-    Recebe uma imagem em base64 e retorna a data URL para armazenamento no MongoDB.
-    Solução serverless-friendly que não depende de filesystem.
+    Recebe uma imagem em base64, grava os bytes no blob store (chave = sha256
+    do conteúdo) e retorna a URL curta `/images/{hash}` para o produto.
     """
     try:
         # Validate data URL format
@@ -50,16 +64,18 @@ async def upload_image(upload: ImageUpload):
                 detail=f"Imagem muito grande. Máximo: 5MB"
             )
         
-        # Generate metadata
+        # Store once, keyed by content hash (re-uploads are deduplicated)
         timestamp = datetime.utcnow().isoformat()
-        unique_string = f"{upload.filename}{timestamp}".encode()
-        file_hash = hashlib.md5(unique_string).hexdigest()
+        file_hash = content_key(image_data)
+        content_type = sniff_content_type(image_data[:16]) or upload.content_type
+        await get_blob_store().put(file_hash, image_data, content_type)
+        background_tasks.add_task(ensure_derivatives, file_hash)
         
-        # Return the data URL - will be stored in MongoDB with the product
-        return JSONResponse(content={
-            "url": upload.data,
+        # Return the short image URL - stored in the product instead of the data
+        return MongoJSONResponse({
+            "url": public_image_url(image_url(file_hash)),
             "filename": upload.filename,
-            "content_type": upload.content_type,
+            "content_type": content_type,
             "hash": file_hash,
             "size": len(image_data),
             "uploaded_at": timestamp
@@ -70,13 +86,175 @@ async def upload_image(upload: ImageUpload):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar upload: {str(e)}")
 
+class _ImageReceiver:
+    """
+    Multipart callbacks that stream the first file part into a spooled
+    temporary file, hashing it as it arrives. Stops accepting data as soon
+    as the file is too large or its magic bytes are not an allowed image.
+    """
+
+    def __init__(self):
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.size = 0
+        self.error: Optional[HTTPException] = None
+        self.done = False
+        self.spool = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        self._hasher = hashlib.sha256()
+        self._head = b""
+        self._in_file = False
+        self._header_field = b""
+        self._header_value = b""
+        self._header_bytes = 0
+        self._disposition = b""
+
+    @property
+    def hash(self) -> str:
+        return self._hasher.hexdigest()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end
+        }
+
+    def _on_part_begin(self):
+        self._disposition = b""
+        self._header_bytes = 0
+
+    def _count_header_bytes(self, length: int) -> bool:
+        """False (and an error) once a part's headers pass the cap"""
+        self._header_bytes += length
+        if self._header_bytes > MAX_PART_HEADER_BYTES:
+            self.error = self.error or HTTPException(status_code=400, detail="Cabeçalhos da parte muito grandes")
+            return False
+        return True
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        if self._count_header_bytes(end - start):
+            self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        if self._count_header_bytes(end - start):
+            self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        # Only the first part carrying a file is taken
+        self._in_file = b"filename" in options and not self.done and self.filename is None
+        if self._in_file:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if not self._in_file or self.error:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > MAX_FILE_SIZE:
+            self.error = HTTPException(status_code=413, detail="Imagem muito grande. Máximo: 5MB")
+            return
+        if self.content_type is None:
+            self._head += chunk[:SNIFF_LENGTH - len(self._head)]
+            if len(self._head) >= SNIFF_LENGTH:
+                self._sniff()
+        self._hasher.update(chunk)
+        self.spool.write(chunk)
+
+    def _on_part_end(self):
+        if self._in_file:
+            if self.content_type is None and not self.error:
+                self._sniff()
+            self._in_file = False
+            self.done = True
+
+    def _sniff(self):
+        self.content_type = sniff_content_type(self._head)
+        if self.content_type is None:
+            self.error = HTTPException(
+                status_code=400,
+                detail="Tipo de arquivo não permitido. Use: JPEG, PNG ou WebP"
+            )
+
+@router.post("/upload/file")
+async def upload_file(request: Request, background_tasks: BackgroundTasks):
+    """
+    Upload multipart/form-data em streaming: o arquivo é lido em blocos,
+    com hash sha256 incremental, e rejeitado assim que passa de 5MB ou se
+    os magic bytes não forem de JPEG/PNG/WebP. A memória usada por upload
+    é limitada independentemente do tamanho do arquivo.
+    """
+    mime_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if mime_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Envie o arquivo como multipart/form-data")
+    
+    # Reject before reading anything when the client announces a huge body
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail="Imagem muito grande. Máximo: 5MB")
+    
+    receiver = _ImageReceiver()
+    received = 0
+    try:
+        parser = MultipartParser(boundary, receiver.callbacks())
+        async for chunk in request.stream():
+            # Same bound for chunked bodies, which announce no length
+            received += len(chunk)
+            if received > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+                raise HTTPException(status_code=413, detail="Imagem muito grande. Máximo: 5MB")
+            parser.write(chunk)
+            if receiver.error:
+                raise receiver.error
+            if receiver.done:
+                break
+        else:
+            parser.finalize()
+        
+        if receiver.error:
+            raise receiver.error
+        if not receiver.done:
+            raise HTTPException(status_code=400, detail="Nenhum arquivo enviado")
+        
+        file_hash = receiver.hash
+        receiver.spool.seek(0)
+        await get_blob_store().put(file_hash, receiver.spool, receiver.content_type)
+        background_tasks.add_task(ensure_derivatives, file_hash)
+        
+        return MongoJSONResponse({
+            "url": public_image_url(image_url(file_hash)),
+            "filename": receiver.filename,
+            "content_type": receiver.content_type,
+            "hash": file_hash,
+            "size": receiver.size,
+            "uploaded_at": datetime.utcnow().isoformat()
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao processar upload: {str(e)}")
+    finally:
+        receiver.spool.close()
+
 @router.get("/upload/health")
 async def upload_health():
     """Health check endpoint for upload service"""
     return {
         "status": "ok",
         "service": "image-upload",
-        "storage": "base64-mongodb",
+        "storage": IMAGE_STORAGE,
         "max_size": "5MB",
+        "multipart_endpoint": "/upload/file",
+        "derivative_widths": sorted(SIZES.values()),
         "allowed_formats": ["JPEG", "PNG", "WebP"]
     }
@@ -0,0 +1,33 @@
+"""
+Related Products Rebuild
+Recomputes every product's "you may also like" list into related_products
+(meant for a nightly job or after catalog-wide changes; single product
+changes are propagated by the API as they happen)
+
+Usage:
+    python -m scripts.build_related
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from related import RELATED_LIMIT, rebuild_related
+
+async def main():
+    await database.connect()
+    try:
+        start = time.perf_counter()
+        count = await rebuild_related()
+    finally:
+        database.close()
+    print(f"✅ Related products rebuilt for {count} product(s), top {RELATED_LIMIT}, in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+    asyncio.run(main())
@@ -0,0 +1,199 @@
+"""
+Index Advisor
+Runs explain() on every query shape the product listing generates and
+reports collection scans, in-memory SORTs and docs examined per document
+returned, then proposes (or creates) the ESR compound index for each shape
+that needs one
+
+Usage:
+    python -m scripts.index_advisor                    # against MONGO_URL / MONGO_DB_NAME
+    python -m scripts.index_advisor --seed 20000       # on a synthetic catalog in fashion_catalog_bench
+    python -m scripts.index_advisor --apply            # also create the proposed indexes
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import Dict, Iterable, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DB_NAME = "fashion_catalog_bench"
+PAGE_SIZE = 20
+# Order of the equality fields in a proposed index
+EQUALITY_ORDER = ("category", "subcategory", "brand", "featured")
+
+IndexKeys = List[Tuple[str, int]]
+
+def _filter_shapes(sample: dict) -> Dict[str, dict]:
+    """Listing filters as passed to _build_query, with values from the data"""
+    return {
+        "all": {},
+        "category": {"category": sample["category"]},
+        "category+subcategory": {"category": sample["category"], "subcategory": sample["subcategory"]},
+        "brand": {"brand": sample["brand"]},
+        "featured": {"featured": True},
+        "price range": {"minPrice": 50, "maxPrice": 150},
+        "category+price range": {"category": sample["category"], "minPrice": 50, "maxPrice": 150},
+        "category+brand": {"category": sample["category"], "brand": sample["brand"]},
+    }
+
+def esr_index(query: dict, sort_field: str, sort_order: int) -> IndexKeys:
+    """Equality fields, then the sort key and `_id` tiebreaker, then ranges"""
+    keys = [(field, 1) for field in EQUALITY_ORDER if field in query and not isinstance(query[field], dict)]
+    keys += [(sort_field, sort_order), ("_id", sort_order)]
+    used = {field for field, _ in keys}
+    keys += [(field, 1) for field, value in query.items() if isinstance(value, dict) and field not in used]
+    return keys
+
+def _normalize(keys: Iterable[Tuple[str, int]]) -> Tuple[Tuple[str, int], ...]:
+    """Key pattern with the first direction positive (an index serves both directions)"""
+    keys = [(field, int(direction)) for field, direction in keys]
+    if keys and keys[0][1] < 0:
+        keys = [(field, -direction) for field, direction in keys]
+    return tuple(keys)
+
+def _stages(plan: dict) -> List[str]:
+    """Stage names of a winning plan, outermost first"""
+    stages = [plan.get("stage", "?")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages += _stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        stages += _stages(child)
+    return stages
+
+def _index_names(plan: dict) -> List[str]:
+    names = [plan["indexName"]] if "indexName" in plan else []
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            names += _index_names(plan[child_key])
+    for child in plan.get("inputStages", []):
+        names += _index_names(child)
+    return names
+
+def summarize(explain: dict) -> dict:
+    """The parts of an explain() result that matter for index choice"""
+    planner = explain.get("queryPlanner", {})
+    stats = explain.get("executionStats", {})
+    plan = planner.get("winningPlan", {})
+    stages = _stages(plan)
+    returned = stats.get("nReturned", 0)
+    docs = stats.get("totalDocsExamined", 0)
+    return {
+        "stages": stages,
+        "indexes": _index_names(plan),
+        "collscan": "COLLSCAN" in stages,
+        "inMemorySort": "SORT" in stages,
+        "keysExamined": stats.get("totalKeysExamined", 0),
+        "docsExamined": docs,
+        "returned": returned,
+        "ratio": round(docs / max(returned, 1), 1),
+        "ms": stats.get("executionTimeMillis", 0),
+    }
+
+async def _sample(collection) -> dict:
+    product = await collection.find_one({"subcategory": {"$exists": True}}, {"category": 1, "subcategory": 1, "brand": 1})
+    if not product:
+        sys.exit("❌ No products to analyse; pass --seed N to generate a catalog")
+    return product
+
+async def _seed(collection, count: int):
+    from benchmarks.catalog import generate_products
+
+    await collection.drop()
+    products = generate_products(count)
+    for start in range(0, len(products), 1000):
+        await collection.insert_many(products[start:start + 1000])
+    print(f"Seeded {count} products")
+
+async def main(args):
+    import database
+    from database import PRODUCTS
+    from routes.products import SORT_OPTIONS, _build_query
+
+    await database.connect(create_indexes=False)
+    try:
+        collection = database.get_collection(PRODUCTS)
+        if args.seed:
+            await _seed(collection, args.seed)
+        if not args.bare:
+            await database.init_indexes()
+        sample = await _sample(collection)
+
+        # Text and other special indexes can't serve these shapes
+        existing = {
+            _normalize(info["key"]): name
+            for name, info in (await collection.index_information()).items()
+            if all(isinstance(direction, (int, float)) for _, direction in info["key"])
+        }
+        report = []
+        proposals: Dict[Tuple[Tuple[str, int], ...], IndexKeys] = {}
+
+        print(f"{'shape':<34}{'sort':<12}{'plan':<28}{'keys':>8}{'docs':>8}{'ret':>5}{'ratio':>7}")
+        for shape_name, params in _filter_shapes(sample).items():
+            query = _build_query(
+                params.get("category"), params.get("subcategory"), params.get("brand"),
+                params.get("minPrice"), params.get("maxPrice"), params.get("featured")
+            )
+            for sort_name, (sort_field, sort_order) in SORT_OPTIONS.items():
+                cursor = collection.find(query).sort([(sort_field, sort_order), ("_id", sort_order)]).limit(PAGE_SIZE + 1)
+                summary = summarize(await cursor.explain())
+                flagged = summary["collscan"] or summary["inMemorySort"] or summary["ratio"] > args.max_ratio
+                proposal = esr_index(query, sort_field, sort_order)
+                summary.update({
+                    "shape": shape_name,
+                    "sort": sort_name,
+                    "query": query,
+                    "flagged": flagged,
+                    "proposedIndex": proposal if flagged else None,
+                })
+                report.append(summary)
+                if flagged:
+                    proposals.setdefault(_normalize(proposal), proposal)
+
+                plan = "+".join(stage for stage in summary["stages"] if stage != "LIMIT")
+                print(
+                    f"{shape_name:<34}{sort_name:<12}{plan[:27]:<28}{summary['keysExamined']:>8}"
+                    f"{summary['docsExamined']:>8}{summary['returned']:>5}{summary['ratio']:>7}"
+                    f"{'  ⚠️' if flagged else ''}"
+                )
+
+        missing = [keys for normalized, keys in proposals.items() if normalized not in existing]
+        print(f"\n{len(missing)} proposed index(es):")
+        for keys in missing:
+            print(f"  {keys}")
+
+        redundant = [
+            name for keys, name in existing.items()
+            if name != "_id_" and any(other != keys and other[:len(keys)] == keys for other in existing)
+        ]
+        if redundant:
+            print(f"\nCovered by a longer index (candidates to drop): {', '.join(sorted(redundant))}")
+
+        if args.apply:
+            for keys in missing:
+                name = await collection.create_index(keys)
+                print(f"✅ created {name}")
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"shapes": report, "proposed": missing, "redundant": redundant}, f, indent=2, default=str)
+            print(f"\nReport written to {args.json}")
+    finally:
+        database.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, help=f"generate N products in {BENCH_DB_NAME} (wiped) first")
+    parser.add_argument("--bare", action="store_true", help="don't create the shipped indexes first")
+    parser.add_argument("--max-ratio", type=float, default=10.0, help="flag shapes examining more docs per result")
+    parser.add_argument("--apply", action="store_true", help="create the proposed indexes")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    # Read when the database module is imported
+    if args.seed:
+        os.environ["MONGO_DB_NAME"] = BENCH_DB_NAME
+    asyncio.run(main(args))
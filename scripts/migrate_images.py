@@ -0,0 +1,99 @@
+"""
+Image Migration
+Moves inline base64 data-URL images out of product/category documents into
+the blob store and rewrites them in place as short `/images/{hash}` paths;
+absolute URLs of already-stored images (any host) become paths as well
+
+Usage:
+    python -m scripts.migrate_images            # migrate
+    python -m scripts.migrate_images --dry-run  # only report what would change
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import CATEGORIES, PRODUCTS, get_collection
+from storage import content_key, get_blob_store, image_url, sniff_content_type, stored_image_url
+
+DATA_URL_PREFIX = "data:image/"
+# Image URLs that embed a host (written before documents stored bare paths)
+ABSOLUTE_IMAGE_URL = r"^https?://[^/]+/images/[0-9a-f]{64}"
+
+async def _store_data_url(url: str, dry_run: bool) -> str:
+    """Store a data URL's bytes and return the replacement URL"""
+    header, _, encoded = url.partition(",")
+    try:
+        data = base64.b64decode(encoded)
+    except (binascii.Error, ValueError):
+        print(f"  ⚠️ skipping undecodable image ({len(url)} chars)")
+        return url
+    declared_type = header[len("data:"):].split(";", 1)[0]
+    content_type = sniff_content_type(data[:16]) or declared_type
+    key = content_key(data)
+    if not dry_run:
+        await get_blob_store().put(key, data, content_type)
+    return image_url(key)
+
+async def _migrate_url(url: str, dry_run: bool) -> str:
+    if url.startswith(DATA_URL_PREFIX):
+        return await _store_data_url(url, dry_run)
+    return stored_image_url(url)
+
+def _needs_migration(field: str) -> dict:
+    return {"$or": [
+        {field: {"$regex": f"^{DATA_URL_PREFIX}"}},
+        {field: {"$regex": ABSOLUTE_IMAGE_URL}}
+    ]}
+
+async def migrate_products(dry_run: bool) -> int:
+    products_collection = get_collection(PRODUCTS)
+    migrated = 0
+    query = _needs_migration("images")
+    # Documents are huge until migrated, so keep batches small
+    async for product in products_collection.find(query, {"images": 1}).batch_size(10):
+        images = [await _migrate_url(url, dry_run) for url in product.get("images", [])]
+        if not dry_run:
+            await products_collection.update_one(
+                {"_id": product["_id"]},
+                {"$set": {"images": images, "updatedAt": datetime.utcnow()}}
+            )
+        migrated += 1
+        print(f"  product {product['_id']}: {len(images)} image(s)")
+    return migrated
+
+async def migrate_categories(dry_run: bool) -> int:
+    categories_collection = get_collection(CATEGORIES)
+    migrated = 0
+    query = _needs_migration("image")
+    async for category in categories_collection.find(query, {"image": 1}).batch_size(10):
+        image = await _migrate_url(category["image"], dry_run)
+        if not dry_run:
+            await categories_collection.update_one(
+                {"_id": category["_id"]}, {"$set": {"image": image}}
+            )
+        migrated += 1
+        print(f"  category {category['_id']}")
+    return migrated
+
+async def main(dry_run: bool):
+    await database.connect(create_indexes=False)
+    try:
+        products = await migrate_products(dry_run)
+        categories = await migrate_categories(dry_run)
+    finally:
+        database.close()
+    verb = "would migrate" if dry_run else "migrated"
+    print(f"✅ {verb} {products} product(s) and {categories} category(ies)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    args = parser.parse_args()
+    asyncio.run(main(args.dry_run))
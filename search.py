@@ -0,0 +1,159 @@
+"""
+Product Search Index
+In-process inverted index over product name, description and tags
+"""
+import bisect
+import math
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# Matches in the name count more than matches in tags or the description
+FIELD_WEIGHTS = {"name": 3.0, "tags": 2.0, "description": 1.0}
+
+# Prefix matches rank below exact token matches
+PREFIX_PENALTY = 0.6
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSIONS = 64
+
+STOPWORDS = {
+    "a", "o", "as", "os", "e", "de", "da", "do", "das", "dos",
+    "em", "na", "no", "nas", "nos", "com", "para", "por", "um", "uma"
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents ("Calça" -> "calca")"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def tokenize(text: str) -> List[str]:
+    """Split text into folded tokens, dropping Portuguese stopwords"""
+    return [t for t in _TOKEN_RE.findall(fold(text)) if t not in STOPWORDS]
+
+class SearchIndex:
+    """Inverted index mapping folded tokens to weighted product IDs"""
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_tokens: Dict[str, List[str]] = {}
+        self._vocabulary: List[str] = []
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._doc_tokens)
+
+    def clear(self):
+        self._postings.clear()
+        self._doc_tokens.clear()
+        self._vocabulary.clear()
+        self.ready = False
+
+    def replace_with(self, other: "SearchIndex"):
+        """Take over another index's contents in one step"""
+        self._postings = other._postings
+        self._doc_tokens = other._doc_tokens
+        self._vocabulary = other._vocabulary
+        self.ready = True
+
+    def add(self, product: dict):
+        """Index a product, replacing any previous entry for the same ID"""
+        product_id = str(product["_id"])
+        self.remove(product_id)
+
+        weights: Dict[str, float] = {}
+        for field, field_weight in FIELD_WEIGHTS.items():
+            value = product.get(field)
+            if not value:
+                continue
+            if isinstance(value, list):
+                value = " ".join(str(v) for v in value)
+            for token in tokenize(str(value)):
+                weights[token] = weights.get(token, 0.0) + field_weight
+
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocabulary, token)
+            # Dampen repeated terms so long descriptions don't dominate
+            postings[product_id] = 1.0 + math.log(weight)
+        self._doc_tokens[product_id] = list(weights)
+
+    def remove(self, product_id: str):
+        """Drop a product from the index"""
+        for token in self._doc_tokens.pop(str(product_id), ()):
+            postings = self._postings[token]
+            postings.pop(str(product_id), None)
+            if not postings:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocabulary, token)
+                del self._vocabulary[index]
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """Return the indexed tokens a query term matches, with a match factor"""
+        matches = []
+        if term in self._postings:
+            matches.append((term, 1.0))
+        if len(term) < MIN_PREFIX_LENGTH:
+            return matches
+
+        start = bisect.bisect_left(self._vocabulary, term)
+        for token in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+            if not token.startswith(term):
+                break
+            if token != term:
+                matches.append((token, PREFIX_PENALTY))
+        return matches
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Rank products matching every term of `text` (as a word or prefix).
+        Returns (product_id, score) pairs, best first.
+        """
+        terms = list(dict.fromkeys(tokenize(text)))
+        if not terms:
+            return []
+
+        total_docs = max(len(self._doc_tokens), 1)
+        scores: Optional[Dict[str, float]] = None
+        for term in terms:
+            term_scores: Dict[str, float] = {}
+            for token, factor in self._expand(term):
+                postings = self._postings[token]
+                idf = math.log(1.0 + total_docs / len(postings))
+                for product_id, weight in postings.items():
+                    score = weight * idf * factor
+                    if score > term_scores.get(product_id, 0.0):
+                        term_scores[product_id] = score
+
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    product_id: score + term_scores[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in term_scores
+                }
+            if not scores:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+# Shared index for the running process
+search_index = SearchIndex()
+
+async def load_search_index():
+    """(Re)build the shared index from the products collection"""
+    from database import PRODUCTS, get_collection
+
+    products_collection = get_collection(PRODUCTS)
+    # Build aside so searches keep using the old index meanwhile
+    fresh = SearchIndex()
+    projection = {field: 1 for field in FIELD_WEIGHTS}
+    async for product in products_collection.find({}, projection):
+        fresh.add(product)
+    search_index.replace_with(fresh)
+    print(f"✅ Search index built ({len(search_index)} products)")
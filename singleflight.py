@@ -0,0 +1,86 @@
+"""
+Single-Flight
+Concurrent identical loads share one in-flight call and its result instead
+of each sending the same query to MongoDB
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from metrics import singleflight_calls, singleflight_failures, singleflight_in_flight
+
+LEADER = "leader"
+COALESCED = "coalesced"
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Runs one loader per key at a time; callers arriving while it runs await
+    the same task. The task is shielded from any single caller's
+    cancellation (a client hanging up doesn't fail the others) and is only
+    cancelled once every caller is gone. Errors reach every caller and are
+    not remembered: the next call after a failure loads again.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.cancellations = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]], name: str = "") -> Any:
+        """Return the loader's result, sharing a call already in flight for `key`"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(loader()))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight, name))
+            singleflight_in_flight.inc()
+            self.leaders += 1
+            singleflight_calls.inc(name, LEADER)
+        else:
+            self.coalesced += 1
+            singleflight_calls.inc(name, COALESCED)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller was cancelled; nobody needs the result. Forget
+                # the flight first: a caller arriving before the task has
+                # wound down must start a fresh load, not join a cancelled one
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def _finish(self, key: Hashable, flight: _Flight, name: str):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        singleflight_in_flight.dec()
+        if flight.task.cancelled():
+            self.cancellations += 1
+            singleflight_failures.inc(name, "cancelled")
+        elif flight.task.exception() is not None:
+            self.failures += 1
+            singleflight_failures.inc(name, "error")
+
+    def stats(self) -> dict:
+        calls = self.leaders + self.coalesced
+        return {
+            "inFlight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalescedRatio": round(self.coalesced / calls, 4) if calls else 0.0,
+            "failures": self.failures,
+            "cancellations": self.cancellations
+        }
@@ -0,0 +1,258 @@
+"""
+Image Blob Storage
+Content-addressed image storage backed by GridFS or the local disk
+"""
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from typing import Any, AsyncIterator, BinaryIO, Optional, Union
+
+from dotenv import load_dotenv
+from gridfs.errors import FileExists, NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+load_dotenv()
+
+# "gridfs" (default, survives redeploys) or "local"
+IMAGE_STORAGE = os.getenv("IMAGE_STORAGE", "gridfs")
+IMAGE_STORAGE_DIR = os.getenv("IMAGE_STORAGE_DIR", "./data/images")
+# Public origin of this API (e.g. https://api.example.com), added to image
+# paths when responses are rendered; documents only store the path
+IMAGE_BASE_URL = os.getenv("IMAGE_BASE_URL", "").rstrip("/")
+IMAGE_PATH = "/images/"
+
+CHUNK_SIZE = 256 * 1024
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+_URL_KEY_RE = re.compile(r"/images/([0-9a-f]{64})(?:[/?#]|$)")
+
+def content_key(data: bytes) -> str:
+    """Content hash used as the storage key"""
+    return hashlib.sha256(data).hexdigest()
+
+def is_valid_key(key: str) -> bool:
+    return bool(_KEY_RE.match(key))
+
+def image_url(key: str) -> str:
+    """Path documents store to reference an image (no host, so a domain
+    change never leaves stale URLs behind)"""
+    return f"{IMAGE_PATH}{key}"
+
+def key_from_url(url: str) -> Optional[str]:
+    """Extract the storage key from an image URL, if it is one of ours"""
+    match = _URL_KEY_RE.search(url)
+    return match.group(1) if match else None
+
+def stored_image_url(url: str) -> str:
+    """
+    What to store for an image URL sent by a client: our images become the
+    bare path, whatever host they were served from (clients send back the
+    absolute URLs they were given); other URLs are kept as they are
+    """
+    if url.startswith(("http://", "https://")):
+        key = key_from_url(url)
+        if key:
+            return image_url(key)
+    return url
+
+def public_image_url(url: str) -> str:
+    """Absolute URL on IMAGE_BASE_URL for a stored image path"""
+    if IMAGE_BASE_URL and url.startswith(IMAGE_PATH):
+        return f"{IMAGE_BASE_URL}{url}"
+    return url
+
+def public_image_urls(content: Any) -> Any:
+    """
+    Documents (or lists/wrappers of them) with the paths in their `images`
+    and `image` fields made absolute on IMAGE_BASE_URL. Other strings are
+    never touched. Returns copies: the documents passed in may be cached.
+    """
+    if not IMAGE_BASE_URL:
+        return content
+    if isinstance(content, list):
+        return [public_image_urls(item) for item in content]
+    if not isinstance(content, dict):
+        return content
+    published = {}
+    for field, value in content.items():
+        if field == "images" and isinstance(value, list):
+            value = [public_image_url(url) if isinstance(url, str) else url for url in value]
+        elif field == "image" and isinstance(value, str):
+            value = public_image_url(value)
+        elif isinstance(value, (dict, list)):
+            value = public_image_urls(value)
+        published[field] = value
+    return published
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Identify JPEG/PNG/WebP from their magic bytes"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+Source = Union[bytes, BinaryIO]
+
+class StoredBlob:
+    """Handle on a stored blob that can stream any byte range"""
+
+    def __init__(self, key: str, length: int, content_type: str):
+        self.key = key
+        self.length = length
+        self.content_type = content_type
+
+    def iter_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield bytes [start, end) in chunks"""
+        raise NotImplementedError
+
+class BlobStore:
+    """Interface shared by the storage backends"""
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def put(self, key: str, source: Source, content_type: str):
+        """Store `source` under `key`; a no-op if the key already exists"""
+        raise NotImplementedError
+
+    async def open(self, key: str) -> Optional[StoredBlob]:
+        """Return a handle on the blob, or None if it does not exist"""
+        raise NotImplementedError
+
+class _GridFSBlob(StoredBlob):
+    def __init__(self, grid_out):
+        metadata = grid_out.metadata or {}
+        super().__init__(
+            grid_out._id, grid_out.length,
+            metadata.get("contentType", "application/octet-stream")
+        )
+        self._grid_out = grid_out
+
+    async def iter_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        self._grid_out.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = await self._grid_out.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+class GridFSBlobStore(BlobStore):
+    """Blobs in the `images` GridFS bucket, with the hash as file _id"""
+
+    def __init__(self, database, bucket_name: str = "images"):
+        self._bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+        self._files = database[f"{bucket_name}.files"]
+
+    async def exists(self, key: str) -> bool:
+        return await self._files.find_one({"_id": key}, {"_id": 1}) is not None
+
+    async def put(self, key: str, source: Source, content_type: str):
+        if await self.exists(key):
+            return
+        try:
+            await self._bucket.upload_from_stream_with_id(
+                key, key, source, metadata={"contentType": content_type}
+            )
+        except FileExists:
+            # A concurrent upload of the same content won the race
+            pass
+
+    async def open(self, key: str) -> Optional[StoredBlob]:
+        try:
+            grid_out = await self._bucket.open_download_stream(key)
+        except NoFile:
+            return None
+        return _GridFSBlob(grid_out)
+
+class _LocalBlob(StoredBlob):
+    def __init__(self, key: str, path: str, length: int, content_type: str):
+        super().__init__(key, length, content_type)
+        self._path = path
+
+    async def iter_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        handle = await asyncio.to_thread(open, self._path, "rb")
+        try:
+            await asyncio.to_thread(handle.seek, start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = await asyncio.to_thread(handle.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            handle.close()
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under `root/<first two hex chars>/<hash>`"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(key))
+
+    async def put(self, key: str, source: Source, content_type: str):
+        await asyncio.to_thread(self._write, key, source)
+
+    def _write(self, key: str, source: Source):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if isinstance(source, bytes):
+                    out.write(source)
+                else:
+                    while True:
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    async def open(self, key: str) -> Optional[StoredBlob]:
+        return await asyncio.to_thread(self._open, key)
+
+    def _open(self, key: str) -> Optional[StoredBlob]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as handle:
+                head = handle.read(16)
+                length = os.fstat(handle.fileno()).st_size
+        except FileNotFoundError:
+            return None
+        content_type = sniff_content_type(head) or "application/octet-stream"
+        return _LocalBlob(key, path, length, content_type)
+
+_blob_store: Optional[BlobStore] = None
+
+def get_blob_store() -> BlobStore:
+    """Blob store selected by IMAGE_STORAGE, created on first use"""
+    global _blob_store
+    if _blob_store is None:
+        if IMAGE_STORAGE == "local":
+            _blob_store = LocalBlobStore(IMAGE_STORAGE_DIR)
+        elif IMAGE_STORAGE == "gridfs":
+            from database import current_database
+
+            _blob_store = GridFSBlobStore(current_database())
+        else:
+            raise ValueError(f"Unknown IMAGE_STORAGE: {IMAGE_STORAGE}")
+    return _blob_store
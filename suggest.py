@@ -0,0 +1,197 @@
+"""
+Typeahead Suggestions
+In-process prefix index over product names, brands, categories and tags,
+ranked by popularity
+"""
+import bisect
+import heapq
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+from search import fold
+
+# Featured products and their brands/categories rank above similar ones
+FEATURED_BOOST = 2.0
+# Categories from the categories collection are suggested even when empty
+CATEGORY_BASE_WEIGHT = 0.5
+# Words of a term that a prefix can start at ("jea" -> "Calça Jeans")
+MAX_WORDS_INDEXED = 8
+# Bound the product names scanned for very short prefixes (brands,
+# categories and tags are few and always scanned in full)
+MAX_SCAN = 2000
+MEMO_MAX_PREFIX = 3
+
+# Between equal weights, a category reads better than a tag of the same name
+TYPE_PRIORITY = {"category": 4, "subcategory": 3, "brand": 2, "tag": 1, "product": 0}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def popularity(product: dict) -> float:
+    """Weight of a product: review count (log-damped) plus a featured bonus"""
+    weight = 1.0 + math.log1p(product.get("reviewCount") or 0)
+    if product.get("featured"):
+        weight += FEATURED_BOOST
+    return weight
+
+def _normalize(text: str) -> str:
+    return " ".join(_WORD_RE.findall(fold(text)))
+
+class SuggestIndex:
+    """
+    Sorted arrays of (folded word suffix, entry) pairs searched with bisect.
+    Brands, categories and tags are shared entries whose weight is the sum
+    of the products (and category documents) contributing to them; they
+    live apart from the product names so a short prefix can't crowd them out.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[str, str]] = []
+        self._term_keys: List[Tuple[str, str]] = []
+        # entry key -> {"type", "text", "weight", "count", "id"}
+        self._entries: Dict[str, dict] = {}
+        # source (product/category document) -> [(entry key, weight)]
+        self._sources: Dict[str, List[Tuple[str, float]]] = {}
+        self._memo: Dict[Tuple[str, int], list] = {}
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def replace_with(self, other: "SuggestIndex"):
+        """Take over another index's contents in one step"""
+        self._keys = other._keys
+        self._term_keys = other._term_keys
+        self._entries = other._entries
+        self._sources = other._sources
+        self._memo = {}
+        self.ready = True
+
+    @staticmethod
+    def _word_starts(folded: str) -> List[int]:
+        return [match.start() for match in _WORD_RE.finditer(folded)][:MAX_WORDS_INDEXED]
+
+    def _contribute(self, source: str, kind: str, text: Optional[str], weight: float, entry_id: Optional[str] = None):
+        if not text or not str(text).strip():
+            return
+        text = str(text).strip()
+        folded = _normalize(text)
+        if not folded:
+            return
+        key = f"{kind}:{entry_id or folded}"
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {"type": kind, "text": text, "weight": 0.0, "count": 0}
+            if entry_id:
+                entry["id"] = entry_id
+            entry["_folded"] = folded
+            keys = self._keys if kind == "product" else self._term_keys
+            for start in self._word_starts(folded):
+                bisect.insort(keys, (folded[start:], key))
+        entry["weight"] += weight
+        entry["count"] += 1
+        self._sources.setdefault(source, []).append((key, weight))
+
+    def _remove_source(self, source: str):
+        for key, weight in self._sources.pop(source, ()):
+            entry = self._entries[key]
+            entry["weight"] -= weight
+            entry["count"] -= 1
+            if entry["count"] <= 0:
+                folded = entry["_folded"]
+                keys = self._keys if entry["type"] == "product" else self._term_keys
+                for start in self._word_starts(folded):
+                    index = bisect.bisect_left(keys, (folded[start:], key))
+                    if index < len(keys) and keys[index] == (folded[start:], key):
+                        del keys[index]
+                del self._entries[key]
+
+    def add_product(self, product: dict):
+        """Index a product, replacing any previous version of it"""
+        product_id = str(product["_id"])
+        source = f"product:{product_id}"
+        self._remove_source(source)
+        weight = popularity(product)
+        self._contribute(source, "product", product.get("name"), weight, entry_id=product_id)
+        self._contribute(source, "brand", product.get("brand"), weight)
+        self._contribute(source, "category", product.get("category"), weight)
+        self._contribute(source, "subcategory", product.get("subcategory"), weight)
+        for tag in dict.fromkeys(product.get("tags") or []):
+            self._contribute(source, "tag", tag, weight)
+        self._memo.clear()
+
+    def remove_product(self, product_id: str):
+        self._remove_source(f"product:{product_id}")
+        self._memo.clear()
+
+    def add_category(self, category: dict):
+        """Index a category document and its subcategories"""
+        source = f"category:{category['_id']}"
+        self._remove_source(source)
+        self._contribute(source, "category", category.get("name"), CATEGORY_BASE_WEIGHT)
+        for subcategory in category.get("subcategories") or []:
+            self._contribute(source, "subcategory", subcategory, CATEGORY_BASE_WEIGHT)
+        self._memo.clear()
+
+    def remove_category(self, category_id: str):
+        self._remove_source(f"category:{category_id}")
+        self._memo.clear()
+
+    def suggest(self, text: str, limit: int = 8) -> List[dict]:
+        """Top `limit` entries with a word starting with `text`, most popular first"""
+        prefix = _normalize(text)
+        if not prefix:
+            return []
+        memo_key = (prefix, limit)
+        if len(prefix) <= MEMO_MAX_PREFIX and memo_key in self._memo:
+            return self._memo[memo_key]
+
+        matches = set()
+        for keys, scan in ((self._term_keys, len(self._term_keys)), (self._keys, MAX_SCAN)):
+            index = bisect.bisect_left(keys, (prefix,))
+            for folded, key in keys[index:index + scan]:
+                if not folded.startswith(prefix):
+                    break
+                matches.add(key)
+
+        def rank(key: str):
+            entry = self._entries[key]
+            return entry["weight"], TYPE_PRIORITY[entry["type"]], key
+
+        # Extra candidates so that duplicates (a tag named like a category) can be dropped
+        best = heapq.nlargest(limit * 2, matches, key=rank)
+        results = []
+        seen = set()
+        for key in best:
+            entry = self._entries[key]
+            if entry["_folded"] in seen:
+                continue
+            seen.add(entry["_folded"])
+            if len(results) == limit:
+                break
+            result = {"type": entry["type"], "text": entry["text"], "score": round(entry["weight"], 2)}
+            if "id" in entry:
+                result["id"] = entry["id"]
+            results.append(result)
+        if len(prefix) <= MEMO_MAX_PREFIX:
+            self._memo[memo_key] = results
+        return results
+
+# Shared index for the running process
+suggest_index = SuggestIndex()
+
+# Product fields the index needs
+SUGGEST_PROJECTION = {"name": 1, "brand": 1, "category": 1, "subcategory": 1, "tags": 1, "reviewCount": 1, "featured": 1}
+
+async def load_suggest_index():
+    """(Re)build the shared index from the products and categories collections"""
+    from database import CATEGORIES, PRODUCTS, get_collection
+
+    # Build aside so suggestions keep using the old index meanwhile
+    fresh = SuggestIndex()
+    async for product in get_collection(PRODUCTS).find({}, SUGGEST_PROJECTION):
+        fresh.add_product(product)
+    async for category in get_collection(CATEGORIES).find({}, {"name": 1, "subcategories": 1}):
+        fresh.add_category(category)
+    suggest_index.replace_with(fresh)
+    print(f"✅ Suggest index built ({len(suggest_index)} entries)")
@@ -0,0 +1,41 @@
+"""
+Shared fixtures: the app served in-process against an in-memory MongoDB
+stand-in (mongomock-motor), as benchmarks/loadtest.py runs it
+"""
+import os
+
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+os.environ.setdefault("MONGO_URL", "mongodb://in-memory")
+
+import database
+import storage
+from cache import response_cache
+from main import app, lifespan
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def client(monkeypatch, tmp_path):
+    """HTTP client on a freshly started app with an empty database"""
+    monkeypatch.setattr(database, "MONGO_URL", os.environ["MONGO_URL"])
+    monkeypatch.setattr(database, "AsyncIOMotorClient", AsyncMongoMockClient)
+    # GridFS needs a real server; images go to a per-test directory instead
+    monkeypatch.setattr(storage, "IMAGE_STORAGE", "local")
+    monkeypatch.setattr(storage, "IMAGE_STORAGE_DIR", str(tmp_path / "images"))
+    monkeypatch.setattr(storage, "_blob_store", None)
+    # Cached responses would outlive the database
+    response_cache.clear()
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http_client:
+            yield http_client
+    response_cache.clear()
+
+@pytest.fixture
+def products_collection(client):
+    return database.get_collection(database.PRODUCTS)
@@ -0,0 +1,111 @@
+"""
+Bulk price/stock updates (PATCH /api/products/bulk): per-ID changes,
+filter-wide changes and percentage promotions
+"""
+from datetime import datetime
+
+import mongomock.aggregate
+import pytest
+from bson import ObjectId
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def mongo_round(monkeypatch):
+    """$round for the in-memory stand-in, which lacks it (both round half to even)"""
+    handle = mongomock.aggregate._Parser._handle_arithmetic_operator
+
+    def handle_with_round(parser, operator, values):
+        if operator == "$round":
+            number, places = parser.parse_many(values)
+            return None if number is None else round(number, places)
+        return handle(parser, operator, values)
+
+    monkeypatch.setattr(mongomock.aggregate, "arithmetic_operators", mongomock.aggregate.arithmetic_operators | {"$round"})
+    monkeypatch.setattr(mongomock.aggregate._Parser, "_handle_arithmetic_operator", handle_with_round)
+
+def _product(category="Feminino", **fields) -> dict:
+    product = {
+        "_id": ObjectId(),
+        "name": "Vestido",
+        "description": "",
+        "price": 100.0,
+        "category": category,
+        "brand": "Marca",
+        "sizes": [],
+        "colors": [],
+        "images": [],
+        "stock": 5,
+        "updatedAt": datetime(2024, 1, 1)
+    }
+    product.update(fields)
+    return product
+
+async def _get(products_collection, product: dict) -> dict:
+    return await products_collection.find_one({"_id": product["_id"]})
+
+async def test_percent_off_prices_from_the_original(client, products_collection, mongo_round):
+    full_price = _product(price=100.0)
+    on_sale = _product(price=80.0, originalPrice=120.0)
+    odd = _product(price=33.33)
+    other_category = _product(category="Masculino", price=50.0)
+    await products_collection.insert_many([full_price, on_sale, odd, other_category])
+
+    response = await client.patch("/api/products/bulk", json={"filter": {"category": "Feminino"}, "percentOff": 10})
+    assert response.status_code == 200, response.text
+    assert (response.json()["matched"], response.json()["modified"]) == (3, 3)
+
+    full_price_now = await _get(products_collection, full_price)
+    assert (full_price_now["price"], full_price_now["originalPrice"]) == (90.0, 100.0)
+    assert full_price_now["updatedAt"] > full_price["updatedAt"]
+    on_sale_now = await _get(products_collection, on_sale)
+    assert (on_sale_now["price"], on_sale_now["originalPrice"]) == (108.0, 120.0)
+    odd_now = await _get(products_collection, odd)
+    # 33.33 * 0.9 = 29.997, rounded to cents
+    assert (odd_now["price"], odd_now["originalPrice"]) == (30.0, 33.33)
+    assert (await _get(products_collection, other_category))["price"] == 50.0
+
+    # A new promotion replaces the old one instead of compounding it
+    await client.patch("/api/products/bulk", json={"filter": {"category": "Feminino"}, "percentOff": 25})
+    full_price_now = await _get(products_collection, full_price)
+    assert (full_price_now["price"], full_price_now["originalPrice"]) == (75.0, 100.0)
+
+async def test_per_id_updates_report_unknown_ids(client, products_collection):
+    first, second = _product(), _product(stock=1)
+    await products_collection.insert_many([first, second])
+    missing = str(ObjectId())
+
+    response = await client.patch("/api/products/bulk", json={"updates": [
+        {"id": str(first["_id"]), "stock": 0},
+        {"id": missing, "stock": 3},
+        {"id": str(second["_id"]), "price": 59.9, "stock": 2},
+        {"id": missing, "price": 1.0}
+    ]})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["notFound"] == [missing]
+    assert (body["matched"], body["modified"], body["errors"]) == (2, 2, [])
+
+    assert (await _get(products_collection, first))["stock"] == 0
+    second_now = await _get(products_collection, second)
+    assert (second_now["price"], second_now["stock"]) == (59.9, 2)
+    assert await products_collection.count_documents({"_id": ObjectId(missing)}) == 0
+
+async def test_filter_set_updates_every_match(client, products_collection):
+    await products_collection.insert_many([_product(), _product(), _product(category="Masculino")])
+    response = await client.patch("/api/products/bulk", json={"filter": {"category": "Feminino"}, "set": {"stock": 0}})
+    assert response.json()["modified"] == 2
+    assert await products_collection.count_documents({"stock": 0}) == 2
+
+@pytest.mark.parametrize("body", [
+    {"set": {"stock": 1}},
+    {"filter": {"category": "Feminino"}},
+    {"filter": {"category": "Feminino"}, "set": {"stock": 1}, "percentOff": 10},
+    {"filter": {}, "set": {"stock": 1}},
+    {"updates": [{"id": "not-an-id", "stock": 1}]}
+])
+async def test_malformed_bulk_updates_are_rejected(client, products_collection, body):
+    await products_collection.insert_one(_product())
+    response = await client.patch("/api/products/bulk", json=body)
+    assert response.status_code == 400
+    assert (await products_collection.find_one())["stock"] == 5
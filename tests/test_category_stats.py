@@ -0,0 +1,97 @@
+"""
+Category stats: incremental counts and price ranges kept by the product
+write routes, and the reconcile that repairs drift
+"""
+import asyncio
+
+import pytest
+
+import database
+import main
+from category_stats import BRAND, CATEGORY, SUBCATEGORY, compute_category_stats, reconcile_category_stats
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture(autouse=True)
+def no_startup_reconcile(monkeypatch):
+    # The app's own reconcile would repair the drift these tests look for
+    async def idle():
+        await asyncio.Event().wait()
+    monkeypatch.setattr(main, "run_stats_reconciler", idle)
+
+@pytest.fixture
+def stats_collection(client):
+    return database.get_collection(database.CATEGORY_STATS)
+
+async def _create(client, category: str, subcategory: str, brand: str, price: float) -> str:
+    response = await client.post("/api/products/", json={
+        "name": "Peça", "description": "", "price": price, "category": category,
+        "subcategory": subcategory, "brand": brand, "sizes": [], "colors": [], "images": [], "stock": 1
+    })
+    assert response.status_code == 201, response.text
+    return response.json()["_id"]
+
+async def _stats(stats_collection) -> dict:
+    return {
+        (node["_id"]["category"], node["_id"]["kind"], node["_id"]["name"]):
+            {"count": node["count"], "minPrice": node.get("minPrice"), "maxPrice": node.get("maxPrice")}
+        async for node in stats_collection.find({})
+    }
+
+async def test_moving_a_product_updates_both_categories(client, stats_collection):
+    await _create(client, "Feminino", "Vestidos", "Marca A", 50.0)
+    moved = await _create(client, "Feminino", "Vestidos", "Marca A", 300.0)
+    await _create(client, "Masculino", "Camisas", "Marca B", 80.0)
+
+    stats = await _stats(stats_collection)
+    assert stats[("Feminino", CATEGORY, "Feminino")] == {"count": 2, "minPrice": 50.0, "maxPrice": 300.0}
+
+    response = await client.put(f"/api/products/{moved}", json={
+        "category": "Masculino", "subcategory": "Camisas", "brand": "Marca C", "price": 20.0
+    })
+    assert response.status_code == 200
+
+    stats = await _stats(stats_collection)
+    # The old category lost its most expensive product; its range is re-read
+    assert stats[("Feminino", CATEGORY, "Feminino")] == {"count": 1, "minPrice": 50.0, "maxPrice": 50.0}
+    assert stats[("Feminino", SUBCATEGORY, "Vestidos")] == {"count": 1, "minPrice": 50.0, "maxPrice": 50.0}
+    assert stats[("Masculino", CATEGORY, "Masculino")] == {"count": 2, "minPrice": 20.0, "maxPrice": 80.0}
+    assert stats[("Masculino", BRAND, "Marca C")] == {"count": 1, "minPrice": 20.0, "maxPrice": 20.0}
+    assert stats == await compute_category_stats()
+
+async def test_deleting_the_last_product_removes_its_nodes(client, stats_collection):
+    await _create(client, "Feminino", "Vestidos", "Marca A", 50.0)
+    removed = await _create(client, "Feminino", "Saias", "Marca B", 70.0)
+
+    assert (await client.delete(f"/api/products/{removed}")).status_code == 204
+
+    stats = await _stats(stats_collection)
+    assert ("Feminino", SUBCATEGORY, "Saias") not in stats
+    assert ("Feminino", BRAND, "Marca B") not in stats
+    assert stats[("Feminino", CATEGORY, "Feminino")] == {"count": 1, "minPrice": 50.0, "maxPrice": 50.0}
+    assert stats == await compute_category_stats()
+
+async def test_reconcile_repairs_drift(client, products_collection, stats_collection):
+    await _create(client, "Feminino", "Vestidos", "Marca A", 50.0)
+    await _create(client, "Feminino", "Saias", "Marca A", 90.0)
+    expected = await _stats(stats_collection)
+
+    # A wrong count, a stale range, a node for nothing and a missing node
+    await stats_collection.update_one({"_id.kind": CATEGORY}, {"$set": {"count": 7}})
+    await stats_collection.update_one({"_id.name": "Vestidos"}, {"$set": {"maxPrice": 999.0}})
+    await stats_collection.insert_one({
+        "_id": {"category": "Infantil", "kind": CATEGORY, "name": "Infantil"}, "count": 3, "minPrice": 1.0, "maxPrice": 2.0
+    })
+    await stats_collection.delete_one({"_id.name": "Saias"})
+
+    assert await reconcile_category_stats() == 4
+    assert await _stats(stats_collection) == expected
+    assert await reconcile_category_stats() == 0
+
+async def test_reconcile_picks_up_writes_that_bypassed_the_routes(client, products_collection, stats_collection):
+    await _create(client, "Feminino", "Vestidos", "Marca A", 50.0)
+    await products_collection.update_many({}, {"$set": {"price": 10.0}})
+
+    assert await reconcile_category_stats() == 3
+    stats = await _stats(stats_collection)
+    assert stats[("Feminino", CATEGORY, "Feminino")] == {"count": 1, "minPrice": 10.0, "maxPrice": 10.0}
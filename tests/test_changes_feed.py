@@ -0,0 +1,135 @@
+"""
+Change feed (GET /api/products/changes): token paging, the merge of updated
+products with deletion tombstones, and expired/invalid tokens
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import database
+import routes.products
+from database import CHANGES_RETENTION_DAYS
+from routes.products import _encode_change_token
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture(autouse=True)
+def no_settle_delay(monkeypatch):
+    # Writes made by the test are served right away
+    monkeypatch.setattr(routes.products, "CHANGES_SETTLE_SECONDS", 0)
+
+@pytest.fixture
+def deleted_collection(client):
+    return database.get_collection(database.DELETED_PRODUCTS)
+
+def _product(index: int, updated_at) -> dict:
+    product = {
+        "_id": ObjectId(),
+        "name": f"Produto {index}",
+        "description": "",
+        "price": 10.0 + index,
+        "category": "Feminino",
+        "brand": "Marca",
+        "sizes": [],
+        "colors": [],
+        "images": [],
+        "stock": 1,
+        "createdAt": datetime(2024, 1, 1)
+    }
+    if updated_at is not None:
+        product["updatedAt"] = updated_at
+    return product
+
+def _minutes_ago(minutes: int) -> datetime:
+    # Whole milliseconds, as Mongo stores them
+    return (datetime.utcnow() - timedelta(minutes=minutes)).replace(microsecond=0)
+
+async def _sync(client, since=None, limit=500) -> tuple:
+    """Follow nextToken until hasMore is false: (changed IDs, deleted IDs, token)"""
+    changed, deleted = [], []
+    params = {"limit": limit, "fields": "name"}
+    if since:
+        params["since"] = since
+    while True:
+        response = await client.get("/api/products/changes", params=params)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        changed += [product["_id"] for product in body["changes"]]
+        deleted += body["deleted"]
+        params["since"] = body["nextToken"]
+        if not body["hasMore"]:
+            return changed, deleted, body["nextToken"]
+
+async def test_full_sync_pages_through_every_product(client, products_collection):
+    # Equal timestamps (ties broken by _id) and a product never stamped
+    stamps = [_minutes_ago(30), _minutes_ago(20), _minutes_ago(20), _minutes_ago(20), None, _minutes_ago(10)]
+    products = [_product(index, stamp) for index, stamp in enumerate(stamps)]
+    await products_collection.insert_many(products)
+
+    changed, deleted, _ = await _sync(client, limit=2)
+
+    assert deleted == []
+    assert sorted(changed) == sorted(str(product["_id"]) for product in products)
+    assert len(changed) == len(set(changed))
+
+async def test_sync_from_token_returns_update_and_tombstone_once(client, products_collection):
+    products = [_product(index, _minutes_ago(10 - index)) for index in range(4)]
+    await products_collection.insert_many(products)
+    _, _, token = await _sync(client)
+
+    updated_id, deleted_id = str(products[1]["_id"]), str(products[2]["_id"])
+    response = await client.put(f"/api/products/{updated_id}", json={"price": 99.0})
+    assert response.status_code == 200
+    response = await client.delete(f"/api/products/{deleted_id}")
+    assert response.status_code == 204
+
+    changed, deleted, token = await _sync(client, token, limit=1)
+    assert changed == [updated_id]
+    assert deleted == [deleted_id]
+
+    # Nothing new since the last token
+    assert (await _sync(client, token))[:2] == ([], [])
+
+async def test_updates_and_tombstones_interleave_in_time_order(client, products_collection, deleted_collection):
+    first = _product(0, _minutes_ago(60))
+    await products_collection.insert_one(first)
+    _, _, token = await _sync(client)
+
+    updated = [_product(index, _minutes_ago(50 - 10 * index)) for index in (1, 3)]
+    await products_collection.insert_many(updated)
+    tombstones = [{"_id": ObjectId(), "deletedAt": _minutes_ago(50 - 10 * index)} for index in (2, 4)]
+    await deleted_collection.insert_many(tombstones)
+
+    sequence = []
+    params = {"since": token, "limit": 1}
+    while True:
+        body = (await client.get("/api/products/changes", params=params)).json()
+        assert len(body["changes"]) + len(body["deleted"]) <= 1
+        sequence += [("changed", product["_id"]) for product in body["changes"]]
+        sequence += [("deleted", product_id) for product_id in body["deleted"]]
+        params["since"] = body["nextToken"]
+        if not body["hasMore"]:
+            break
+
+    assert sequence == [
+        ("changed", str(updated[0]["_id"])),
+        ("deleted", str(tombstones[0]["_id"])),
+        ("changed", str(updated[1]["_id"])),
+        ("deleted", str(tombstones[1]["_id"]))
+    ]
+
+async def test_full_sync_skips_tombstones(client, deleted_collection):
+    await deleted_collection.insert_one({"_id": ObjectId(), "deletedAt": _minutes_ago(5)})
+    assert (await _sync(client))[:2] == ([], [])
+
+async def test_expired_token_is_a_410(client):
+    issued = datetime.utcnow() - timedelta(days=CHANGES_RETENTION_DAYS + 1)
+    token = _encode_change_token(issued, ObjectId(), issued)
+    response = await client.get("/api/products/changes", params={"since": token})
+    assert response.status_code == 410
+
+@pytest.mark.parametrize("token", ["not-a-token", "e30", "eyJ0IjoxLCJpIjoieCIsImgiOjF9"])
+async def test_invalid_token_is_a_400(client, token):
+    response = await client.get("/api/products/changes", params={"since": token})
+    assert response.status_code == 400
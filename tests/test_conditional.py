@@ -0,0 +1,84 @@
+"""
+Conditional GET: ETag / Last-Modified revalidation and 200s after writes
+"""
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from bson import ObjectId
+
+pytestmark = pytest.mark.anyio
+
+def _product(**fields) -> dict:
+    product = {
+        "_id": ObjectId(),
+        "name": "Vestido",
+        "description": "",
+        "price": 10.0,
+        "category": "Feminino",
+        "brand": "Marca",
+        "sizes": [],
+        "colors": [],
+        "images": [],
+        "stock": 1,
+        "updatedAt": datetime(2024, 1, 1, 12, 0, 0, 250000)
+    }
+    product.update(fields)
+    return product
+
+async def test_product_revalidates_by_etag_and_date(client, products_collection):
+    product = _product()
+    await products_collection.insert_one(product)
+    path = f"/api/products/{product['_id']}"
+
+    first = await client.get(path)
+    assert first.status_code == 200
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+    assert last_modified == "Mon, 01 Jan 2024 12:00:00 GMT"
+
+    assert (await client.get(path, headers={"If-None-Match": etag})).status_code == 304
+    assert (await client.get(path, headers={"If-Modified-Since": last_modified})).status_code == 304
+    # If-None-Match wins over a matching date
+    response = await client.get(path, headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified})
+    assert response.status_code == 200
+
+    assert (await client.put(path, json={"price": 12.0})).status_code == 200
+    assert (await client.get(path, headers={"If-None-Match": etag})).status_code == 200
+    assert (await client.get(path, headers={"If-Modified-Since": last_modified})).status_code == 200
+
+async def test_date_is_held_back_within_the_second_of_the_write(client, products_collection):
+    product = _product(updatedAt=datetime.utcnow())
+    await products_collection.insert_one(product)
+    path = f"/api/products/{product['_id']}"
+
+    response = await client.get(path)
+    assert "last-modified" not in response.headers
+    # A date from this very second can't prove the copy is current
+    now = format_datetime(datetime.now(timezone.utc), usegmt=True)
+    assert (await client.get(path, headers={"If-Modified-Since": now})).status_code == 200
+
+@pytest.mark.parametrize("path", ["/api/products/", "/api/categories/", "/api/categories/tree", "/settings"])
+async def test_cached_reads_revalidate_by_etag_only(client, products_collection, path):
+    await products_collection.insert_one(_product())
+
+    first = await client.get(path)
+    assert first.status_code == 200, first.text
+    assert "last-modified" not in first.headers
+    etag = first.headers["etag"]
+
+    assert (await client.get(path, headers={"If-None-Match": etag})).status_code == 304
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(days=1), usegmt=True)
+    assert (await client.get(path, headers={"If-Modified-Since": future})).status_code == 200
+
+async def test_listing_etag_changes_after_a_write(client, products_collection):
+    product = _product()
+    await products_collection.insert_one(product)
+
+    etag = (await client.get("/api/products/")).headers["etag"]
+    assert (await client.get("/api/products/", headers={"If-None-Match": etag})).status_code == 304
+
+    await client.put(f"/api/products/{product['_id']}", json={"name": "Vestido Longo"})
+    response = await client.get("/api/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["data"][0]["name"] == "Vestido Longo"
+    assert response.headers["etag"] != etag
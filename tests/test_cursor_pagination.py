@@ -0,0 +1,127 @@
+"""
+Keyset cursor pagination of GET /api/products (cursor encoding, ties and
+products without a value for the sort field)
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from routes.products import SORT_OPTIONS, _decode_cursor, _encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+BASE_TIME = datetime(2024, 1, 1)
+
+def _product(index: int, **fields) -> dict:
+    product = {
+        "_id": ObjectId(),
+        "name": f"Produto {index}",
+        "description": "",
+        "category": "Feminino",
+        "brand": "Marca",
+        "sizes": [],
+        "colors": [],
+        "images": [],
+        "stock": 1,
+        "createdAt": BASE_TIME + timedelta(hours=index % 4),
+        "updatedAt": BASE_TIME
+    }
+    product.update(fields)
+    return product
+
+# Repeated values (ties broken by _id) and products with the sort field
+# null or missing, which Mongo orders below every value
+CATALOG = [
+    _product(0, price=50.0, reviewCount=3),
+    _product(1, price=20.0, reviewCount=3),
+    _product(2, price=50.0, reviewCount=None),
+    _product(3, price=None, reviewCount=10),
+    _product(4, price=10.0),
+    _product(5, price=None, reviewCount=3),
+    _product(6, price=50.0, reviewCount=0),
+    _product(7, price=35.5, reviewCount=10),
+    _product(8, reviewCount=1),
+    _product(9, price=20.0, reviewCount=None),
+    _product(10, price=99.9, reviewCount=7)
+]
+
+async def _pages(client, sort: str, page_size: int) -> list:
+    """Every product ID reached by following nextCursor from the first page"""
+    ids = []
+    params = {"sort": sort, "pageSize": page_size, "fields": "name"}
+    for _ in range(len(CATALOG) + 1):
+        response = await client.get("/api/products/", params=params)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        ids += [product["_id"] for product in body["data"]]
+        if not body["nextCursor"]:
+            assert body["hasMore"] is False
+            return ids
+        assert body["hasMore"] is True
+        params["cursor"] = body["nextCursor"]
+    pytest.fail("cursor pagination did not terminate")
+
+@pytest.mark.parametrize("sort", list(SORT_OPTIONS))
+@pytest.mark.parametrize("page_size", [1, 3, 4])
+async def test_cursor_pages_match_offset_order(client, products_collection, sort, page_size):
+    await products_collection.insert_many([dict(product) for product in CATALOG])
+
+    whole = await client.get("/api/products/", params={"sort": sort, "pageSize": 100})
+    expected = [product["_id"] for product in whole.json()["data"]]
+    assert sorted(expected) == sorted(str(product["_id"]) for product in CATALOG)
+
+    assert await _pages(client, sort, page_size) == expected
+
+@pytest.mark.parametrize("value", [49.9, None, 0, BASE_TIME])
+def test_cursor_round_trip(value):
+    product = {"_id": ObjectId(), "price": value, "createdAt": value}
+    sort = "newest" if isinstance(value, datetime) else "price_asc"
+    sort_field, _ = SORT_OPTIONS[sort]
+
+    condition = _decode_cursor(_encode_cursor(sort, product), sort)
+
+    # The condition names the product's own position, whatever its value
+    branches = condition["$or"]
+    assert {sort_field: value, "_id": {"$gt" if sort == "price_asc" else "$lt": product["_id"]}} in branches
+
+def test_null_cursor_ascending_continues_into_values():
+    product = {"_id": ObjectId(), "price": None}
+    condition = _decode_cursor(_encode_cursor("price_asc", product), "price_asc")
+    assert condition == {"$or": [
+        {"price": None, "_id": {"$gt": product["_id"]}},
+        {"price": {"$ne": None}}
+    ]}
+
+def test_null_cursor_descending_stays_in_nulls():
+    product = {"_id": ObjectId(), "price": None}
+    condition = _decode_cursor(_encode_cursor("price_desc", product), "price_desc")
+    assert condition == {"$or": [{"price": None, "_id": {"$lt": product["_id"]}}]}
+
+def test_descending_cursor_keeps_nulls_for_last():
+    product = {"_id": ObjectId(), "price": 20.0}
+    condition = _decode_cursor(_encode_cursor("price_desc", product), "price_desc")
+    assert {"price": None} in condition["$or"]
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor", "e30", "eyJzIjoicHJpY2VfYXNjIn0", "eyJzIjoicHJpY2VfYXNjIiwidiI6MSwiaSI6IngifQ"
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        _decode_cursor(cursor, "price_asc")
+    assert error.value.status_code == 400
+
+def test_cursor_from_another_sort_is_rejected():
+    cursor = _encode_cursor("price_asc", {"_id": ObjectId(), "price": 10.0})
+    with pytest.raises(HTTPException) as error:
+        _decode_cursor(cursor, "price_desc")
+    assert error.value.status_code == 400
+
+async def test_cursor_from_another_sort_is_a_400(client, products_collection):
+    await products_collection.insert_many([dict(product) for product in CATALOG])
+    first = await client.get("/api/products/", params={"sort": "price_asc", "pageSize": 2})
+    response = await client.get("/api/products/", params={
+        "sort": "popular", "pageSize": 2, "cursor": first.json()["nextCursor"]
+    })
+    assert response.status_code == 400
@@ -0,0 +1,103 @@
+"""
+Image URLs: documents store /images/ paths, responses carry them absolute
+on IMAGE_BASE_URL in image fields only
+"""
+import base64
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+import database
+import routes.upload
+import storage
+
+pytestmark = pytest.mark.anyio
+
+BASE_URL = "https://api.example.com"
+KEY = "a" * 64
+
+@pytest.fixture(autouse=True)
+def image_base_url(monkeypatch):
+    monkeypatch.setattr(storage, "IMAGE_BASE_URL", BASE_URL)
+
+def _product(**fields) -> dict:
+    product = {
+        "_id": ObjectId(),
+        "name": "Vestido",
+        "description": 'Veja "/images/abc" aqui',
+        "price": 10.0,
+        "category": "Feminino",
+        "brand": "Marca",
+        "sizes": [],
+        "colors": [],
+        "images": [f"/images/{KEY}", "https://cdn.example.org/x.jpg"],
+        "tags": ["/images/"],
+        "stock": 1,
+        "updatedAt": datetime(2024, 1, 1)
+    }
+    product.update(fields)
+    return product
+
+def test_only_image_fields_are_made_absolute():
+    product = _product()
+    published = storage.public_image_urls({"data": [product], "image": "/images/b"})
+
+    assert published["image"] == f"{BASE_URL}/images/b"
+    assert published["data"][0]["images"] == [f"{BASE_URL}/images/{KEY}", "https://cdn.example.org/x.jpg"]
+    assert published["data"][0]["description"] == product["description"]
+    assert published["data"][0]["tags"] == ["/images/"]
+    # The cached document itself keeps the path
+    assert product["images"][0] == f"/images/{KEY}"
+
+def test_without_base_url_content_is_returned_as_is(monkeypatch):
+    monkeypatch.setattr(storage, "IMAGE_BASE_URL", "")
+    product = _product()
+    assert storage.public_image_urls(product) is product
+
+async def test_product_responses_carry_absolute_image_urls(client, products_collection):
+    product = _product()
+    await products_collection.insert_one(product)
+
+    for path in (f"/api/products/{product['_id']}", "/api/products/"):
+        body = (await client.get(path)).json()
+        item = body["data"][0] if "data" in body else body
+        assert item["images"][0] == f"{BASE_URL}/images/{KEY}"
+        assert item["description"] == 'Veja "/images/abc" aqui'
+
+    # Stored as a path both times
+    assert (await products_collection.find_one())["images"][0] == f"/images/{KEY}"
+
+async def test_absolute_urls_sent_back_are_stored_as_paths(client, products_collection):
+    product = _product()
+    await products_collection.insert_one(product)
+
+    response = await client.put(f"/api/products/{product['_id']}", json={"images": [f"{BASE_URL}/images/{KEY}"]})
+    assert response.json()["images"] == [f"{BASE_URL}/images/{KEY}"]
+    assert (await products_collection.find_one())["images"] == [f"/images/{KEY}"]
+
+async def test_category_image_is_absolute(client):
+    categories = database.get_collection(database.CATEGORIES)
+    await categories.insert_one({"name": "Feminino", "slug": "feminino", "image": "/images/c"})
+    body = (await client.get("/api/categories/")).json()
+    assert body[0]["image"] == f"{BASE_URL}/images/c"
+
+async def test_upload_returns_absolute_url(client, monkeypatch):
+    async def no_derivatives(key):
+        return True
+    monkeypatch.setattr(routes.upload, "ensure_derivatives", no_derivatives)
+    png = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+    response = await client.post("/upload", json={
+        "filename": "a.png",
+        "content_type": "image/png",
+        "data": "data:image/png;base64," + base64.b64encode(png).decode()
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["url"] == f"{BASE_URL}/images/{response.json()['hash']}"
+
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+async def test_export_carries_absolute_image_urls(client, products_collection, format):
+    await products_collection.insert_one(_product())
+    response = await client.get("/api/products/export", params={"format": format})
+    assert f"{BASE_URL}/images/{KEY}" in response.text
+    assert 'Veja ""/images/abc"" aqui' in response.text or 'Veja \\"/images/abc\\" aqui' in response.text
@@ -0,0 +1,71 @@
+"""
+Bulk import (POST /api/products/import): upserts by natural key
+"""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+pytestmark = pytest.mark.anyio
+
+CSV_TYPE = {"content-type": "text/csv"}
+
+def _stored_product(**fields) -> dict:
+    product = {
+        "_id": ObjectId(),
+        "sku": "SKU-1",
+        "name": "Vestido Midi",
+        "description": "Antigo",
+        "price": 100.0,
+        "originalPrice": 150.0,
+        "category": "Feminino",
+        "subcategory": "Vestidos",
+        "brand": "Marca",
+        "sizes": ["P", "M"],
+        "colors": [{"name": "Preto", "hex": "#000000"}],
+        "images": ["/images/abc"],
+        "stock": 3,
+        "featured": True,
+        "tags": ["festa"],
+        "rating": 4.8,
+        "reviewCount": 120,
+        "createdAt": datetime(2024, 1, 1),
+        "updatedAt": datetime(2024, 1, 1)
+    }
+    product.update(fields)
+    return product
+
+@pytest.mark.parametrize("upsert_key", ["sku", "name_brand"])
+async def test_partial_row_keeps_fields_it_does_not_mention(client, products_collection, upsert_key):
+    stored = _stored_product()
+    await products_collection.insert_one(dict(stored))
+
+    body = (
+        "sku,name,description,price,category,brand,stock\n"
+        "SKU-1,Vestido Midi,Novo,89.9,Feminino,Marca,7\n"
+    )
+    response = await client.post(
+        "/api/products/import", params={"format": "csv", "upsertKey": upsert_key},
+        content=body, headers=CSV_TYPE
+    )
+    assert response.status_code == 200, response.text
+    assert (response.json()["updated"], response.json()["inserted"]) == (1, 0)
+
+    product = await products_collection.find_one({"_id": stored["_id"]})
+    assert (product["description"], product["price"], product["stock"]) == ("Novo", 89.9, 7)
+    assert product["updatedAt"] > stored["updatedAt"]
+    for field in (
+        "sku", "originalPrice", "subcategory", "sizes", "colors", "images",
+        "featured", "tags", "rating", "reviewCount", "createdAt"
+    ):
+        assert product[field] == stored[field], field
+
+async def test_upsert_of_a_new_product_gets_the_defaults(client, products_collection):
+    body = '{"sku": "SKU-2", "name": "Blusa", "description": "", "price": 50, "category": "Feminino", "brand": "Marca", "stock": 1}\n'
+    response = await client.post("/api/products/import", params={"upsertKey": "sku"}, content=body)
+    assert response.json()["inserted"] == 1
+
+    product = await products_collection.find_one({"sku": "SKU-2"})
+    assert product["sizes"] == product["colors"] == product["images"] == product["tags"] == []
+    assert (product["featured"], product["reviewCount"], product["rating"]) == (False, 0, None)
+    assert product["createdAt"] == product["updatedAt"]
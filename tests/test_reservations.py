@@ -0,0 +1,122 @@
+"""
+Stock reservations: conditional decrements, compensation on shortage and
+the expiry sweep
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import database
+from routes.reservations import ACTIVE, EXPIRED, PENDING, RELEASED, release_expired
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def reservations_collection(client):
+    return database.get_collection(database.RESERVATIONS)
+
+async def _add_product(products_collection, stock: int) -> ObjectId:
+    result = await products_collection.insert_one({
+        "name": "Camiseta", "description": "", "price": 10.0, "category": "Feminino",
+        "brand": "Marca", "sizes": [], "colors": [], "images": [], "stock": stock
+    })
+    return result.inserted_id
+
+async def _stock(products_collection, product_id) -> int:
+    return (await products_collection.find_one({"_id": product_id}))["stock"]
+
+async def test_reservation_takes_stock(client, products_collection, reservations_collection):
+    first = await _add_product(products_collection, 5)
+    second = await _add_product(products_collection, 2)
+
+    response = await client.post("/api/reservations/", json={"items": [
+        {"productId": str(first), "quantity": 2},
+        {"productId": str(second), "quantity": 1},
+        {"productId": str(first), "quantity": 1}
+    ]})
+    assert response.status_code == 201, response.text
+    body = response.json()
+    assert body["status"] == ACTIVE
+    assert {item["productId"]: item["quantity"] for item in body["items"]} == {str(first): 3, str(second): 1}
+    assert (await _stock(products_collection, first), await _stock(products_collection, second)) == (2, 1)
+
+    stored = await reservations_collection.find_one({"_id": ObjectId(body["_id"])})
+    assert stored["status"] == ACTIVE and len(stored["items"]) == 2
+
+async def test_shortage_gives_back_what_was_taken(client, products_collection, reservations_collection):
+    plenty = await _add_product(products_collection, 5)
+    scarce = await _add_product(products_collection, 1)
+
+    response = await client.post("/api/reservations/", json={"items": [
+        {"productId": str(plenty), "quantity": 2},
+        {"productId": str(scarce), "quantity": 2}
+    ]})
+    assert response.status_code == 409
+    assert response.json()["detail"]["unavailable"] == [
+        {"productId": str(scarce), "requested": 2, "available": 1}
+    ]
+    assert (await _stock(products_collection, plenty), await _stock(products_collection, scarce)) == (5, 1)
+
+    # The record of the attempt is closed, so the sweeper won't restock it again
+    stored = await reservations_collection.find_one()
+    assert stored["status"] == RELEASED
+    assert await release_expired() == 0
+    assert await _stock(products_collection, plenty) == 5
+
+async def test_concurrent_buyers_never_take_more_than_the_stock(client, products_collection):
+    product_id = await _add_product(products_collection, 3)
+    responses = await asyncio.gather(*[
+        client.post("/api/reservations/", json={"items": [{"productId": str(product_id), "quantity": 1}]})
+        for _ in range(10)
+    ])
+    assert sorted(response.status_code for response in responses) == [201] * 3 + [409] * 7
+    assert await _stock(products_collection, product_id) == 0
+
+async def test_expired_reservations_are_restocked_once(client, products_collection, reservations_collection):
+    product_id = await _add_product(products_collection, 4)
+    response = await client.post("/api/reservations/", json={"items": [{"productId": str(product_id), "quantity": 3}]})
+    reservation_id = ObjectId(response.json()["_id"])
+    await reservations_collection.update_one(
+        {"_id": reservation_id}, {"$set": {"expiresAt": datetime.utcnow() - timedelta(seconds=1)}}
+    )
+
+    assert await release_expired() == 1
+    assert await release_expired() == 0
+    assert await _stock(products_collection, product_id) == 4
+    assert (await reservations_collection.find_one({"_id": reservation_id}))["status"] == EXPIRED
+
+    response = await client.post(f"/api/reservations/{reservation_id}/confirm")
+    assert response.status_code == 409
+
+async def test_unexpired_reservations_are_left_alone(client, products_collection):
+    product_id = await _add_product(products_collection, 4)
+    await client.post("/api/reservations/", json={"items": [{"productId": str(product_id), "quantity": 3}]})
+    assert await release_expired() == 0
+    assert await _stock(products_collection, product_id) == 1
+
+async def test_pending_reservation_left_by_a_dead_request_is_restocked(
+    client, products_collection, reservations_collection
+):
+    # Stock taken and recorded, then the request died before activating it
+    product_id = await _add_product(products_collection, 1)
+    await reservations_collection.insert_one({
+        "items": [{"productId": product_id, "quantity": 2}],
+        "status": PENDING,
+        "createdAt": datetime.utcnow() - timedelta(minutes=20),
+        "expiresAt": datetime.utcnow() - timedelta(minutes=5)
+    })
+
+    assert await release_expired() == 1
+    assert await _stock(products_collection, product_id) == 3
+
+async def test_release_puts_stock_back(client, products_collection):
+    product_id = await _add_product(products_collection, 2)
+    response = await client.post("/api/reservations/", json={"items": [{"productId": str(product_id), "quantity": 2}]})
+    reservation_id = response.json()["_id"]
+
+    response = await client.post(f"/api/reservations/{reservation_id}/release")
+    assert response.json()["status"] == RELEASED
+    assert await _stock(products_collection, product_id) == 2
+    assert (await client.post(f"/api/reservations/{reservation_id}/release")).status_code == 409
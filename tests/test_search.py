@@ -0,0 +1,43 @@
+"""
+Listing search (GET /api/products?search=): the in-process index and the
+regex scan used when it has nothing to look up
+"""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def _create(client, name: str, description: str = "") -> str:
+    response = await client.post("/api/products/", json={
+        "name": name, "description": description, "price": 10.0, "category": "Feminino",
+        "brand": "Marca", "sizes": [], "colors": [], "images": [], "stock": 1
+    })
+    assert response.status_code == 201, response.text
+    return response.json()["_id"]
+
+async def _search(client, text: str) -> dict:
+    response = await client.get("/api/products/", params={"search": text})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+async def test_indexed_search_ignores_stopwords_and_accents(client):
+    dress = await _create(client, "Vestido de Festa")
+    await _create(client, "Calça Jeans")
+
+    body = await _search(client, "vestido de festa")
+    assert [product["_id"] for product in body["data"]] == [dress]
+    assert (await _search(client, "calca"))["total"] == 1
+
+async def test_stopword_only_search_falls_back_to_text_match(client):
+    dress = await _create(client, "Vestido de Festa")
+    await _create(client, "Saia Midi", "Tecido leve")
+
+    body = await _search(client, "de")
+    assert body["total"] == 1
+    assert body["data"][0]["_id"] == dress
+
+async def test_regex_characters_are_matched_literally(client):
+    await _create(client, "Camiseta (P)")
+    await _create(client, "Camiseta M")
+
+    assert (await _search(client, "("))["total"] == 1
+    assert (await _search(client, ".*"))["total"] == 0
@@ -0,0 +1,124 @@
+"""
+SingleFlight: shared loads, errors and caller cancellation
+"""
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+class Loader:
+    """Counts its calls and holds each one until `release` is set"""
+
+    def __init__(self, result="value"):
+        self.result = result
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def test_concurrent_callers_share_one_load():
+    flights = SingleFlight()
+    loader = Loader()
+    callers = [asyncio.ensure_future(flights.do("key", loader)) for _ in range(5)]
+    await _settle()
+    loader.release.set()
+
+    assert await asyncio.gather(*callers) == ["value"] * 5
+    assert loader.calls == 1
+    assert (flights.leaders, flights.coalesced) == (1, 4)
+    assert len(flights) == 0
+
+async def test_different_keys_load_separately():
+    flights = SingleFlight()
+    loader = Loader()
+    loader.release.set()
+    await asyncio.gather(flights.do("a", loader), flights.do("b", loader))
+    assert loader.calls == 2
+
+async def test_error_reaches_every_caller_and_is_not_kept():
+    flights = SingleFlight()
+    loader = Loader(result=RuntimeError("boom"))
+    callers = [asyncio.ensure_future(flights.do("key", loader)) for _ in range(3)]
+    await _settle()
+    loader.release.set()
+
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flights.failures == 1
+
+    loader.result = "recovered"
+    assert await flights.do("key", loader) == "recovered"
+    assert loader.calls == 2
+
+async def test_cancelling_one_caller_keeps_the_load_for_the_others():
+    flights = SingleFlight()
+    loader = Loader()
+    leaving = asyncio.ensure_future(flights.do("key", loader))
+    staying = asyncio.ensure_future(flights.do("key", loader))
+    await _settle()
+
+    leaving.cancel()
+    await _settle()
+    loader.release.set()
+
+    assert await staying == "value"
+    assert leaving.cancelled()
+    assert loader.cancelled == 0
+
+async def test_cancelling_every_caller_cancels_the_load():
+    flights = SingleFlight()
+    loader = Loader()
+    callers = [asyncio.ensure_future(flights.do("key", loader)) for _ in range(2)]
+    await _settle()
+
+    for caller in callers:
+        caller.cancel()
+    await _settle()
+
+    assert loader.cancelled == 1
+    assert flights.cancellations == 1
+    assert len(flights) == 0
+
+async def test_caller_after_cancellation_starts_a_fresh_load():
+    flights = SingleFlight()
+    winding_down = asyncio.Event()
+
+    async def slow_to_cancel():
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            # Cleanup that outlasts the cancelled caller
+            await winding_down.wait()
+            raise
+
+    first = asyncio.ensure_future(flights.do("key", slow_to_cancel))
+    await _settle()
+    first.cancel()
+    await _settle()
+
+    # The old load hasn't finished cancelling; a new caller must not join it
+    loader = Loader(result="fresh")
+    loader.release.set()
+    assert await asyncio.wait_for(flights.do("key", loader), timeout=1) == "fresh"
+    assert loader.calls == 1
+
+    winding_down.set()
+    with pytest.raises(asyncio.CancelledError):
+        await first